@@ -0,0 +1,372 @@
+"""
+Motor asyncio para as conexões peer-to-peer
+
+Alternativa ao modelo de uma thread por conexão (peer_connection.py): todas as
+conexões, o servidor de peers e os laços periódicos rodam como tarefas de um
+único event loop, em uma thread própria. O protocolo de rede é o mesmo (JSON
+por linha, handshake HELLO/HELLO_OK), então peers dos dois motores conversam
+entre si.
+
+Os callbacks do P2PClient (on_message, on_disconnect, on_connection) são
+chamados na thread do loop e não devem bloquear. Tarefas periódicas que fazem
+I/O bloqueante (Rendezvous, conexões de saída) rodam em um pequeno pool de
+threads.
+"""
+import asyncio
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+from models import Message, MessageType, PROTOCOL_FEATURES
+from peer_connection import refusal
+from common import codec
+
+logger = logging.getLogger(__name__)
+
+HANDSHAKE_TIMEOUT = 10
+MAX_LINE_SIZE = 32768
+MAX_WRITE_BUFFER = 1024 * 1024  # bytes pendentes acima dos quais envios falham
+
+
+class PeerRefused(ConnectionError):
+    """O peer respondeu ao HELLO com BYE (por exemplo, grau máximo atingido)"""
+
+
+class AsyncEngine:
+    """Event loop em uma thread dedicada, com agendamento de tarefas periódicas"""
+
+    def __init__(self, blocking_workers: int = 4):
+        self.loop = asyncio.new_event_loop()
+        self.thread = None
+        self.executor = ThreadPoolExecutor(max_workers=blocking_workers,
+                                           thread_name_prefix="aio-blocking")
+        self.tasks = []
+
+    def start(self):
+        """Inicia o event loop"""
+        if self.thread:
+            return
+        self.thread = threading.Thread(target=self._run, name="aio-loop", daemon=True)
+        self.thread.start()
+        logger.info("[AsyncEngine] Started")
+
+    def stop(self):
+        """Cancela as tarefas e para o event loop"""
+        if not self.thread:
+            return
+        for task in self.tasks:
+            task.cancel()
+        self.tasks.clear()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=2)
+        self.thread = None
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        # fecha o que ainda estiver aberto (conexões, servidor)
+        pending = asyncio.all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    def in_loop(self) -> bool:
+        return threading.current_thread() is self.thread
+
+    def call_soon(self, fn: Callable, *args):
+        """Executa fn na thread do loop (imediatamente se já estivermos nela)"""
+        if self.in_loop():
+            fn(*args)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(fn, *args)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """Executa uma corrotina no loop e aguarda o resultado (fora da thread do loop)"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def every(self, interval: float, fn: Callable[[], None], name: str,
+              blocking: bool = False, initial: bool = False):
+        """
+        Agenda fn a cada `interval` segundos.
+        blocking=True executa fn no pool de threads (I/O bloqueante).
+        initial=True executa uma vez logo no início.
+        """
+        async def periodic():
+            if not initial:
+                await asyncio.sleep(interval)
+            while True:
+                try:
+                    if blocking:
+                        await self.loop.run_in_executor(self.executor, fn)
+                    else:
+                        fn()
+                except Exception as e:
+                    logger.error(f"Error in {name}: {e}")
+                await asyncio.sleep(interval)
+
+        self.tasks.append(asyncio.run_coroutine_threadsafe(periodic(), self.loop))
+
+    async def open_connection(self, peer_id: str, host: str, port: int, hello: Message):
+        """Conecta a um peer e faz o handshake HELLO/HELLO_OK; retorna o StreamLink"""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, limit=MAX_LINE_SIZE),
+            HANDSHAKE_TIMEOUT
+        )
+        link = StreamLink(self, reader, writer)
+        try:
+            writer.write(codec.dumpb(hello.to_dict()) + b"\n")
+            line = await asyncio.wait_for(reader.readline(), HANDSHAKE_TIMEOUT)
+            if not line:
+                raise ConnectionError(f"Connection closed by {peer_id} before HELLO_OK")
+
+            hello_ok = Message.from_dict(codec.loads(line))
+            if hello_ok.msg_type == MessageType.BYE:
+                raise PeerRefused(f"{peer_id} refused connection: {hello_ok.reason}")
+            if hello_ok.msg_type != MessageType.HELLO_OK:
+                raise ConnectionError(f"Expected HELLO_OK from {peer_id}, got {hello_ok.msg_type.value}")
+            link.features = hello_ok.features or []
+            return link
+        except BaseException:
+            writer.close()
+            raise
+
+    def connect(self, peer_id: str, host: str, port: int, hello: Message) -> "StreamLink":
+        """Versão bloqueante de open_connection, para as threads do cliente"""
+        return self.run(self.open_connection(peer_id, host, port, hello), HANDSHAKE_TIMEOUT * 2)
+
+
+class StreamLink:
+    """Par (reader, writer) de uma conexão já com handshake feito"""
+
+    def __init__(self, engine: AsyncEngine, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.engine = engine
+        self.reader = reader
+        self.writer = writer
+        self.features: list = []  # recursos anunciados pelo peer no handshake
+
+    def close(self):
+        """Fecha a conexão (seguro a partir de qualquer thread)"""
+        self.engine.call_soon(self.writer.close)
+
+
+class AsyncPeerConnection:
+    """Mesma interface de PeerConnection, sobre streams asyncio"""
+
+    def __init__(self, peer_id: str, link: StreamLink, direction: str,
+                 on_message: Callable[[str, Message], None],
+                 on_disconnect: Callable[[str], None],
+                 overflow: str = "drop_new",
+                 on_frame: Optional[Callable[[str, bytes], bool]] = None):
+        self.peer_id = peer_id
+        self.link = link
+        self.engine = link.engine
+        self.direction = direction  # "inbound" (entrada) ou "outbound" (saída)
+        self.on_message = on_message
+        self.on_disconnect = on_disconnect
+        # vê a linha crua antes da decodificação; True = já tratada (relay rápido)
+        self.on_frame = on_frame
+        self.running = False
+        self.recv_task = None
+        self.max_line_size = MAX_LINE_SIZE
+        # bytes já entregues ao transporte não voltam para a fila:
+        # "drop_oldest" se comporta como "drop_new"
+        self.overflow = overflow
+        self.dropped = 0
+
+    def start(self):
+        """Inicia recebimento de mensagens"""
+        self.running = True
+        self.engine.call_soon(self._spawn_receive)
+
+    def _spawn_receive(self):
+        self.recv_task = self.engine.loop.create_task(self._receive_loop())
+
+    def stop(self):
+        """Para a conexão"""
+        self.running = False
+        self.link.close()
+
+    def send_message(self, message: Message) -> bool:
+        """Envia uma mensagem para o peer (não bloqueia: a escrita é feita pelo loop)"""
+        try:
+            if not self.send_frame(codec.dumpb(message.to_dict()) + b"\n"):
+                return False
+            logger.debug(f"Sent {message.msg_type.value} to {self.peer_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error sending message to {self.peer_id}: {e}")
+            return False
+
+    def send_frame(self, frame: bytes) -> bool:
+        """Envia um quadro já serializado (terminado em '\n')"""
+        if len(frame) > self.max_line_size:
+            logger.error(f"Message too large: {len(frame)} bytes")
+            return False
+
+        transport = self.link.writer.transport
+        if transport.is_closing():
+            return False
+        if transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            self.dropped += 1
+            if self.overflow == "disconnect":
+                logger.warning(f"Write buffer full for {self.peer_id}, disconnecting")
+                self.stop()
+            else:
+                logger.debug(f"Write buffer full for {self.peer_id}, dropping frame")
+            return False
+
+        self.engine.call_soon(self._write, frame)
+        return True
+
+    def _write(self, data: bytes):
+        if not self.link.writer.transport.is_closing():
+            self.link.writer.write(data)
+
+    async def _receive_loop(self):
+        """Recebe mensagens do peer"""
+        reader = self.link.reader
+
+        try:
+            while self.running:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    line = e.partial  # EOF (a última linha pode vir sem '\n')
+                except asyncio.LimitOverrunError:
+                    # linha maior que o limite do StreamReader: descartada até o
+                    # próximo '\n', senão o resto dela seria lido como outro quadro
+                    logger.error(f"Line too long from {self.peer_id}")
+                    if not await self._skip_line(reader):
+                        logger.info(f"Connection closed by {self.peer_id}")
+                        break
+                    continue
+
+                if not line:
+                    logger.info(f"Connection closed by {self.peer_id}")
+                    break
+
+                try:
+                    if self.on_frame and self.on_frame(self.peer_id, line):
+                        continue
+                    if line.strip():
+                        msg_dict = codec.loads(line)
+                        message = Message.from_dict(msg_dict)
+                        logger.debug(f"Received {message.msg_type.value} from {self.peer_id}")
+                        self.on_message(self.peer_id, message)
+                except codec.DecodeError as e:
+                    logger.error(f"Invalid JSON from {self.peer_id}: {e}")
+                except Exception as e:
+                    logger.error(f"Error processing message from {self.peer_id}: {e}")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error in receive loop for {self.peer_id}: {e}")
+
+        finally:
+            self.running = False
+            self.link.writer.close()
+            self.on_disconnect(self.peer_id)
+
+
+    @staticmethod
+    async def _skip_line(reader: asyncio.StreamReader) -> bool:
+        """Descarta até o próximo '\n' inclusive; False se a conexão fechou antes"""
+        while True:
+            try:
+                await reader.readuntil(b"\n")
+                return True
+            except asyncio.LimitOverrunError as e:
+                await reader.readexactly(e.consumed)
+            except asyncio.IncompleteReadError:
+                return False
+
+
+class AsyncPeerServer:
+    """Mesma interface de PeerServer, sobre asyncio.start_server"""
+
+    def __init__(self, engine: AsyncEngine, port: int, peer_id: str,
+                 on_connection: Callable[[str, StreamLink, None, list], None],
+                 accept: Optional[Callable[[str], bool]] = None):
+        self.engine = engine
+        self.port = port
+        self.peer_id = peer_id
+        self.on_connection = on_connection
+        self.accept = accept  # decide se aceita o peer antes do HELLO_OK
+        self.server = None
+        self.running = False
+
+    def start(self):
+        """Inicia escuta de conexões"""
+        try:
+            self.server = self.engine.run(asyncio.start_server(
+                self._handle_inbound, '0.0.0.0', self.port,
+                limit=MAX_LINE_SIZE, reuse_address=True
+            ), timeout=5)
+            self.running = True
+            logger.info(f"[PeerServer] Listening on port {self.port} (asyncio)")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to start peer server: {e}")
+            return False
+
+    def stop(self):
+        """Para o servidor"""
+        self.running = False
+        if self.server:
+            self.engine.call_soon(self.server.close)
+
+    async def _handle_inbound(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Trata handshake de conexão de entrada"""
+        addr = writer.get_extra_info('peername')
+        logger.info(f"[PeerServer] Incoming connection from {addr}")
+
+        try:
+            # Aguarda HELLO
+            line = await asyncio.wait_for(reader.readline(), HANDSHAKE_TIMEOUT)
+            if not line:
+                # conexões sem HELLO são, em geral, sondas de vivacidade do Rendezvous
+                logger.debug(f"Connection closed before HELLO from {addr}")
+                writer.close()
+                return
+
+            hello_msg = Message.from_dict(codec.loads(line))
+
+            if hello_msg.msg_type != MessageType.HELLO:
+                logger.warning(f"Expected HELLO, got {hello_msg.msg_type.value} from {addr}")
+                writer.close()
+                return
+
+            remote_peer_id = hello_msg.src
+            logger.info(f"[PeerServer] HELLO from {remote_peer_id}")
+
+            if self.accept and not self.accept(remote_peer_id):
+                logger.info(f"[PeerServer] Refusing {remote_peer_id}: max degree reached")
+                writer.write(codec.dumpb(refusal(self.peer_id, remote_peer_id).to_dict()) + b"\n")
+                writer.close()
+                return
+
+            # Envia HELLO_OK
+            hello_ok = Message(
+                msg_type=MessageType.HELLO_OK,
+                msg_id=str(uuid.uuid4()),
+                src=self.peer_id,
+                version="1.0",
+                features=PROTOCOL_FEATURES
+            )
+
+            writer.write(codec.dumpb(hello_ok.to_dict()) + b"\n")
+
+            logger.info(f"[PeerServer] Inbound connected: {remote_peer_id}")
+
+            # Notifica o pai
+            link = StreamLink(self.engine, reader, writer)
+            link.features = hello_msg.features or []
+            self.on_connection(remote_peer_id, link, None, link.features)
+
+        except Exception as e:
+            logger.error(f"Error handling inbound connection from {addr}: {e}")
+            writer.close()
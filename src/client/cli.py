@@ -21,7 +21,8 @@ class CLI:
                  on_reconnect: Callable[[], None],
                  on_log: Callable[[str], None],
                  on_quit: Callable[[], None],
-                 on_relay: Callable[[str, str], None] = None):
+                 on_relay: Callable[[str, str], None] = None,
+                 on_routes: Callable[[], None] = None):
         self.on_peers = on_peers
         self.on_msg = on_msg
         self.on_pub = on_pub
@@ -31,6 +32,7 @@ class CLI:
         self.on_log = on_log
         self.on_quit = on_quit
         self.on_relay = on_relay
+        self.on_routes = on_routes
         self.running = False
         self.input_thread = None
     
@@ -57,6 +59,7 @@ class CLI:
         print("/pub #<namespace> <msg>  - Send to namespace")
         print("/conn                    - Show active connections")
         print("/rtt                     - Show RTT statistics")
+        print("/routes                  - Show relay routing table")
         print("/reconnect               - Force reconnection")
         print("/log <LEVEL>             - Set log level (DEBUG, INFO, WARNING, ERROR)")
         print("/quit                    - Exit application")
@@ -138,6 +141,12 @@ class CLI:
             elif cmd == "/reconnect":
                 self.on_reconnect()
             
+            elif cmd == "/routes":
+                if self.on_routes:
+                    self.on_routes()
+                else:
+                    print("Routing not available")
+            
             elif cmd == "/relay":
                 if not args:
                     print("Usage: /relay <peer_id> <message>")
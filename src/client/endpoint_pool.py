@@ -0,0 +1,107 @@
+"""
+Conjunto de servidores Rendezvous alternativos, com rastreamento de saúde e latência
+"""
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+
+@dataclass
+class Endpoint:
+    """Um servidor Rendezvous e suas estatísticas"""
+    host: str
+    port: int
+    ewma: Optional[float] = None  # latência média móvel (s); None = nunca medido
+    failures: int = 0             # falhas consecutivas
+    down_until: float = 0.0       # evitado até este instante (monotonic)
+    samples: deque = field(default_factory=lambda: deque(maxlen=64))
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.host, self.port
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+
+class EndpointPool:
+    """
+    Escolhe o servidor Rendezvous a usar em cada requisição.
+
+    Servidores saudáveis são ordenados pela latência (EWMA); os ainda não medidos
+    vêm depois, na ordem da configuração. Cada falha tira o servidor da rotação
+    por um backoff exponencial, e ele só volta a ser preferido depois de
+    responder de novo. O p95 das latências observadas define quando uma
+    requisição "hedged" (DISCOVER) é repetida no próximo servidor.
+    """
+
+    def __init__(self, addresses: List[Tuple[str, int]], alpha: float = 0.3,
+                 backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 default_hedge_delay: float = 0.5, min_hedge_delay: float = 0.05):
+        if not addresses:
+            raise ValueError("at least one rendezvous endpoint is required")
+        self.endpoints = [Endpoint(host, int(port)) for host, port in addresses]
+        self.alpha = alpha
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def parse(spec) -> Tuple[str, int]:
+        """Aceita "host:port" ou [host, port]"""
+        if isinstance(spec, str):
+            host, _, port = spec.rpartition(":")
+            return host, int(port)
+        host, port = spec
+        return host, int(port)
+
+    def ordered(self) -> List[Endpoint]:
+        """Servidores na ordem de preferência (os fora do ar por último)"""
+        now = time.monotonic()
+        with self.lock:
+            healthy = [e for e in self.endpoints if e.down_until <= now]
+            down = [e for e in self.endpoints if e.down_until > now]
+        # sort é estável: servidores sem medida mantêm a ordem da configuração
+        healthy.sort(key=lambda e: (e.ewma is None, e.ewma or 0.0))
+        down.sort(key=lambda e: e.down_until)
+        return healthy + down
+
+    def record_success(self, endpoint: Endpoint, rtt: float):
+        with self.lock:
+            if endpoint.ewma is None:
+                endpoint.ewma = rtt
+            else:
+                endpoint.ewma = self.alpha * rtt + (1 - self.alpha) * endpoint.ewma
+            endpoint.samples.append(rtt)
+            endpoint.failures = 0
+            endpoint.down_until = 0.0
+
+    def record_failure(self, endpoint: Endpoint):
+        with self.lock:
+            endpoint.failures += 1
+            backoff = min(self.backoff_base * (2 ** (endpoint.failures - 1)), self.backoff_max)
+            endpoint.down_until = time.monotonic() + backoff
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        """p95 da latência do servidor (padrão fixo enquanto houver poucas amostras)"""
+        with self.lock:
+            samples = sorted(endpoint.samples)
+        if len(samples) < 5:
+            return self.default_hedge_delay
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return max(self.min_hedge_delay, p95)
+
+    def stats(self) -> List[dict]:
+        """Resumo para diagnóstico"""
+        now = time.monotonic()
+        with self.lock:
+            return [{
+                "endpoint": str(e),
+                "ewma_ms": round(e.ewma * 1000, 1) if e.ewma is not None else None,
+                "failures": e.failures,
+                "healthy": e.down_until <= now,
+            } for e in self.endpoints]
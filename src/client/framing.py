@@ -0,0 +1,80 @@
+"""
+Enquadramento de mensagens delimitadas por '\n' em um fluxo TCP
+
+O LineFramer recebe direto em um bytearray de tamanho fixo (recv_into), procura
+'\n' apenas nos bytes ainda não examinados e compacta o buffer só quando ele
+enche. Cada byte é copiado no máximo uma vez para a linha devolvida, mesmo que
+um único recv traga centenas de mensagens. O limite de tamanho vale também
+para a linha ainda incompleta: um peer que nunca envia '\n' não faz o buffer
+crescer.
+"""
+import socket
+from typing import Optional
+
+
+class LineTooLong(Exception):
+    """Linha maior que o limite; foi descartada até o próximo '\n'"""
+
+
+class LineFramer:
+    """Buffer de recepção que separa as linhas de um socket"""
+
+    def __init__(self, max_line_size: int = 32768, chunk_size: int = 4096):
+        self.max_line_size = max_line_size
+        # espaço para a maior linha permitida mais um recv inteiro
+        self._buf = bytearray(max_line_size + chunk_size)
+        self._view = memoryview(self._buf)
+        self._start = 0          # início da linha corrente
+        self._scan = 0           # bytes antes deste ponto já foram examinados
+        self._end = 0            # fim dos dados recebidos
+        self._discarding = False  # descartando o resto de uma linha longa demais
+
+    def recv(self, sock: socket.socket) -> int:
+        """Lê do socket para o buffer; retorna o número de bytes (0 = conexão fechada)"""
+        if self._end == len(self._buf):
+            self._compact()
+            if self._end == len(self._buf):
+                # next_line() não foi chamado entre os recv: descarta a linha
+                self._discarding = True
+                self._start = self._scan = self._end = 0
+                raise LineTooLong(f"line exceeds {self.max_line_size} bytes")
+        n = sock.recv_into(self._view[self._end:])
+        self._end += n
+        return n
+
+    def next_line(self) -> Optional[bytes]:
+        """
+        Próxima linha completa (sem o '\n'), ou None se ainda não há uma.
+        Levanta LineTooLong quando uma linha excede o limite; a linha é
+        descartada e a chamada seguinte continua da próxima.
+        """
+        while True:
+            nl = self._buf.find(b"\n", self._scan, self._end)
+            if nl < 0:
+                if self._discarding:
+                    self._start = self._scan = self._end = 0
+                    return None
+                self._scan = self._end
+                if self._end - self._start > self.max_line_size:
+                    self._discarding = True
+                    self._start = self._scan = self._end = 0
+                    raise LineTooLong(f"line exceeds {self.max_line_size} bytes")
+                return None
+
+            start = self._start
+            self._start = self._scan = nl + 1
+            if self._discarding:
+                self._discarding = False
+                continue
+            if nl - start > self.max_line_size:
+                raise LineTooLong(f"line exceeds {self.max_line_size} bytes")
+            return bytes(self._view[start:nl])
+
+    def _compact(self):
+        """Move a linha incompleta para o início do buffer"""
+        pending = self._end - self._start
+        if pending:
+            self._buf[:pending] = self._view[self._start:self._end]
+        self._scan -= self._start
+        self._start = 0
+        self._end = pending
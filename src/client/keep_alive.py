@@ -23,11 +23,12 @@ class KeepAlive:
         self.pending_pings: Dict[str, Dict[str, datetime]] = {}  # peer_id -> {msg_id -> timestamp}
         self.lock = threading.Lock()
     
-    def start(self):
-        """Inicia a thread de keep-alive"""
+    def start(self, threaded: bool = True):
+        """Inicia a thread de keep-alive (threaded=False: PINGs agendados externamente)"""
         self.running = True
-        self.thread = threading.Thread(target=self._keep_alive_loop, daemon=True)
-        self.thread.start()
+        if threaded:
+            self.thread = threading.Thread(target=self._keep_alive_loop, daemon=True)
+            self.thread.start()
         logger.info("[KeepAlive] Started")
     
     def stop(self):
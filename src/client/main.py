@@ -8,6 +8,9 @@ import logging
 import argparse
 from pathlib import Path
 
+# src/ no caminho de importação para o pacote compartilhado `common`
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 from p2p_client import P2PClient
 
 
@@ -2,38 +2,163 @@
 Roteamento e entrega de mensagens
 """
 import logging
+import random
 import uuid
 import threading
 import time
-from typing import Dict, Callable, Optional
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Callable, Iterable, List, NamedTuple, Optional
 from datetime import datetime
 from models import Message, MessageType
+from routing import RoutingTable, MAX_HOPS
+from reliable import ReliableDelivery
+from common import codec
 
 logger = logging.getLogger(__name__)
 
+PUB_MODES = ("direct", "gossip")
+SEEN_CACHE_SIZE = 8192  # msg_ids lembrados (duplicatas de PUB/RELAY, caminho reverso)
+
+# Início de RELAY/RELAY_ACK como serializados por Message.to_dict (type e ttl primeiro)
+RELAY_PREFIX = b'{"type":"RELAY","ttl":'
+RELAY_ACK_PREFIX = b'{"type":"RELAY_ACK","ttl":'
+HEADER_SCAN = 1024  # bytes examinados em busca de msg_id/src/dst (independe do payload)
+
+
+class RelayHeader(NamedTuple):
+    """Cabeçalho de roteamento lido direto dos bytes de um RELAY/RELAY_ACK"""
+    msg_type: MessageType
+    ttl: int
+    ttl_start: int  # posição dos dígitos do ttl na linha
+    ttl_end: int
+    msg_id: Optional[str]
+    src: Optional[str]
+    dst: str
+
+
+def parse_relay_header(line: bytes) -> Optional[RelayHeader]:
+    """
+    Lê só o cabeçalho de roteamento de um RELAY ou RELAY_ACK, sem decodificar
+    o JSON. None se a linha não está na forma canônica; nesse caso ela segue
+    o caminho normal (decodificação completa).
+    """
+    if line.startswith(RELAY_PREFIX):
+        msg_type, start = MessageType.RELAY, len(RELAY_PREFIX)
+    elif line.startswith(RELAY_ACK_PREFIX):
+        msg_type, start = MessageType.RELAY_ACK, len(RELAY_ACK_PREFIX)
+    else:
+        return None
+    end = start
+    while line[end:end + 1].isdigit():
+        end += 1
+    if end == start or line[end:end + 1] != b",":
+        return None
+    
+    dst = _header_field(line, b',"dst":"', end)
+    if dst is None:
+        return None
+    return RelayHeader(msg_type, int(line[start:end]), start, end,
+                       _header_field(line, b',"msg_id":"', end),
+                       _header_field(line, b',"src":"', end), dst)
+
+
+def _header_field(line: bytes, key: bytes, pos: int) -> Optional[str]:
+    """Valor de um campo string do cabeçalho (None se ausente ou com escapes)"""
+    # ',"' não ocorre dentro de strings JSON (aspas internas são escapadas)
+    i = line.find(key, pos, HEADER_SCAN)
+    if i < 0:
+        return None
+    i += len(key)
+    j = line.find(b'"', i, HEADER_SCAN)
+    if j < 0:
+        return None
+    value = line[i:j]
+    if b"\\" in value:
+        return None
+    return value.decode("utf-8")
+
+
+@dataclass
+class PendingRelay:
+    """RELAY enviado por nós, aguardando o RELAY_ACK do destino"""
+    dst: str
+    payload: str
+    sent_at: float  # time.monotonic() da última tentativa
+    first_hop: str
+    attempts: int = 1
+    tried: set = field(default_factory=set)  # primeiros saltos já usados
+
 
 class MessageRouter:
-    """Roteia mensagens para os peers apropriados"""
+    """
+    Roteia mensagens para os peers apropriados.
+    
+    PUB tem dois modos:
+    - "direct": a mensagem vai para todos os peers conectados do escopo
+      (exige malha completa para alcançar o namespace inteiro);
+    - "gossip": a mensagem vai para `gossip_fanout` vizinhos sorteados, e cada
+      nó que a recebe pela primeira vez a repassa a outros `gossip_fanout`,
+      até `gossip_ttl` saltos. Com fanout na ordem de log N, a mensagem chega a
+      todo o namespace com alta probabilidade, e cada nó faz no máximo
+      `gossip_fanout` envios por mensagem.
+    Em ambos os modos, duplicatas (mesmo msg_id) são descartadas.
+    
+    RELAY segue a tabela de roteamento (`routing`), quando houver: cada salto
+    escolhe o vizinho de menor latência total até o destino. Com `relay_ack`,
+    o destino confirma cada RELAY com um RELAY_ACK que volta pelo caminho
+    reverso (cada relay lembra de quem recebeu a mensagem); sem confirmação
+    em `ack_timeout` segundos, a mensagem é reenviada por outro primeiro salto,
+    até `relay_retries` vezes.
+    """
     
     def __init__(self, my_peer_id: str, send_message: Callable[[str, Message], bool],
                  get_connected_peers: Callable[[], list],
                  get_peers_by_namespace: Callable[[str], list],
-                 ack_timeout: int = 5):
+                 ack_timeout: int = 5,
+                 send_frame: Optional[Callable[[str, bytes], bool]] = None,
+                 pub_mode: str = "direct",
+                 gossip_fanout: int = 6,
+                 gossip_ttl: int = 8,
+                 routing: Optional[RoutingTable] = None,
+                 relay_ack: bool = False,
+                 relay_retries: int = 2,
+                 reliable: Optional[ReliableDelivery] = None):
+        if pub_mode not in PUB_MODES:
+            raise ValueError(f"Unknown PUB mode: {pub_mode}")
         self.my_peer_id = my_peer_id
         self.send_message = send_message
+        # envio de quadros já serializados (fan-out); sem ele, cada peer recebe send_message
+        self.send_frame = send_frame
         self.get_connected_peers = get_connected_peers
         self.get_peers_by_namespace = get_peers_by_namespace
         self.ack_timeout = ack_timeout
         self.pending_acks: Dict[str, Dict[str, datetime]] = {}  # peer_id -> {msg_id -> timestamp}
+        self.pub_mode = pub_mode
+        self.gossip_fanout = gossip_fanout
+        self.gossip_ttl = gossip_ttl
+        self.seen_pubs: "OrderedDict[str, None]" = OrderedDict()  # LRU de msg_ids de PUB
+        self.routing = routing
+        self.relay_ack = relay_ack
+        self.relay_retries = relay_retries
+        self.pending_relays: Dict[str, PendingRelay] = {}  # msg_id -> RELAY aguardando ACK
+        self.relay_latency: Dict[str, List[float]] = {}  # destino -> latências fim a fim (ms)
+        self.seen_relays: "OrderedDict[str, None]" = OrderedDict()  # RELAYs já entregues
+        self.reverse_hops: "OrderedDict[str, str]" = OrderedDict()  # msg_id -> salto anterior
+        self.reliable = reliable  # canal com janela/retransmissão para vizinhos que o suportam
         self.lock = threading.Lock()
         self.running = False
         self.timeout_thread = None
     
-    def start(self):
-        """Inicia o roteador de mensagens"""
+    def start(self, threaded: bool = True):
+        """
+        Inicia o roteador de mensagens.
+        Com threaded=False, expire_acks() é agendado externamente (motor asyncio).
+        """
         self.running = True
-        self.timeout_thread = threading.Thread(target=self._check_ack_timeouts, daemon=True)
-        self.timeout_thread.start()
+        if threaded:
+            self.timeout_thread = threading.Thread(target=self._check_ack_timeouts, daemon=True)
+            self.timeout_thread.start()
         logger.info("[Router] Started")
     
     def stop(self):
@@ -43,7 +168,17 @@ class MessageRouter:
             self.timeout_thread.join(timeout=2)
     
     def send_direct(self, dst_peer_id: str, payload: str, require_ack: bool = True) -> bool:
-        """Envia mensagem direta para um peer"""
+        """
+        Envia mensagem direta para um peer.
+        Com ACK pedido e vizinho com suporte, usa o canal confiável (janela,
+        ACKs em lote e retransmissão); senão, SEND com ACK por mensagem.
+        """
+        if require_ack and self.reliable and self.reliable.has_peer(dst_peer_id):
+            success = self.reliable.send(dst_peer_id, payload)
+            if success:
+                logger.info(f"[Router] SEND {dst_peer_id}: {payload}")
+            return success
+        
         msg_id = str(uuid.uuid4())
         message = Message(
             msg_type=MessageType.SEND,
@@ -92,24 +227,78 @@ class MessageRouter:
             logger.error(f"[Router] Invalid scope: {scope}")
             return 0
         
-        # Envia para todos os peers de destino
-        sent_count = 0
-        for peer_id in target_peers:
-            message = Message(
-                msg_type=MessageType.PUB,
-                msg_id=msg_id,
-                src=self.my_peer_id,
-                dst=scope,
-                payload=payload,
-                require_ack=False
-            )
-            
-            if self.send_message(peer_id, message):
-                sent_count += 1
+        message = Message(
+            msg_type=MessageType.PUB,
+            msg_id=msg_id,
+            src=self.my_peer_id,
+            dst=scope,
+            payload=payload,
+            require_ack=False
+        )
+        
+        if self.pub_mode == "gossip":
+            self._remember(self.seen_pubs, msg_id)
+            message.ttl = self.gossip_ttl
+            target_peers = self._sample(target_peers, self.gossip_fanout)
+        
+        sent_count = self._fan_out(message, target_peers)
         
         logger.info(f"[Router] Published to {sent_count}/{len(target_peers)} peers")
         return sent_count
     
+    def handle_pub(self, from_peer: str, message: Message) -> bool:
+        """
+        Trata PUB recebido. Retorna True se a mensagem é nova e deve ser exibida.
+        PUBs de gossip (ttl > 1) são repassados a vizinhos sorteados, com ttl - 1.
+        """
+        if message.msg_id and not self._remember(self.seen_pubs, message.msg_id):
+            logger.debug(f"[Router] Duplicate PUB {message.msg_id} from {from_peer}")
+            return False
+        
+        if message.ttl > 1:
+            scope = message.dst or "*"
+            if scope.startswith("#"):
+                candidates = self.get_peers_by_namespace(scope[1:])
+            else:
+                candidates = self.get_connected_peers()
+            exclude = (from_peer, message.src)
+            candidates = [p for p in candidates if p not in exclude]
+            
+            message.ttl -= 1
+            forwarded = self._fan_out(message, self._sample(candidates, self.gossip_fanout))
+            logger.debug(f"[Router] Gossip PUB {message.msg_id} forwarded to {forwarded} peers (ttl={message.ttl})")
+        
+        return True
+    
+    def _remember(self, cache: OrderedDict, msg_id: str, value=None) -> bool:
+        """Registra msg_id em um LRU (seen_pubs, seen_relays, reverse_hops); False se já estava lá"""
+        with self.lock:
+            new = msg_id not in cache
+            cache[msg_id] = value
+            cache.move_to_end(msg_id)
+            if len(cache) > SEEN_CACHE_SIZE:
+                cache.popitem(last=False)
+            return new
+    
+    @staticmethod
+    def _sample(peers: list, k: int) -> list:
+        return peers if len(peers) <= k else random.sample(peers, k)
+    
+    def _fan_out(self, message: Message, peers: list) -> int:
+        """Envia a mesma mensagem a vários peers; retorna quantos envios foram aceitos"""
+        # Serializa uma vez; o mesmo quadro é enfileirado em cada conexão
+        sent_count = 0
+        if self.send_frame:
+            frame = codec.dumpb(message.to_dict()) + b"\n"
+            for peer_id in peers:
+                if self.send_frame(peer_id, frame):
+                    sent_count += 1
+        else:
+            for peer_id in peers:
+                if self.send_message(peer_id, message):
+                    sent_count += 1
+        return sent_count
+    
     def handle_ack(self, peer_id: str, msg_id: str):
         """Trata ACK de uma mensagem enviada"""
         with self.lock:
@@ -133,22 +322,28 @@ class MessageRouter:
         while self.running:
             try:
                 time.sleep(1)
-                now = datetime.now()
-                
-                with self.lock:
-                    for peer_id, acks in list(self.pending_acks.items()):
-                        for msg_id, sent_time in list(acks.items()):
-                            elapsed = (now - sent_time).total_seconds()
-                            if elapsed > self.ack_timeout:
-                                logger.warning(f"[Router] ACK timeout for message {msg_id} to {peer_id}")
-                                del acks[msg_id]
-                        
-                        if not acks:
-                            del self.pending_acks[peer_id]
+                self.expire_acks()
             
             except Exception as e:
                 logger.error(f"[Router] Error checking ACK timeouts: {e}")
     
+    def expire_acks(self):
+        """Descarta ACKs pendentes há mais de ack_timeout segundos"""
+        now = datetime.now()
+        
+        with self.lock:
+            for peer_id, acks in list(self.pending_acks.items()):
+                for msg_id, sent_time in list(acks.items()):
+                    elapsed = (now - sent_time).total_seconds()
+                    if elapsed > self.ack_timeout:
+                        logger.warning(f"[Router] ACK timeout for message {msg_id} to {peer_id}")
+                        del acks[msg_id]
+                
+                if not acks:
+                    del self.pending_acks[peer_id]
+        
+        self.expire_relays()
+    
     def clear_peer(self, peer_id: str):
         """Limpa ACKs pendentes para um peer"""
         with self.lock:
@@ -158,35 +353,58 @@ class MessageRouter:
         """
         Envia mensagem via relay quando conexão direta não está disponível.
         Encontra um peer intermediário para retransmitir a mensagem.
+        Com relay_ack, a mensagem fica pendente até o RELAY_ACK do destino.
         """
-        relay_peer = self._find_relay_peer(dst_peer_id)
+        msg_id = str(uuid.uuid4())
+        relay_peer = self._send_relay(msg_id, dst_peer_id, payload)
+        if not relay_peer:
+            return False
+        
+        if self.relay_ack:
+            with self.lock:
+                self.pending_relays[msg_id] = PendingRelay(
+                    dst_peer_id, payload, time.monotonic(), relay_peer, tried={relay_peer}
+                )
+        return True
+    
+    def _send_relay(self, msg_id: str, dst_peer_id: str, payload: str,
+                    exclude: Iterable[str] = ()) -> Optional[str]:
+        """Envia um RELAY pelo melhor primeiro salto fora de exclude; retorna o salto usado"""
+        relay_peer = self._find_relay_peer(dst_peer_id, exclude)
         
         if not relay_peer:
             logger.warning(f"[Router] No relay peer available for {dst_peer_id}")
-            return False
+            return None
         
-        msg_id = str(uuid.uuid4())
         relay_msg = Message(
             msg_type=MessageType.RELAY,
             msg_id=msg_id,
             src=self.my_peer_id,
             dst=dst_peer_id,
             payload=payload,
-            ttl=3  # Max 3 hops to prevent loops
+            ttl=self._relay_ttl(dst_peer_id),
+            require_ack=self.relay_ack
         )
         
-        success = self.send_message(relay_peer, relay_msg)
-        if success:
-            logger.info(f"[Router] RELAY via {relay_peer} -> {dst_peer_id}: {payload}")
-        else:
+        if not self.send_message(relay_peer, relay_msg):
             logger.error(f"[Router] Failed to relay via {relay_peer}")
-        
-        return success
+            return None
+        logger.info(f"[Router] RELAY via {relay_peer} -> {dst_peer_id}: {payload}")
+        return relay_peer
+    
+    def _relay_ttl(self, dst_peer_id: str) -> int:
+        """TTL pelo comprimento da rota conhecida, com folga; sem rota, 3 saltos"""
+        ttl = 3
+        route = self.routing.route(dst_peer_id) if self.routing else None
+        if route:
+            ttl = min(MAX_HOPS, max(ttl, route[1] + 1))
+        return ttl
     
     def handle_relay(self, from_peer: str, message: Message) -> bool:
         """
-        Trata mensagem de relay recebida.
-        Entrega localmente ou encaminha para o próximo salto.
+        Trata mensagem de relay recebida: encaminha para o próximo salto ou,
+        se somos o destino, confirma (RELAY_ACK) quando pedido.
+        Retorna True se a mensagem é para nós, é nova e deve ser exibida.
         """
         dst = message.dst
         original_src = message.src
@@ -201,36 +419,175 @@ class MessageRouter:
         
         # Se somos o destino, entrega localmente
         if dst == self.my_peer_id:
+            if message.require_ack and original_src:
+                # confirma também duplicatas: o ACK anterior pode ter se perdido
+                self._send_relay_ack(from_peer, message)
+            if message.msg_id and not self._remember(self.seen_relays, message.msg_id):
+                logger.debug(f"[Router] Duplicate RELAY {message.msg_id} from {original_src}")
+                return False
             logger.info(f"[Router] RELAY received from {original_src} (via {from_peer}): {message.payload}")
-            # Converte para SEND para entrega local
-            return True  # Signal to handle as regular message
-        
-        # Verifica se o destino está diretamente conectado a nós
-        connected_peers = self.get_connected_peers()
-        if dst in connected_peers:
-            # Encaminha diretamente para o destino
-            success = self.send_message(dst, message)
-            if success:
-                logger.info(f"[Router] Relayed {original_src} -> {dst}: {message.payload}")
-            return success
+            return True
         
-        # Tenta encontrar outro peer de relay
-        next_hop = self._find_relay_peer(dst)
-        if next_hop and next_hop != from_peer:
-            success = self.send_message(next_hop, message)
-            if success:
+        if message.msg_id:
+            self._remember(self.reverse_hops, message.msg_id, from_peer)
+        next_hop = self._relay_next_hop(from_peer, original_src, dst, message.ttl)
+        if next_hop and self.send_message(next_hop, message):
+            if next_hop == dst:
+                logger.info(f"[Router] Relayed {original_src} -> {dst}: {message.payload}")
+            else:
                 logger.info(f"[Router] Forwarding relay via {next_hop} -> {dst}")
-            return success
-        
-        logger.warning(f"[Router] Cannot relay to {dst} - no route available")
         return False
     
-    def _find_relay_peer(self, dst_peer_id: str) -> Optional[str]:
+    def _send_relay_ack(self, from_peer: str, message: Message):
+        """Confirma um RELAY para a origem, pelo vizinho de quem ele chegou"""
+        ack = Message(
+            msg_type=MessageType.RELAY_ACK,
+            msg_id=message.msg_id,
+            src=self.my_peer_id,
+            dst=message.src,
+            ttl=self._relay_ttl(message.src)
+        )
+        self.send_message(from_peer, ack)
+    
+    def handle_relay_ack(self, from_peer: str, message: Message):
+        """Trata RELAY_ACK: conclui um envio nosso ou o encaminha pelo caminho reverso"""
+        if message.dst == self.my_peer_id:
+            self._relay_acked(message.msg_id, message.src)
+            return
+        
+        if message.ttl <= 0:
+            logger.warning(f"[Router] Dropping relay ACK - TTL expired (from {message.src} to {message.dst})")
+            return
+        message.ttl -= 1
+        
+        next_hop = self._ack_next_hop(from_peer, message.msg_id, message.src, message.dst, message.ttl)
+        if next_hop:
+            self.send_message(next_hop, message)
+    
+    def _relay_acked(self, msg_id: str, src: Optional[str]):
+        """Registra a confirmação fim a fim e a latência até o destino"""
+        with self.lock:
+            pending = self.pending_relays.pop(msg_id, None)
+            if pending is None:
+                return  # ACK duplicado ou de mensagem já descartada
+            latency = (time.monotonic() - pending.sent_at) * 1000
+            # só amostras sem retransmissão: com reenvio, o ACK pode ser da tentativa anterior
+            if pending.attempts == 1:
+                samples = self.relay_latency.setdefault(pending.dst, [])
+                samples.append(latency)
+                if len(samples) > 10:
+                    samples.pop(0)
+        logger.info(f"[Router] RELAY {msg_id} delivered to {pending.dst} in {latency:.2f} ms "
+                    f"(attempt {pending.attempts})")
+    
+    def relay_rtt(self) -> Dict[str, float]:
+        """Latência média fim a fim (ms) dos RELAYs confirmados, por destino"""
+        with self.lock:
+            return {dst: sum(s) / len(s) for dst, s in self.relay_latency.items() if s}
+    
+    def expire_relays(self):
+        """Reenvia por outro primeiro salto os RELAYs sem ACK; desiste após relay_retries"""
+        now = time.monotonic()
+        with self.lock:
+            expired = [(msg_id, p) for msg_id, p in self.pending_relays.items()
+                       if now - p.sent_at > self.ack_timeout]
+        
+        for msg_id, pending in expired:
+            hop = None
+            if pending.attempts <= self.relay_retries:
+                logger.info(f"[Router] RELAY {msg_id} to {pending.dst} not acknowledged, "
+                            f"retrying on an alternate route")
+                hop = self._send_relay(msg_id, pending.dst, pending.payload, exclude=pending.tried)
+            
+            with self.lock:
+                if msg_id not in self.pending_relays:
+                    continue  # ACK chegou enquanto reenviávamos
+                if hop:
+                    pending.attempts += 1
+                    pending.sent_at = time.monotonic()
+                    pending.tried.add(hop)
+                else:
+                    del self.pending_relays[msg_id]
+            if not hop:
+                logger.warning(f"[Router] RELAY {msg_id} to {pending.dst} not acknowledged "
+                               f"after {pending.attempts} attempt(s)")
+    
+    def forward_relay_frame(self, from_peer: str, line: bytes) -> bool:
+        """
+        Caminho rápido do relay, chamado com a linha crua antes da decodificação.
+        Lê apenas o cabeçalho (ttl, msg_id, src, dst) de RELAY/RELAY_ACK em
+        trânsito e encaminha os bytes originais com o ttl trocado, sem
+        decodificar nem serializar de novo o payload.
+        Retorna False quando a linha deve seguir o caminho normal (não está na
+        forma canônica, ou é destinada a nós).
+        """
+        if not self.send_frame:
+            return False
+        header = parse_relay_header(line)
+        if header is None or header.dst == self.my_peer_id:
+            return False
+        
+        src, dst = header.src, header.dst
+        if header.ttl <= 0:
+            logger.warning(f"[Router] Dropping {header.msg_type.value} - TTL expired (from {src} to {dst})")
+            return True
+        ttl = header.ttl - 1
+        
+        if header.msg_type == MessageType.RELAY_ACK:
+            next_hop = self._ack_next_hop(from_peer, header.msg_id, src, dst, ttl)
+        else:
+            if header.msg_id:
+                self._remember(self.reverse_hops, header.msg_id, from_peer)
+            next_hop = self._relay_next_hop(from_peer, src, dst, ttl)
+        
+        if next_hop:
+            # o payload é copiado uma única vez, direto para o novo quadro;
+            # a linha do motor asyncio já vem com '\n', a do LineFramer não
+            newline = b"" if line.endswith(b"\n") else b"\n"
+            frame = b"".join((line[:header.ttl_start], str(ttl).encode(),
+                              memoryview(line)[header.ttl_end:], newline))
+            if self.send_frame(next_hop, frame):
+                logger.debug(f"[Router] Fast-forwarded {header.msg_type.value} {src} -> {dst} via {next_hop}")
+        return True
+    
+    def _ack_next_hop(self, from_peer: str, msg_id: Optional[str], src: Optional[str],
+                      dst: str, ttl: int) -> Optional[str]:
+        """Próximo salto de um RELAY_ACK: o vizinho de quem veio o RELAY, senão a rota"""
+        with self.lock:
+            prev_hop = self.reverse_hops.pop(msg_id, None) if msg_id else None
+        if prev_hop and prev_hop != from_peer and prev_hop in self.get_connected_peers():
+            return prev_hop
+        return self._relay_next_hop(from_peer, src, dst, ttl)
+    
+    def _relay_next_hop(self, from_peer: str, src: Optional[str], dst: str, ttl: int) -> Optional[str]:
+        """Próximo salto de um RELAY em trânsito (ttl já decrementado); None descarta"""
+        if ttl > 0:
+            # nunca de volta para quem enviou nem para a origem
+            next_hop = self._find_relay_peer(dst, exclude=(from_peer, src))
+        elif dst in self.get_connected_peers():
+            next_hop = dst  # último salto permitido: só entrega direta
+        else:
+            logger.warning(f"[Router] Dropping relay message - TTL expired (from {src} to {dst})")
+            return None
+        
+        if not next_hop:
+            logger.warning(f"[Router] Cannot relay to {dst} - no route available")
+        return next_hop
+    
+    def _find_relay_peer(self, dst_peer_id: str, exclude: Iterable[str] = ()) -> Optional[str]:
         """
-        Encontra um peer que pode potencialmente retransmitir para o destino.
-        Estratégia simples: retorna qualquer peer conectado que não seja o destino.
+        Escolhe o próximo salto até o destino.
+        Com tabela de roteamento, o vizinho de menor custo total (o próprio
+        destino, se for vizinho e o caminho direto for o melhor). Sem rota
+        conhecida: o destino, se conectado, ou qualquer outro peer conectado.
         """
-        connected = self.get_connected_peers()
+        connected = [p for p in self.get_connected_peers() if p not in exclude]
+        if self.routing:
+            next_hop = self.routing.next_hop(dst_peer_id, exclude)
+            if next_hop in connected:
+                return next_hop
+        if dst_peer_id in connected:
+            return dst_peer_id
         for peer in connected:
             if peer != dst_peer_id:
                 return peer
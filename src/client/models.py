@@ -2,7 +2,7 @@
 Modelos de dados para o Cliente de Chat P2P
 """
 from dataclasses import dataclass, field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -28,6 +28,12 @@ class MessageType(Enum):
     BYE = "BYE"
     BYE_OK = "BYE_OK"
     RELAY = "RELAY"  # Para retransmitir mensagens através de peers intermediários
+    ROUTE = "ROUTE"  # Anúncio de rotas (distance-vector) entre vizinhos
+    RELAY_ACK = "RELAY_ACK"  # Confirmação fim a fim de um RELAY, pelo caminho reverso
+
+
+# Recursos anunciados no HELLO/HELLO_OK
+PROTOCOL_FEATURES = ["ack", "metrics", "routing", "reliable"]
 
 
 @dataclass
@@ -71,6 +77,10 @@ class Message:
     version: Optional[str] = None
     features: Optional[List[str]] = None
     reason: Optional[str] = None
+    routes: Optional[Dict[str, list]] = None  # ROUTE: {destino: [custo_ms, saltos]}
+    seq: Optional[int] = None  # SEND confiável: número de sequência
+    ack: Optional[int] = None  # ACK confiável: todos os seq < ack recebidos
+    sack: Optional[List[List[int]]] = None  # ACK confiável: faixas [início, fim] fora de ordem
     
     def to_dict(self) -> dict:
         """Converte mensagem para dicionário para serialização JSON"""
@@ -95,6 +105,14 @@ class Message:
             data["features"] = self.features
         if self.reason:
             data["reason"] = self.reason
+        if self.routes is not None:
+            data["routes"] = self.routes
+        if self.seq is not None:
+            data["seq"] = self.seq
+        if self.ack is not None:
+            data["ack"] = self.ack
+        if self.sack:
+            data["sack"] = self.sack
             
         return data
     
@@ -113,7 +131,11 @@ class Message:
             require_ack=data.get("require_ack", False),
             version=data.get("version"),
             features=data.get("features"),
-            reason=data.get("reason")
+            reason=data.get("reason"),
+            routes=data.get("routes"),
+            seq=data.get("seq"),
+            ack=data.get("ack"),
+            sack=data.get("sack")
         )
 
 
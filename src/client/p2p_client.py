@@ -6,17 +6,23 @@ import socket
 import uuid
 import threading
 import time
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
-from models import PeerInfo, PeerStatus, Message, MessageType, ConnectionInfo
+from models import PeerInfo, PeerStatus, Message, MessageType, ConnectionInfo, PROTOCOL_FEATURES
 from state import PeerState
 from rendezvous_connection import RendezvousConnection
 from peer_connection import PeerConnection, PeerServer
+from framing import LineFramer
+from aio_engine import AsyncEngine, AsyncPeerConnection, AsyncPeerServer, PeerRefused
 from message_router import MessageRouter
 from keep_alive import KeepAlive
 from peer_table import PeerTable
+from topology import TopologyManager
+from routing import RoutingTable
+from reliable import ReliableDelivery
 from cli import CLI
+from common import codec
 
 logger = logging.getLogger(__name__)
 
@@ -38,17 +44,58 @@ class P2PClient:
         self.connections: Dict[str, PeerConnection] = {}
         self.conn_lock = threading.RLock()
         self.connecting_peers: set = set()  # Rastreia peers em processo de conexão
+        self.peer_features: Dict[str, List[str]] = {}  # recursos anunciados no handshake
+        
+        # Motor de conexões: "threads" (uma thread por conexão) ou "asyncio" (um event loop)
+        engine = config['connection'].get('engine', 'threads')
+        if engine not in ("threads", "asyncio"):
+            raise ValueError(f"Unknown connection engine: {engine}")
+        self.engine = AsyncEngine() if engine == "asyncio" else None
+        
+        # Fila de saída por conexão e política quando ela enche (peer lento)
+        self.send_queue_size = config['connection'].get('send_queue_size', 1024)
+        self.send_overflow = config['connection'].get('send_overflow', 'drop_oldest')
         
         # Componentes
         self.rendezvous = RendezvousConnection(
             config['rendezvous']['host'],
-            config['rendezvous']['port']
+            config['rendezvous']['port'],
+            compress=config['rendezvous'].get('compress', False),
+            # servidores alternativos ("host:port"), usados em failover e hedging
+            endpoints=config['rendezvous'].get('endpoints', []),
+            timeout=config['rendezvous'].get('timeout', 5),
+            hedge=config['rendezvous'].get('hedge', True)
         )
         
-        self.peer_server = PeerServer(
-            self.port,
+        if self.engine:
+            self.peer_server = AsyncPeerServer(
+                self.engine,
+                self.port,
+                self.peer_id,
+                self._on_inbound_connection,
+                self._accept_inbound
+            )
+        else:
+            self.peer_server = PeerServer(
+                self.port,
+                self.peer_id,
+                self._on_inbound_connection,
+                self._accept_inbound
+            )
+        
+        # Rotas para RELAY: distance-vector com custo em RTT, anunciado a cada route_interval
+        self.route_interval = config['connection'].get('route_interval', 5)
+        self.routing = RoutingTable(self.peer_id, expiry=3 * self.route_interval)
+        
+        # SEND confiável (janela deslizante) com vizinhos que anunciam "reliable"
+        self.reliable = ReliableDelivery(
             self.peer_id,
-            self._on_inbound_connection
+            self._send_frame_to_peer,
+            self._deliver_direct,
+            on_failure=lambda peer_id: self._disconnect_peer(peer_id, "Reliable delivery failed"),
+            window=config['connection'].get('reliable_window', 64),
+            max_backlog=self.send_queue_size,
+            ack_delay=config['connection'].get('ack_delay', 0.05)
         )
         
         self.message_router = MessageRouter(
@@ -56,7 +103,17 @@ class P2PClient:
             self._send_message_to_peer,
             self._get_connected_peer_ids,
             self._get_peers_by_namespace,
-            config['connection']['ack_timeout']
+            config['connection']['ack_timeout'],
+            send_frame=self._send_frame_to_peer,
+            # "gossip": PUB repassado a `gossip_fanout` vizinhos em vez de a todos
+            pub_mode=config['connection'].get('pub_mode', 'direct'),
+            gossip_fanout=config['connection'].get('gossip_fanout', 6),
+            gossip_ttl=config['connection'].get('gossip_ttl', 8),
+            routing=self.routing,
+            # confirmação fim a fim de RELAY, com reenvio por outra rota
+            relay_ack=config['connection'].get('relay_ack', False),
+            relay_retries=config['connection'].get('relay_retries', 2),
+            reliable=self.reliable
         )
         
         self.keep_alive = KeepAlive(
@@ -71,6 +128,22 @@ class P2PClient:
             self._connect_to_peer
         )
         
+        # Malha parcial: mantém ~target_degree vizinhos (0 = conecta a todos os descobertos)
+        target_degree = config['connection'].get('target_degree', 0)
+        self.topology = None
+        if target_degree > 0:
+            self.topology = TopologyManager(
+                self.peer_id,
+                self.peer_table,
+                self.state.get_all_connections,
+                self._connect_to_peer,
+                self._disconnect_peer,
+                target_degree=target_degree,
+                max_degree=config['connection'].get('max_degree'),
+                rotate_interval=config['connection'].get('rotate_interval', 300),
+                rotate_slots=config['connection'].get('rotate_slots', 1)
+            )
+        
         self.cli = CLI(
             on_peers=self._cmd_peers,
             on_msg=self._cmd_msg,
@@ -80,7 +153,8 @@ class P2PClient:
             on_reconnect=self._cmd_reconnect,
             on_log=self._cmd_log,
             on_quit=self._cmd_quit,
-            on_relay=self._cmd_relay
+            on_relay=self._cmd_relay,
+            on_routes=self._cmd_routes
         )
         
         # Controle
@@ -88,14 +162,26 @@ class P2PClient:
         self.stop_event = threading.Event()  # Evento para interromper sleeps
         self.discovery_thread = None
         self.ping_thread = None
+        self.refresh_thread = None
+        self.route_thread = None
         self.discovery_interval = config['connection']['discovery_interval']
+        
+        # TTL do registro e renovação periódica (REFRESH) a uma fração do TTL
+        self.register_ttl = config['rendezvous'].get('ttl', 7200)
+        self.refresh_fraction = config['rendezvous'].get('refresh_fraction', 0.5)
+        
+        # DISCOVER paginado, apenas com os campos usados pelo cliente
+        self.discover_page_size = config['rendezvous'].get('discover_page_size', 200)
     
     def start(self):
         """Inicia o cliente P2P"""
         logger.info(f"Starting P2P Client: {self.peer_id}")
         
+        # Em modo cluster, aprende o anel para falar direto com o shard de cada namespace
+        self.rendezvous.load_ring()
+        
         # Registra no Rendezvous
-        result = self.rendezvous.register(self.namespace, self.name, self.port)
+        result = self.rendezvous.register(self.namespace, self.name, self.port, self.register_ttl)
         if not result:
             logger.error("Failed to register with Rendezvous server")
             return False
@@ -104,24 +190,44 @@ class P2PClient:
         self.my_public_ip = result.get('ip')
         logger.info(f"Registered with Rendezvous: {result}")
         
+        if self.engine:
+            self.engine.start()
+        
         # Inicia servidor de peers
         if not self.peer_server.start():
             logger.error("Failed to start peer server")
             return False
         
         # Inicia componentes
-        self.message_router.start()
-        self.keep_alive.start()
-        self.peer_table.start()
-        
-        # Inicia descoberta
+        threaded = self.engine is None
+        self.message_router.start(threaded=threaded)
+        self.reliable.start(threaded=threaded)
+        self.keep_alive.start(threaded=threaded)
+        # com topologia, a reconexão é feita pelo TopologyManager (só até o grau alvo)
+        self.peer_table.start(threaded=threaded and self.topology is None)
+        if self.topology:
+            self.topology.start(threaded=threaded)
         self.running = True
-        self.discovery_thread = threading.Thread(target=self._discovery_loop, daemon=True)
-        self.discovery_thread.start()
         
-        # Inicia ping periódico
-        self.ping_thread = threading.Thread(target=self._ping_loop, daemon=True)
-        self.ping_thread.start()
+        if self.engine:
+            self._schedule_async_tasks()
+        else:
+            # Inicia descoberta
+            self.discovery_thread = threading.Thread(target=self._discovery_loop, daemon=True)
+            self.discovery_thread.start()
+            
+            # Inicia ping periódico
+            self.ping_thread = threading.Thread(target=self._ping_loop, daemon=True)
+            self.ping_thread.start()
+            
+            # Inicia anúncio de rotas
+            self.route_thread = threading.Thread(target=self._route_loop, daemon=True)
+            self.route_thread.start()
+            
+            # Inicia renovação do registro
+            if self.refresh_fraction and 0 < self.refresh_fraction < 1:
+                self.refresh_thread = threading.Thread(target=self._refresh_loop, daemon=True)
+                self.refresh_thread.start()
         
         # Inicia CLI
         self.cli.start()
@@ -129,6 +235,23 @@ class P2PClient:
         logger.info("P2P Client started successfully")
         return True
     
+    def _schedule_async_tasks(self):
+        """Laços periódicos como tarefas do event loop (motor asyncio)"""
+        # Rendezvous e conexões de saída usam sockets bloqueantes: rodam no pool do motor
+        self.engine.every(self.discovery_interval, self._discover_peers, "discovery",
+                          blocking=True, initial=True)
+        if self.topology:
+            self.engine.every(5, self.topology.maintain, "topology", blocking=True)
+        else:
+            self.engine.every(5, self.peer_table.reconnect_round, "reconnect", blocking=True)
+        self.engine.every(self.keep_alive.ping_interval, self._ping_all, "ping")
+        self.engine.every(self.route_interval, self._advertise_routes, "routes")
+        self.engine.every(1, self.message_router.expire_acks, "ack timeouts")
+        self.engine.every(self.reliable.ack_delay, self.reliable.tick, "reliable")
+        if self.refresh_fraction and 0 < self.refresh_fraction < 1:
+            self.engine.every(max(1, self.register_ttl * self.refresh_fraction),
+                              self._refresh_registration, "refresh", blocking=True)
+    
     def stop(self):
         """Para o cliente P2P"""
         logger.info("Stopping P2P Client...")
@@ -140,8 +263,11 @@ class P2PClient:
         
         # Para todos os componentes que podem interferir no desligamento
         self.peer_table.stop()
+        if self.topology:
+            self.topology.stop()
         self.keep_alive.stop()
         self.message_router.stop()
+        self.reliable.stop()
         self.peer_server.stop()  # Para de aceitar novas conexões
         
         # Aguarda threads terminarem
@@ -149,20 +275,27 @@ class P2PClient:
             self.discovery_thread.join(timeout=2)
         if self.ping_thread and self.ping_thread.is_alive():
             self.ping_thread.join(timeout=2)
+        if self.refresh_thread and self.refresh_thread.is_alive():
+            self.refresh_thread.join(timeout=2)
+        if self.route_thread and self.route_thread.is_alive():
+            self.route_thread.join(timeout=2)
         
         # Agora envia BYE para todos os peers conectados
-        with self.conn_lock:
-            for peer_id in list(self.connections.keys()):
-                self._send_bye(peer_id)
+        for peer_id in self._get_connected_peer_ids():
+            self._send_bye(peer_id)
         
         # Dá tempo para peers responderem com BYE_OK
         time.sleep(0.5)
         
-        # Fecha todas as conexões
+        # Fecha todas as conexões (stop() esvazia a fila de saída; fora do lock)
         with self.conn_lock:
-            for conn in self.connections.values():
-                conn.stop()
+            conns = list(self.connections.values())
             self.connections.clear()
+        for conn in conns:
+            conn.stop()
+        
+        if self.engine:
+            self.engine.stop()
         
         # Remove registro do Rendezvous
         self.rendezvous.unregister(self.namespace, self.name, self.port)
@@ -191,12 +324,17 @@ class P2PClient:
             return
             
         logger.info("[Discovery] Discovering peers...")
-        peers = self.rendezvous.discover()
+        peers = self._discover()
         
         if peers and self.running:
             logger.info(f"[Discovery] Found {len(peers)} peers")
             self.peer_table.update_peers(peers, self.peer_id)
             
+            if self.topology:
+                # Conecta só até o grau alvo, escolhendo os melhores candidatos
+                self.topology.maintain()
+                return
+            
             # Tenta conectar a peers desconectados (ignora se já está conectando)
             for peer_data in peers:
                 peer_id = f"{peer_data['name']}@{peer_data['namespace']}"
@@ -207,6 +345,35 @@ class P2PClient:
                         if not self._connect_to_peer(peer):
                             peer.status = PeerStatus.DISCONNECTED
     
+    def _refresh_loop(self):
+        """Renova o registro no Rendezvous a uma fração do TTL"""
+        interval = max(1, self.register_ttl * self.refresh_fraction)
+        
+        while self.running:
+            try:
+                if self.stop_event.wait(timeout=interval):
+                    break
+                if not self.running:
+                    break
+                self._refresh_registration()
+            except Exception as e:
+                logger.error(f"Error in refresh loop: {e}")
+    
+    def _refresh_registration(self):
+        """Renova o registro (REFRESH), registrando de novo se o servidor o perdeu"""
+        if self.rendezvous.refresh(self.namespace, self.name) is None:
+            # Registro expirou ou o servidor o perdeu: registra novamente
+            logger.info("[Refresh] Record not found, registering again")
+            self.rendezvous.register(self.namespace, self.name, self.port, self.register_ttl)
+    
+    def _discover(self, namespace: Optional[str] = None) -> list:
+        """DISCOVER paginado com projeção dos campos usados pela tabela de peers"""
+        return self.rendezvous.discover(
+            namespace,
+            page_size=self.discover_page_size,
+            fields=["name", "namespace", "ip", "port"]
+        )
+    
     def _ping_loop(self):
         """Envia PINGs periodicamente"""
         while self.running:
@@ -216,14 +383,41 @@ class P2PClient:
                     break  # Evento sinalizado, sair do loop
                 if not self.running:
                     break
-                
-                with self.conn_lock:
-                    for peer_id in list(self.connections.keys()):
-                        self.keep_alive.send_ping(peer_id)
+                self._ping_all()
                 
             except Exception as e:
                 logger.error(f"Error in ping loop: {e}")
     
+    def _ping_all(self):
+        """Envia PING para todos os peers conectados"""
+        for peer_id in self._get_connected_peer_ids():
+            self.keep_alive.send_ping(peer_id)
+    
+    def _route_loop(self):
+        """Anuncia rotas aos vizinhos periodicamente"""
+        while self.running:
+            try:
+                if self.stop_event.wait(timeout=self.route_interval):
+                    break
+                if not self.running:
+                    break
+                self._advertise_routes()
+            except Exception as e:
+                logger.error(f"Error in route loop: {e}")
+    
+    def _advertise_routes(self):
+        """Envia ROUTE (com poisoned reverse) a cada vizinho que suporta roteamento"""
+        for peer_id in self._get_connected_peer_ids():
+            if "routing" not in self.peer_features.get(peer_id, ()):
+                continue
+            for routes in self.routing.advertisements(peer_id):
+                self._send_message_to_peer(peer_id, Message(
+                    msg_type=MessageType.ROUTE,
+                    msg_id=str(uuid.uuid4()),
+                    src=self.peer_id,
+                    routes=routes
+                ))
+    
     def _connect_to_peer(self, peer: PeerInfo) -> bool:
         """Estabelece conexão de saída para um peer"""
         with self.conn_lock:
@@ -244,57 +438,35 @@ class P2PClient:
             
             logger.info(f"Connecting to {peer.peer_id} at {target_ip}:{peer.port}")
             
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(10)
-            sock.connect((target_ip, peer.port))
-            
             # Envia HELLO
             hello = Message(
                 msg_type=MessageType.HELLO,
                 msg_id=str(uuid.uuid4()),
                 src=self.peer_id,
                 version="1.0",
-                features=["ack", "metrics"]
+                features=PROTOCOL_FEATURES
             )
             
-            hello_json = hello.to_dict()
-            import json
-            sock.sendall((json.dumps(hello_json) + "\n").encode('utf-8'))
-            
-            # Aguarda HELLO_OK
-            data = b""
-            while b'\n' not in data:
-                chunk = sock.recv(4096)
-                if not chunk:
-                    logger.error(f"Connection closed by {peer.peer_id} before HELLO_OK")
-                    sock.close()
+            framer = None
+            if self.engine:
+                # handshake feito no event loop; esta thread só aguarda o resultado
+                link = self.engine.connect(peer.peer_id, target_ip, peer.port, hello)
+                features = link.features
+            else:
+                link, framer, features = self._handshake_outbound(peer, target_ip, hello)
+                if link is None:
                     return False
-                data += chunk
-            
-            line, _ = data.split(b'\n', 1)
-            import json
-            hello_ok_dict = json.loads(line.decode('utf-8'))
-            hello_ok = Message.from_dict(hello_ok_dict)
-            
-            if hello_ok.msg_type != MessageType.HELLO_OK:
-                logger.error(f"Expected HELLO_OK from {peer.peer_id}, got {hello_ok.msg_type.value}")
-                sock.close()
-                return False
             
             logger.info(f"Connected to {peer.peer_id} (outbound)")
             
             # Cria conexão
-            conn = PeerConnection(
-                peer.peer_id,
-                sock,
-                "outbound",
-                self._on_message,
-                self._on_disconnect
-            )
+            conn = self._new_connection(peer.peer_id, link, "outbound", framer)
             
             with self.conn_lock:
                 self.connections[peer.peer_id] = conn
             
+            # antes de começar a ler: o que chegar já encontra o canal confiável
+            self._add_neighbor(peer.peer_id, features)
             conn.start()
             
             self.peer_table.mark_connected(peer.peer_id)
@@ -303,9 +475,13 @@ class P2PClient:
                 direction="outbound",
                 connected_at=datetime.now()
             ))
+            self.keep_alive.send_ping(peer.peer_id)  # mede o enlace logo (custo da rota)
             
             return True
             
+        except PeerRefused as e:
+            logger.info(str(e))
+            return False
         except Exception as e:
             logger.error(f"Failed to connect to {peer.peer_id}: {e}")
             return False
@@ -313,23 +489,83 @@ class P2PClient:
             with self.conn_lock:
                 self.connecting_peers.discard(peer.peer_id)
     
-    def _on_inbound_connection(self, peer_id: str, sock: socket.socket):
-        """Trata conexão de entrada"""
+    def _handshake_outbound(self, peer: PeerInfo, target_ip: str,
+                            hello: Message) -> Tuple[Optional[socket.socket], Optional[LineFramer], list]:
+        """
+        Conecta e faz o handshake HELLO/HELLO_OK com sockets bloqueantes.
+        Retorna (socket, framer, recursos do peer); socket None se falhou.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(10)
+        sock.connect((target_ip, peer.port))
+        
+        sock.sendall(codec.dumpb(hello.to_dict()) + b"\n")
+        
+        # Aguarda HELLO_OK
+        framer = LineFramer()
+        line = framer.next_line()
+        while line is None:
+            if not framer.recv(sock):
+                logger.error(f"Connection closed by {peer.peer_id} before HELLO_OK")
+                sock.close()
+                return None, None, []
+            line = framer.next_line()
+        
+        hello_ok_dict = codec.loads(line)
+        hello_ok = Message.from_dict(hello_ok_dict)
+        
+        if hello_ok.msg_type == MessageType.BYE:
+            logger.info(f"{peer.peer_id} refused connection: {hello_ok.reason}")
+            sock.close()
+            return None, None, []
+        
+        if hello_ok.msg_type != MessageType.HELLO_OK:
+            logger.error(f"Expected HELLO_OK from {peer.peer_id}, got {hello_ok.msg_type.value}")
+            sock.close()
+            return None, None, []
+        
+        # o framer segue com a conexão: bytes após o HELLO_OK não se perdem
+        return sock, framer, hello_ok.features or []
+    
+    def _new_connection(self, peer_id: str, link, direction: str, framer: Optional[LineFramer] = None):
+        """Cria a conexão do motor em uso sobre um socket ou StreamLink já com handshake"""
+        if self.engine:
+            return AsyncPeerConnection(peer_id, link, direction, self._on_message, self._on_disconnect,
+                                       overflow=self.send_overflow,
+                                       on_frame=self.message_router.forward_relay_frame)
+        return PeerConnection(peer_id, link, direction, self._on_message, self._on_disconnect, framer,
+                              send_queue_size=self.send_queue_size, overflow=self.send_overflow,
+                              on_frame=self.message_router.forward_relay_frame)
+    
+    def _accept_inbound(self, peer_id: str) -> bool:
+        """Handshake de entrada: recusa novos vizinhos quando o grau máximo foi atingido"""
+        return not self.topology or peer_id in self.connections or self.topology.has_room()
+    
+    def _add_neighbor(self, peer_id: str, features: list):
+        """Novo vizinho: registra seus recursos (chamado antes de a conexão começar a ler)"""
+        self.peer_features[peer_id] = features
+        self.routing.add_neighbor(peer_id)
+        if "reliable" in features:
+            self.reliable.add_peer(peer_id)
+    
+    def _on_inbound_connection(self, peer_id: str, link, framer: Optional[LineFramer] = None,
+                               features: Optional[list] = None):
+        """Trata conexão de entrada (link: socket ou StreamLink, conforme o motor)"""
         with self.conn_lock:
             if peer_id in self.connections:
                 logger.warning(f"Already have connection with {peer_id}, closing new inbound")
-                sock.close()
+                link.close()
+                return
+            if self.topology and not self.topology.has_room():
+                logger.info(f"Max degree reached, refusing inbound from {peer_id}")
+                link.close()
                 return
             
-            conn = PeerConnection(
-                peer_id,
-                sock,
-                "inbound",
-                self._on_message,
-                self._on_disconnect
-            )
+            conn = self._new_connection(peer_id, link, "inbound", framer)
             
             self.connections[peer_id] = conn
+            # antes de começar a ler: o que chegar já encontra o canal confiável
+            self._add_neighbor(peer_id, features or [])
             conn.start()
             
             self.state.add_connection(ConnectionInfo(
@@ -354,6 +590,8 @@ class P2PClient:
                 self.peer_table.peers[peer_id] = peer_info
             else:
                 self.peer_table.mark_connected(peer_id)
+        
+        self.keep_alive.send_ping(peer_id)  # mede o enlace logo (custo da rota)
     
     def _on_disconnect(self, peer_id: str):
         """Trata desconexão de peer"""
@@ -366,6 +604,9 @@ class P2PClient:
         self.peer_table.mark_disconnected(peer_id)
         self.keep_alive.clear_peer(peer_id)
         self.message_router.clear_peer(peer_id)
+        self.reliable.clear_peer(peer_id)
+        self.routing.remove_neighbor(peer_id)
+        self.peer_features.pop(peer_id, None)
     
     def _on_message(self, peer_id: str, message: Message):
         """Trata mensagem recebida de peer"""
@@ -382,26 +623,37 @@ class P2PClient:
         
         elif msg_type == MessageType.PONG:
             # Trata PONG
-            self.keep_alive.handle_pong(peer_id, message.msg_id, self.state.update_peer_rtt)
+            self.keep_alive.handle_pong(peer_id, message.msg_id, self._on_rtt)
         
         elif msg_type == MessageType.SEND:
+            if message.seq is not None:
+                # Canal confiável: entrega em ordem (via _deliver_direct) e ACK em lote
+                self.reliable.handle_send(peer_id, message)
+                return
+            
             # Mensagem direta
-            print(f"\n[{peer_id}] {message.payload}")
+            self._deliver_direct(peer_id, message)
             
             if message.require_ack:
                 self.message_router.send_ack(peer_id, message.msg_id)
         
         elif msg_type == MessageType.PUB:
-            # Mensagem publicada
-            print(f"\n[{peer_id} -> {message.dst}] {message.payload}")
+            # Mensagem publicada (descarta duplicatas; em gossip, repassa adiante)
+            if self.message_router.handle_pub(peer_id, message):
+                print(f"\n[{message.src or peer_id} -> {message.dst}] {message.payload}")
         
         elif msg_type == MessageType.ACK:
-            # ACK para mensagem enviada
-            self.message_router.handle_ack(peer_id, message.msg_id)
+            # ACK para mensagem enviada (cumulativo/seletivo no canal confiável)
+            if message.ack is not None:
+                self.reliable.handle_ack(peer_id, message)
+            else:
+                self.message_router.handle_ack(peer_id, message.msg_id)
         
         elif msg_type == MessageType.BYE:
             # Peer está saindo
             logger.info(f"Received BYE from {peer_id}: {message.reason}")
+            if self.topology:
+                self.topology.peer_left(peer_id)
             
             # Envia BYE_OK
             bye_ok = Message(
@@ -412,46 +664,77 @@ class P2PClient:
             )
             self._send_message_to_peer(peer_id, bye_ok)
             
-            # Fecha conexão
+            # Fecha conexão (depois de enviar o BYE_OK que está na fila)
             with self.conn_lock:
                 conn = self.connections.get(peer_id)
-                if conn:
-                    conn.stop()
+            if conn:
+                conn.stop()
         
         elif msg_type == MessageType.BYE_OK:
             # Peer confirmou nosso BYE
             logger.info(f"Received BYE_OK from {peer_id}")
         
+        elif msg_type == MessageType.ROUTE:
+            # Anúncio de rotas do vizinho
+            self.routing.handle_route(peer_id, message.routes or {})
+        
         elif msg_type == MessageType.RELAY:
-            # Mensagem de relay - para nós ou para encaminhar
-            if message.dst == self.peer_id:
-                # Mensagem é para nós - exibe
+            # Mensagem de relay - para nós (exibe e confirma) ou para encaminhar
+            if self.message_router.handle_relay(peer_id, message):
                 print(f"\n[RELAY from {message.src}] {message.payload}")
-            else:
-                # Encaminha a mensagem de relay
-                self.message_router.handle_relay(peer_id, message)
+        
+        elif msg_type == MessageType.RELAY_ACK:
+            # Confirmação fim a fim de um RELAY
+            self.message_router.handle_relay_ack(peer_id, message)
+    
+    def _deliver_direct(self, peer_id: str, message: Message):
+        """Exibe uma mensagem direta recebida"""
+        print(f"\n[{peer_id}] {message.payload}")
+    
+    def _on_rtt(self, peer_id: str, rtt: float):
+        """Nova amostra de RTT (ms) de um vizinho"""
+        self.state.update_peer_rtt(peer_id, rtt)
+        self.peer_table.record_rtt(peer_id, rtt)
+        self.routing.update_link(peer_id, rtt)
     
     def _send_message_to_peer(self, peer_id: str, message: Message) -> bool:
         """Envia mensagem para um peer específico"""
+        # o envio só enfileira, mas não precisa do lock: um peer lento não trava os demais
         with self.conn_lock:
             conn = self.connections.get(peer_id)
-            if conn:
-                return conn.send_message(message)
-            else:
-                logger.warning(f"No connection to {peer_id}")
-                return False
+        if conn:
+            return conn.send_message(message)
+        logger.warning(f"No connection to {peer_id}")
+        return False
+    
+    def _send_frame_to_peer(self, peer_id: str, frame: bytes) -> bool:
+        """Envia um quadro já serializado para um peer específico"""
+        with self.conn_lock:
+            conn = self.connections.get(peer_id)
+        if conn:
+            return conn.send_frame(frame)
+        logger.warning(f"No connection to {peer_id}")
+        return False
     
-    def _send_bye(self, peer_id: str):
+    def _send_bye(self, peer_id: str, reason: str = "Client shutting down"):
         """Envia BYE para um peer"""
         bye = Message(
             msg_type=MessageType.BYE,
             msg_id=str(uuid.uuid4()),
             src=self.peer_id,
             dst=peer_id,
-            reason="Client shutting down"
+            reason=reason
         )
         self._send_message_to_peer(peer_id, bye)
     
+    def _disconnect_peer(self, peer_id: str, reason: str):
+        """Encerra a conexão com um vizinho (BYE e fechamento)"""
+        self._send_bye(peer_id, reason)
+        with self.conn_lock:
+            conn = self.connections.get(peer_id)
+        if conn:
+            conn.stop()
+    
     def _get_connected_peer_ids(self) -> list:
         """Obtém lista de IDs de peers conectados"""
         with self.conn_lock:
@@ -470,10 +753,10 @@ class P2PClient:
     def _cmd_peers(self, scope: str):
         """Trata comando /peers"""
         if scope == "*":
-            peers = self.rendezvous.discover()
+            peers = self._discover()
         elif scope.startswith("#"):
             namespace = scope[1:]
-            peers = self.rendezvous.discover(namespace)
+            peers = self._discover(namespace)
         else:
             print("Invalid scope. Use '*' or '#namespace'")
             return
@@ -497,8 +780,33 @@ class P2PClient:
             print(f"{peer_id:30} {peer['ip']:15}:{peer['port']:5} [{status}]")
         print("-" * 60)
     
+    def _resolve_and_connect(self, peer_id: str) -> bool:
+        """Resolve um peer desconhecido via LOOKUP e tenta conexão direta"""
+        name, sep, namespace = peer_id.rpartition('@')
+        if not sep:
+            return False
+        
+        records = self.rendezvous.lookup(namespace, name)
+        if not records:
+            return False
+        
+        peer = self.peer_table.upsert_peer(records[0])
+        if peer.status == PeerStatus.CONNECTED:
+            return peer_id in self.connections
+        
+        peer.status = PeerStatus.CONNECTING
+        if self._connect_to_peer(peer):
+            return True
+        peer.status = PeerStatus.DISCONNECTED
+        return False
+    
     def _cmd_msg(self, peer_id: str, message: str):
         """Trata comando /msg"""
+        if (peer_id not in self.connections and not self.peer_table.get_peer(peer_id)
+                and (not self.topology or self.topology.has_room())):
+            # Peer desconhecido: resolve apenas ele em vez de um DISCOVER completo
+            self._resolve_and_connect(peer_id)
+        
         if peer_id in self.connections:
             # Conexão direta disponível
             self.message_router.send_direct(peer_id, message)
@@ -522,6 +830,20 @@ class P2PClient:
         else:
             print(f"Failed to relay message to {peer_id} - no relay peer available")
     
+    def _cmd_routes(self):
+        """Trata comando /routes"""
+        rows = self.routing.table()
+        
+        if not rows:
+            print("No routes")
+            return
+        
+        print(f"\nRoutes ({len(rows)}):")
+        print("-" * 60)
+        for dst, cost, hops, next_hop in rows:
+            print(f"{dst:30} via {next_hop:20} {cost:8.2f} ms {hops} hop(s)")
+        print("-" * 60)
+    
     def _cmd_conn(self):
         """Trata comando /conn"""
         connections = self.state.get_all_connections()
@@ -546,11 +868,19 @@ class P2PClient:
         for peer_id, peer in peers.items():
             if peer.avg_rtt is not None:
                 print(f"{peer_id:30} {peer.avg_rtt:.2f} ms")
+        
+        relayed = self.message_router.relay_rtt()
+        if relayed:
+            print("Relayed (end to end):")
+            for peer_id, rtt in sorted(relayed.items()):
+                print(f"{peer_id:30} {rtt:.2f} ms")
         print("-" * 60)
     
     def _cmd_reconnect(self):
         """Trata comando /reconnect"""
         self.peer_table.force_reconnect()
+        if self.topology:
+            self.topology.reset_backoff()
         print("Forced reconnection for all disconnected peers")
     
     def _cmd_log(self, level: str):
@@ -2,103 +2,218 @@
 Manipulador de conexão peer-to-peer
 """
 import socket
-import json
 import logging
 import threading
 import uuid
+from collections import deque
 from typing import Optional, Callable
 from datetime import datetime
-from models import Message, MessageType
+from models import Message, MessageType, PROTOCOL_FEATURES
+from framing import LineFramer, LineTooLong
+from common import codec
 
 logger = logging.getLogger(__name__)
 
 
+OVERFLOW_POLICIES = ("drop_oldest", "drop_new", "disconnect")
+MAX_BATCH_FRAMES = 256  # quadros por escrita (abaixo do IOV_MAX de sendmsg)
+
+
 class PeerConnection:
-    """Gerencia uma única conexão TCP peer-to-peer"""
+    """
+    Gerencia uma única conexão TCP peer-to-peer.
+    
+    Envios não tocam a rede na thread de quem chama: o quadro vai para uma fila
+    limitada e uma thread de escrita junta tudo o que estiver na fila em uma
+    única chamada sendmsg/sendall. Quando a fila enche (peer lento), a política
+    `overflow` decide: descartar o quadro mais antigo, descartar o novo ou
+    desconectar o peer.
+    """
     
     def __init__(self, peer_id: str, sock: socket.socket, direction: str, 
                  on_message: Callable[[str, Message], None],
-                 on_disconnect: Callable[[str], None]):
+                 on_disconnect: Callable[[str], None],
+                 framer: Optional[LineFramer] = None,
+                 send_queue_size: int = 1024,
+                 overflow: str = "drop_oldest",
+                 on_frame: Optional[Callable[[str, bytes], bool]] = None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
         self.peer_id = peer_id
         self.sock = sock
         self.direction = direction  # "inbound" (entrada) ou "outbound" (saída)
         self.on_message = on_message
         self.on_disconnect = on_disconnect
+        # vê a linha crua antes da decodificação; True = já tratada (relay rápido)
+        self.on_frame = on_frame
         self.running = False
         self.recv_thread = None
         self.max_line_size = 32768
-        self.send_lock = threading.Lock()
+        # framer do handshake, se houver: preserva bytes recebidos logo após o HELLO
+        self.framer = framer or LineFramer(self.max_line_size)
+        
+        # Fila de saída
+        self.send_queue_size = send_queue_size
+        self.overflow = overflow
+        self.out_queue: deque = deque()
+        self.out_cond = threading.Condition()
+        self.send_thread = None
+        self.dropped = 0  # quadros descartados por fila cheia
     
     def start(self):
-        """Inicia recebimento de mensagens"""
+        """Inicia recebimento e envio de mensagens"""
         self.running = True
         self.recv_thread = threading.Thread(target=self._receive_loop, daemon=True)
         self.recv_thread.start()
+        self.send_thread = threading.Thread(target=self._send_loop, daemon=True)
+        self.send_thread.start()
     
-    def stop(self):
-        """Para a conexão"""
-        self.running = False
+    def stop(self, flush: bool = True):
+        """Para a conexão (com flush=True, envia antes o que estiver na fila)"""
+        with self.out_cond:
+            self.running = False
+            if not flush:
+                self.out_queue.clear()
+            self.out_cond.notify()
+        
+        if (flush and self.send_thread and self.send_thread.is_alive()
+                and self.send_thread is not threading.current_thread()):
+            self.send_thread.join(timeout=1)
+        
+        try:
+            # shutdown acorda o recv bloqueado na thread de recepção
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
         try:
             self.sock.close()
         except:
             pass
     
     def send_message(self, message: Message) -> bool:
-        """Envia uma mensagem para o peer"""
+        """Enfileira uma mensagem para o peer (não bloqueia na rede)"""
         try:
-            with self.send_lock:
-                msg_json = json.dumps(message.to_dict()) + "\n"
-                msg_bytes = msg_json.encode('utf-8')
-                
-                if len(msg_bytes) > self.max_line_size:
-                    logger.error(f"Message too large: {len(msg_bytes)} bytes")
-                    return False
-                
-                self.sock.sendall(msg_bytes)
-                logger.debug(f"Sent {message.msg_type.value} to {self.peer_id}")
-                return True
+            if not self.send_frame(codec.dumpb(message.to_dict()) + b"\n"):
+                return False
+            logger.debug(f"Sent {message.msg_type.value} to {self.peer_id}")
+            return True
         except Exception as e:
             logger.error(f"Error sending message to {self.peer_id}: {e}")
             return False
     
+    def send_frame(self, frame: bytes) -> bool:
+        """
+        Enfileira um quadro já serializado (terminado em '\n').
+        O mesmo objeto bytes pode ir para várias conexões (fan-out do PUB).
+        """
+        if len(frame) > self.max_line_size:
+            logger.error(f"Message too large: {len(frame)} bytes")
+            return False
+        return self._enqueue(frame)
+    
+    def _enqueue(self, frame: bytes) -> bool:
+        """Coloca um quadro na fila de saída, aplicando a política de overflow"""
+        with self.out_cond:
+            if not self.running:
+                return False
+            
+            full = len(self.out_queue) >= self.send_queue_size
+            if full:
+                self.dropped += 1
+                if self.overflow == "drop_oldest":
+                    logger.debug(f"Send queue full for {self.peer_id}, dropping oldest frame")
+                    self.out_queue.popleft()
+                    full = False
+                elif self.overflow == "drop_new":
+                    logger.debug(f"Send queue full for {self.peer_id}, dropping new frame")
+                    return False
+            
+            if not full:
+                self.out_queue.append(frame)
+                self.out_cond.notify()
+                return True
+        
+        # "disconnect": o peer não acompanha o ritmo de envio
+        logger.warning(f"Send queue full for {self.peer_id}, disconnecting")
+        self.stop(flush=False)
+        return False
+    
+    def _send_loop(self):
+        """Thread de escrita: esvazia a fila, juntando os quadros pendentes"""
+        try:
+            while True:
+                with self.out_cond:
+                    while not self.out_queue and self.running:
+                        self.out_cond.wait()
+                    if not self.out_queue:
+                        break  # parada com a fila vazia
+                    count = min(len(self.out_queue), MAX_BATCH_FRAMES)
+                    frames = [self.out_queue.popleft() for _ in range(count)]
+                
+                self._write_frames(frames)
+        
+        except Exception as e:
+            if self.running:
+                logger.error(f"Error sending to {self.peer_id}: {e}")
+                # derruba a conexão; o laço de recepção notifica a desconexão
+                self.stop(flush=False)
+    
+    def _write_frames(self, frames: list):
+        """Escreve vários quadros com uma única chamada de sistema (quando possível)"""
+        if len(frames) == 1 or not hasattr(self.sock, "sendmsg"):
+            self.sock.sendall(b"".join(frames))
+            return
+        
+        sent = self.sock.sendmsg(frames)
+        total = sum(len(f) for f in frames)
+        if sent < total:
+            # envio parcial: completa o restante
+            self.sock.sendall(b"".join(frames)[sent:])
+    
     def _receive_loop(self):
         """Recebe mensagens do peer"""
-        buffer = b""
+        framer = self.framer
         
         try:
             while self.running:
                 try:
-                    chunk = self.sock.recv(4096)
-                    if not chunk:
-                        logger.info(f"Connection closed by {self.peer_id}")
-                        break
-                    
-                    buffer += chunk
-                    
-                    # Processa linhas completas
-                    while b'\n' in buffer:
-                        line, buffer = buffer.split(b'\n', 1)
-                        
-                        if len(line) > self.max_line_size:
+                    # Processa linhas completas (inclusive as que chegaram com o handshake)
+                    while True:
+                        try:
+                            line = framer.next_line()
+                        except LineTooLong:
                             logger.error(f"Line too long from {self.peer_id}")
                             continue
+                        if line is None:
+                            break
                         
                         try:
-                            line_str = line.decode('utf-8').strip()
-                            if line_str:
-                                msg_dict = json.loads(line_str)
+                            if self.on_frame and self.on_frame(self.peer_id, line):
+                                continue
+                            if line.strip():
+                                msg_dict = codec.loads(line)
                                 message = Message.from_dict(msg_dict)
                                 logger.debug(f"Received {message.msg_type.value} from {self.peer_id}")
                                 self.on_message(self.peer_id, message)
-                        except json.JSONDecodeError as e:
+                        except codec.DecodeError as e:
                             logger.error(f"Invalid JSON from {self.peer_id}: {e}")
                         except Exception as e:
                             logger.error(f"Error processing message from {self.peer_id}: {e}")
+                    
+                    # on_message pode ter fechado a conexão (BYE)
+                    if not self.running:
+                        break
+                    if not framer.recv(self.sock):
+                        logger.info(f"Connection closed by {self.peer_id}")
+                        break
                 
+                except LineTooLong:
+                    logger.error(f"Line too long from {self.peer_id}")
                 except socket.timeout:
                     continue
                 except Exception as e:
-                    logger.error(f"Error in receive loop for {self.peer_id}: {e}")
+                    if self.running:
+                        logger.error(f"Error in receive loop for {self.peer_id}: {e}")
                     break
         
         finally:
@@ -106,14 +221,27 @@ class PeerConnection:
             self.on_disconnect(self.peer_id)
 
 
+def refusal(my_peer_id: str, remote_peer_id: str) -> Message:
+    """BYE enviado no lugar do HELLO_OK quando o nó não aceita mais vizinhos"""
+    return Message(
+        msg_type=MessageType.BYE,
+        msg_id=str(uuid.uuid4()),
+        src=my_peer_id,
+        dst=remote_peer_id,
+        reason="Max degree reached"
+    )
+
+
 class PeerServer:
     """Escuta conexões de entrada de peers"""
     
     def __init__(self, port: int, peer_id: str,
-                 on_connection: Callable[[str, socket.socket], None]):
+                 on_connection: Callable[[str, socket.socket, LineFramer, list], None],
+                 accept: Optional[Callable[[str], bool]] = None):
         self.port = port
         self.peer_id = peer_id
         self.on_connection = on_connection
+        self.accept = accept  # decide se aceita o peer antes do HELLO_OK
         self.server_sock = None
         self.running = False
         self.accept_thread = None
@@ -172,17 +300,17 @@ class PeerServer:
             sock.settimeout(10)
             
             # Aguarda HELLO
-            data = b""
-            while b'\n' not in data:
-                chunk = sock.recv(4096)
-                if not chunk:
-                    logger.warning(f"Connection closed before HELLO from {addr}")
+            framer = LineFramer()
+            line = framer.next_line()
+            while line is None:
+                if not framer.recv(sock):
+                    # conexões sem HELLO são, em geral, sondas de vivacidade do Rendezvous
+                    logger.debug(f"Connection closed before HELLO from {addr}")
                     sock.close()
                     return
-                data += chunk
+                line = framer.next_line()
             
-            line, _ = data.split(b'\n', 1)
-            hello_dict = json.loads(line.decode('utf-8'))
+            hello_dict = codec.loads(line)
             hello_msg = Message.from_dict(hello_dict)
             
             if hello_msg.msg_type != MessageType.HELLO:
@@ -193,22 +321,27 @@ class PeerServer:
             remote_peer_id = hello_msg.src
             logger.info(f"[PeerServer] HELLO from {remote_peer_id}")
             
+            if self.accept and not self.accept(remote_peer_id):
+                logger.info(f"[PeerServer] Refusing {remote_peer_id}: max degree reached")
+                sock.sendall(codec.dumpb(refusal(self.peer_id, remote_peer_id).to_dict()) + b"\n")
+                sock.close()
+                return
+            
             # Envia HELLO_OK
             hello_ok = Message(
                 msg_type=MessageType.HELLO_OK,
                 msg_id=str(uuid.uuid4()),
                 src=self.peer_id,
                 version="1.0",
-                features=["ack", "metrics"]
+                features=PROTOCOL_FEATURES
             )
             
-            hello_ok_json = json.dumps(hello_ok.to_dict()) + "\n"
-            sock.sendall(hello_ok_json.encode('utf-8'))
+            sock.sendall(codec.dumpb(hello_ok.to_dict()) + b"\n")
             
             logger.info(f"[PeerServer] Inbound connected: {remote_peer_id}")
             
             # Notifica o pai
-            self.on_connection(remote_peer_id, sock)
+            self.on_connection(remote_peer_id, sock, framer, hello_msg.features or [])
             
         except Exception as e:
             logger.error(f"Error handling inbound connection from {addr}: {e}")
@@ -4,6 +4,7 @@ Gerenciamento da tabela de peers com lógica de reconexão
 import logging
 import threading
 import time
+from datetime import datetime
 from typing import Dict, Callable
 from models import PeerInfo, PeerStatus
 
@@ -26,11 +27,15 @@ class PeerTable:
         self.running = False
         self.reconnect_thread = None
     
-    def start(self):
-        """Inicia thread de reconexão"""
+    def start(self, threaded: bool = True):
+        """
+        Inicia thread de reconexão.
+        Com threaded=False, reconnect_round() é agendado externamente (motor asyncio).
+        """
         self.running = True
-        self.reconnect_thread = threading.Thread(target=self._reconnect_loop, daemon=True)
-        self.reconnect_thread.start()
+        if threaded:
+            self.reconnect_thread = threading.Thread(target=self._reconnect_loop, daemon=True)
+            self.reconnect_thread.start()
         logger.info("[PeerTable] Started")
     
     def stop(self):
@@ -53,29 +58,7 @@ class PeerTable:
                     continue
                 
                 discovered_peer_ids.add(peer_id)
-                
-                if peer_id in self.peers:
-                    # Atualiza peer existente
-                    peer = self.peers[peer_id]
-                    peer.ip = peer_data['ip']
-                    peer.port = peer_data['port']
-                    
-                    # Se peer estava obsoleto, marca como desconectado para tentar novamente
-                    if peer.status == PeerStatus.STALE:
-                        peer.status = PeerStatus.DISCONNECTED
-                        peer.reconnect_attempts = 0
-                else:
-                    # Novo peer
-                    peer = PeerInfo(
-                        peer_id=peer_id,
-                        ip=peer_data['ip'],
-                        port=peer_data['port'],
-                        namespace=peer_data['namespace'],
-                        name=peer_data['name'],
-                        status=PeerStatus.DISCONNECTED
-                    )
-                    self.peers[peer_id] = peer
-                    logger.info(f"[PeerTable] New peer discovered: {peer_id}")
+                self.upsert_peer(peer_data)
             
             # Marca peers que desapareceram como obsoletos
             disappeared = current_peer_ids - discovered_peer_ids
@@ -84,6 +67,36 @@ class PeerTable:
                     self.peers[peer_id].status = PeerStatus.STALE
                     logger.info(f"[PeerTable] Peer marked as stale: {peer_id}")
     
+    def upsert_peer(self, peer_data: dict) -> PeerInfo:
+        """Adiciona ou atualiza um peer a partir de um registro do Rendezvous"""
+        peer_id = f"{peer_data['name']}@{peer_data['namespace']}"
+        
+        with self.lock:
+            if peer_id in self.peers:
+                # Atualiza peer existente
+                peer = self.peers[peer_id]
+                peer.ip = peer_data['ip']
+                peer.port = peer_data['port']
+                
+                # Se peer estava obsoleto, marca como desconectado para tentar novamente
+                if peer.status == PeerStatus.STALE:
+                    peer.status = PeerStatus.DISCONNECTED
+                    peer.reconnect_attempts = 0
+            else:
+                # Novo peer
+                peer = PeerInfo(
+                    peer_id=peer_id,
+                    ip=peer_data['ip'],
+                    port=peer_data['port'],
+                    namespace=peer_data['namespace'],
+                    name=peer_data['name'],
+                    status=PeerStatus.DISCONNECTED
+                )
+                self.peers[peer_id] = peer
+                logger.info(f"[PeerTable] New peer discovered: {peer_id}")
+            
+            return peer
+    
     def mark_connected(self, peer_id: str):
         """Marca peer como conectado"""
         with self.lock:
@@ -99,6 +112,14 @@ class PeerTable:
                 self.peers[peer_id].status = PeerStatus.DISCONNECTED
                 logger.info(f"[PeerTable] Peer disconnected: {peer_id}")
     
+    def record_rtt(self, peer_id: str, rtt: float):
+        """Registra uma amostra de RTT (ms) do peer"""
+        with self.lock:
+            peer = self.peers.get(peer_id)
+            if peer:
+                peer.add_rtt_sample(rtt)
+                peer.last_seen = datetime.now()
+    
     def get_peer(self, peer_id: str) -> PeerInfo:
         """Obtém informações do peer"""
         with self.lock:
@@ -138,37 +159,41 @@ class PeerTable:
         while self.running:
             try:
                 time.sleep(5)  # Check every 5 seconds
-                
-                with self.lock:
-                    for peer_id, peer in list(self.peers.items()):
-                        if peer.status == PeerStatus.DISCONNECTED:
-                            # Verifica se devemos tentar reconexão
-                            if peer.reconnect_attempts < self.max_reconnect_attempts:
-                                # Calcula backoff
-                                backoff = min(
-                                    self.backoff_base ** peer.reconnect_attempts,
-                                    self.backoff_max
-                                )
-                                
-                                # Verificação simples: apenas tenta reconectar
-                                # Em uma implementação real, rastrearia o tempo da última tentativa
-                                logger.info(f"[PeerTable] Attempting to reconnect to {peer_id} "
-                                          f"(attempt {peer.reconnect_attempts + 1}/{self.max_reconnect_attempts})")
-                                
-                                peer.status = PeerStatus.CONNECTING
-                                peer.reconnect_attempts += 1
-                                
-                                # Tenta conectar (será tratado pelo pai)
-                                success = self.connect_to_peer(peer)
-                                
-                                if not success:
-                                    peer.status = PeerStatus.DISCONNECTED
-                            
-                            elif peer.reconnect_attempts >= self.max_reconnect_attempts:
-                                # Desiste
-                                peer.status = PeerStatus.STALE
-                                logger.warning(f"[PeerTable] Giving up on {peer_id} after "
-                                             f"{self.max_reconnect_attempts} attempts")
+                self.reconnect_round()
             
             except Exception as e:
                 logger.error(f"[PeerTable] Error in reconnect loop: {e}")
+    
+    def reconnect_round(self):
+        """Uma passada de reconexão sobre os peers desconectados"""
+        # Escolhe os candidatos sob o lock, mas conecta fora dele: connect_to_peer
+        # bloqueia e, no motor asyncio, espera o event loop, cujos callbacks
+        # (desconexão, RTT, conexão de entrada) também usam este lock
+        candidates = []
+        with self.lock:
+            for peer_id, peer in self.peers.items():
+                if peer.status == PeerStatus.DISCONNECTED:
+                    # Verifica se devemos tentar reconexão
+                    if peer.reconnect_attempts < self.max_reconnect_attempts:
+                        logger.info(f"[PeerTable] Attempting to reconnect to {peer_id} "
+                                  f"(attempt {peer.reconnect_attempts + 1}/{self.max_reconnect_attempts})")
+                        
+                        peer.status = PeerStatus.CONNECTING
+                        peer.reconnect_attempts += 1
+                        candidates.append(peer)
+                    
+                    else:
+                        # Desiste
+                        peer.status = PeerStatus.STALE
+                        logger.warning(f"[PeerTable] Giving up on {peer_id} after "
+                                     f"{self.max_reconnect_attempts} attempts")
+        
+        for peer in candidates:
+            # Tenta conectar (será tratado pelo pai); parada no meio da passada
+            # devolve os restantes ao estado desconectado
+            success = self.running and self.connect_to_peer(peer)
+            
+            if not success:
+                with self.lock:
+                    if peer.status == PeerStatus.CONNECTING:
+                        peer.status = PeerStatus.DISCONNECTED
@@ -0,0 +1,320 @@
+"""
+Entrega confiável de SEND: janela deslizante com ACKs cumulativos/seletivos
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from models import Message, MessageType
+from common import codec
+
+logger = logging.getLogger(__name__)
+
+INITIAL_RTO = 1.0   # s, até a primeira amostra de RTT
+MAX_SACK_RANGES = 16  # faixas [início, fim] por ACK
+
+
+@dataclass
+class _Outstanding:
+    """SEND enviado e ainda não confirmado"""
+    frame: bytes
+    sent_at: float
+    retransmits: int = 0
+    timeouts: int = 0  # retransmissões por RTO (as rápidas, por SACK, não contam)
+
+
+@dataclass
+class _Channel:
+    """Estado dos dois sentidos do canal com um vizinho"""
+    # envio
+    next_seq: int = 0
+    in_flight: Dict[int, _Outstanding] = field(default_factory=dict)
+    backlog: deque = field(default_factory=deque)  # quadros fora da janela (seq já atribuído)
+    srtt: Optional[float] = None
+    rttvar: float = 0.0
+    rto: float = INITIAL_RTO
+    # recepção
+    expected: int = 0  # próximo seq a entregar
+    out_of_order: Dict[int, Message] = field(default_factory=dict)
+    unacked: int = 0  # recebidos desde o último ACK enviado
+    ack_due: Optional[float] = None  # quando o ACK atrasado deve sair
+
+
+class ReliableDelivery:
+    """
+    Canal confiável por vizinho para mensagens diretas (SEND).
+
+    - Cada SEND leva um número de sequência; só saem seqs a menos de `window`
+      do menor ainda não confirmado, os demais aguardam no backlog (até
+      `max_backlog`).
+    - O receptor entrega em ordem e guarda os que chegam adiantados (até a
+      janela). Um único ACK confirma tudo até `ack` (cumulativo) mais as
+      faixas em `sack` (seletivo). O ACK é atrasado até `ack_delay` segundos
+      ou até `ack_every` mensagens; só a abertura ou o fechamento de um
+      buraco na sequência é confirmado na hora.
+    - O emissor retransmite por timeout (RTO calculado do RTT, como no TCP,
+      com backoff exponencial) e, ao ver um SACK acima de um buraco, reenvia
+      o que falta sem esperar o RTO. Após `max_retries` retransmissões da
+      mesma mensagem, o vizinho é dado como perdido (`on_failure`).
+
+    Só é usado com vizinhos que anunciam o recurso "reliable" no handshake;
+    o estado é descartado quando a conexão cai.
+    """
+
+    def __init__(self, my_peer_id: str,
+                 send_frame: Callable[[str, bytes], bool],
+                 deliver: Callable[[str, Message], None],
+                 on_failure: Optional[Callable[[str], None]] = None,
+                 window: int = 64, max_backlog: int = 1024,
+                 ack_delay: float = 0.05, ack_every: int = 16,
+                 max_retries: int = 5, min_rto: float = 0.2, max_rto: float = 10.0):
+        self.my_peer_id = my_peer_id
+        self.send_frame = send_frame
+        self.deliver = deliver
+        self.on_failure = on_failure
+        self.window = window
+        self.max_backlog = max_backlog
+        self.ack_delay = ack_delay
+        self.ack_every = ack_every
+        self.max_retries = max_retries
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.channels: Dict[str, _Channel] = {}
+        self.lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self, threaded: bool = True):
+        """Inicia os timers (threaded=False: tick() agendado externamente)"""
+        self.running = True
+        if threaded:
+            self.thread = threading.Thread(target=self._tick_loop, daemon=True)
+            self.thread.start()
+        logger.info(f"[Reliable] Started (window {self.window})")
+
+    def stop(self):
+        """Para os timers"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def add_peer(self, peer_id: str):
+        """Vizinho com suporte a entrega confiável (canal novo, seq a partir de 0)"""
+        with self.lock:
+            self.channels[peer_id] = _Channel()
+
+    def has_peer(self, peer_id: str) -> bool:
+        return peer_id in self.channels
+
+    def clear_peer(self, peer_id: str):
+        """Conexão encerrada: descarta o canal"""
+        with self.lock:
+            channel = self.channels.pop(peer_id, None)
+        if channel and (channel.in_flight or channel.backlog):
+            logger.warning(f"[Reliable] {len(channel.in_flight) + len(channel.backlog)} message(s) "
+                           f"to {peer_id} not acknowledged before disconnect")
+
+    # Envio
+
+    def send(self, peer_id: str, payload: str) -> bool:
+        """
+        Envia um SEND confiável. True quando a mensagem foi aceita (a entrega
+        fica por conta das retransmissões); False se não há canal ou o
+        backlog está cheio.
+        """
+        now = time.monotonic()
+        with self.lock:
+            channel = self.channels.get(peer_id)
+            if channel is None:
+                return False
+            if len(channel.backlog) >= self.max_backlog:
+                logger.warning(f"[Reliable] Backlog full for {peer_id}, message not sent")
+                return False
+
+            message = Message(
+                msg_type=MessageType.SEND,
+                msg_id=str(uuid.uuid4()),
+                src=self.my_peer_id,
+                dst=peer_id,
+                payload=payload,
+                seq=channel.next_seq
+            )
+            channel.next_seq += 1
+            channel.backlog.append((message.seq, codec.dumpb(message.to_dict()) + b"\n"))
+            out = self._fill_window(channel, now)
+
+        self._flush(peer_id, out)
+        return True
+
+    def _fill_window(self, channel: _Channel, now: float) -> List[bytes]:
+        """
+        Move do backlog para a rede o que couber na janela. A janela é medida
+        em números de sequência a partir do menor não confirmado, não em
+        quantidade: o receptor só guarda seq < expected + window, então com um
+        buraco aberto os SACKs não podem liberar envios além dessa borda.
+        """
+        out = []
+        while channel.backlog:
+            seq = channel.backlog[0][0]
+            lowest = min(channel.in_flight) if channel.in_flight else seq
+            if seq - lowest >= self.window:
+                break
+            seq, frame = channel.backlog.popleft()
+            channel.in_flight[seq] = _Outstanding(frame, now)
+            out.append(frame)
+        return out
+
+    def handle_ack(self, peer_id: str, message: Message):
+        """ACK cumulativo (todos os seq < ack) com faixas seletivas em sack"""
+        now = time.monotonic()
+        with self.lock:
+            channel = self.channels.get(peer_id)
+            if channel is None:
+                return
+
+            acked = [seq for seq in channel.in_flight if seq < message.ack]
+            highest_sacked = -1
+            for lo, hi in (message.sack or [])[:MAX_SACK_RANGES]:
+                acked.extend(seq for seq in channel.in_flight if lo <= seq <= hi)
+                highest_sacked = max(highest_sacked, hi)
+
+            for seq in acked:
+                entry = channel.in_flight.pop(seq, None)
+                # amostra de RTT só de quem não foi retransmitido (algoritmo de Karn)
+                if entry and entry.retransmits == 0:
+                    self._update_rto(channel, now - entry.sent_at)
+
+            # SACK acima de um buraco: reenvia o que falta sem esperar o RTO
+            out = []
+            threshold = channel.srtt or self.min_rto
+            for seq, entry in sorted(channel.in_flight.items()):
+                if seq > highest_sacked:
+                    break
+                if now - entry.sent_at > threshold:
+                    entry.retransmits += 1
+                    entry.sent_at = now
+                    out.append(entry.frame)
+
+            out.extend(self._fill_window(channel, now))
+
+        self._flush(peer_id, out)
+
+    def _update_rto(self, channel: _Channel, sample: float):
+        """Estimativa de RTO a partir do RTT (RFC 6298)"""
+        if channel.srtt is None:
+            channel.srtt = sample
+            channel.rttvar = sample / 2
+        else:
+            channel.rttvar = 0.75 * channel.rttvar + 0.25 * abs(channel.srtt - sample)
+            channel.srtt = 0.875 * channel.srtt + 0.125 * sample
+        channel.rto = min(self.max_rto, max(self.min_rto, channel.srtt + 4 * channel.rttvar))
+
+    # Recepção
+
+    def handle_send(self, peer_id: str, message: Message):
+        """SEND com seq: entrega em ordem, guarda os adiantados e agenda o ACK"""
+        now = time.monotonic()
+        deliverable = []
+        ack = None
+        with self.lock:
+            channel = self.channels.get(peer_id)
+            if channel is None:
+                return
+
+            seq = message.seq
+            # ACK imediato só quando um buraco abre ou fecha: o emissor reage logo
+            # sem que cada mensagem fora de ordem gere um ACK
+            immediate = False
+            if seq == channel.expected:
+                immediate = bool(channel.out_of_order)
+                deliverable.append(message)
+                channel.expected += 1
+                while channel.expected in channel.out_of_order:
+                    deliverable.append(channel.out_of_order.pop(channel.expected))
+                    channel.expected += 1
+            elif channel.expected < seq < channel.expected + self.window:
+                immediate = not channel.out_of_order
+                channel.out_of_order.setdefault(seq, message)
+            # duplicatas (ACK perdido) só reagendam o ACK
+
+            channel.unacked += 1
+            if immediate or channel.unacked >= self.ack_every:
+                ack = self._make_ack(channel)
+            elif channel.ack_due is None:
+                channel.ack_due = now + self.ack_delay
+
+        for msg in deliverable:
+            self.deliver(peer_id, msg)
+        if ack:
+            self._flush(peer_id, [ack])
+
+    def _make_ack(self, channel: _Channel) -> bytes:
+        """ACK cumulativo + faixas recebidas fora de ordem (zera o atraso pendente)"""
+        channel.unacked = 0
+        channel.ack_due = None
+
+        ranges = []
+        for seq in sorted(channel.out_of_order):
+            if ranges and seq == ranges[-1][1] + 1:
+                ranges[-1][1] = seq
+            elif len(ranges) < MAX_SACK_RANGES:
+                ranges.append([seq, seq])
+            else:
+                break
+
+        ack = Message(msg_type=MessageType.ACK, msg_id="", ack=channel.expected, sack=ranges or None)
+        return codec.dumpb(ack.to_dict()) + b"\n"
+
+    # Timers
+
+    def _tick_loop(self):
+        while self.running:
+            try:
+                time.sleep(self.ack_delay)
+                self.tick()
+            except Exception as e:
+                logger.error(f"[Reliable] Error in timer loop: {e}")
+
+    def tick(self):
+        """Envia ACKs atrasados vencidos e retransmite o que passou do RTO"""
+        now = time.monotonic()
+        pending: List[Tuple[str, List[bytes]]] = []
+        failed = []
+        with self.lock:
+            for peer_id, channel in self.channels.items():
+                out = []
+                if channel.ack_due is not None and now >= channel.ack_due:
+                    out.append(self._make_ack(channel))
+
+                expired = [entry for entry in channel.in_flight.values()
+                           if now - entry.sent_at > channel.rto]
+                if any(entry.timeouts >= self.max_retries for entry in expired):
+                    failed.append(peer_id)
+                    continue
+                for entry in expired:
+                    entry.retransmits += 1
+                    entry.timeouts += 1
+                    entry.sent_at = now
+                    out.append(entry.frame)
+                if expired:
+                    channel.rto = min(self.max_rto, channel.rto * 2)  # backoff
+                    logger.debug(f"[Reliable] Retransmitting {len(expired)} message(s) to {peer_id}")
+
+                if out:
+                    pending.append((peer_id, out))
+
+        for peer_id, out in pending:
+            self._flush(peer_id, out)
+        for peer_id in failed:
+            logger.warning(f"[Reliable] No ACK from {peer_id} after {self.max_retries} retransmissions")
+            self.clear_peer(peer_id)
+            if self.on_failure:
+                self.on_failure(peer_id)
+
+    def _flush(self, peer_id: str, frames: List[bytes]):
+        """Envia quadros fora do lock (o envio só enfileira na conexão)"""
+        for frame in frames:
+            self.send_frame(peer_id, frame)
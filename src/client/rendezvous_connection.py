@@ -2,32 +2,60 @@
 Manipulador de conexão com o servidor Rendezvous
 """
 import socket
-import json
 import logging
-from typing import Optional, List, Dict
+import base64
+import queue
+import threading
+import time
+import zlib
+from typing import Optional, List, Dict, Iterator, Tuple
+from common import codec
+from common.hashring import HashRing
+from endpoint_pool import Endpoint, EndpointPool
 
 logger = logging.getLogger(__name__)
 
 
 class RendezvousConnection:
-    """Gerencia comunicação com o servidor Rendezvous"""
+    """
+    Gerencia comunicação com o servidor Rendezvous.
     
-    def __init__(self, host: str, port: int):
+    Aceita servidores alternativos (endpoints): cada requisição vai ao servidor
+    saudável mais rápido e, se ele falhar, ao próximo. O DISCOVER é "hedged":
+    se o servidor escolhido não responder dentro do p95 da sua latência, a mesma
+    requisição é enviada em paralelo ao próximo servidor e vale a primeira resposta.
+    """
+    
+    def __init__(self, host: str, port: int, compress: bool = False,
+                 endpoints: Optional[List] = None, timeout: float = 10.0, hedge: bool = True):
         self.host = host
         self.port = port
         self.max_line_size = 32768
+        self.compress = compress  # pede respostas grandes comprimidas (zlib)
+        self.timeout = timeout
+        self.hedge = hedge
+        # Servidor configurado primeiro, depois os alternativos ("host:port")
+        addresses = [(host, port)] + [EndpointPool.parse(e) for e in endpoints or ()]
+        self.pool = EndpointPool(list(dict.fromkeys(addresses)))
+        # Modo cluster: anel de hashing consistente namespace -> nó ("host:port"),
+        # aprendido do servidor (comando RING); None com um servidor único
+        self.ring: Optional[HashRing] = None
     
-    def _send_command(self, command: dict) -> Optional[dict]:
-        """Envia um comando para o servidor Rendezvous e obtém resposta"""
-        try:
-            # Cria nova conexão para cada comando
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(10)
-            sock.connect((self.host, self.port))
-            
-            # Envia comando
-            command_json = json.dumps(command) + "\n"
-            sock.sendall(command_json.encode('utf-8'))
+    def _address(self, node: Optional[str]) -> Tuple[str, int]:
+        """Endereço de um nó do anel ("host:port"); None é o servidor preferido no momento"""
+        if node is None:
+            return self.pool.ordered()[0].address
+        host, _, port = node.rpartition(":")
+        return host, int(port)
+    
+    def _exchange(self, address: Tuple[str, int], command: dict) -> dict:
+        """Uma requisição/resposta em uma nova conexão; levanta exceção em caso de falha"""
+        if self.compress:
+            command = dict(command, compress="zlib")
+        
+        # Cria nova conexão para cada comando
+        with socket.create_connection(address, timeout=self.timeout) as sock:
+            sock.sendall(codec.dumpb(command) + b"\n")
             
             # Recebe resposta
             response_data = b""
@@ -38,25 +66,129 @@ class RendezvousConnection:
                 response_data += chunk
                 if b'\n' in response_data:
                     break
-            
-            sock.close()
-            
-            # Processa resposta
-            response_str = response_data.decode('utf-8').strip()
-            if response_str:
-                return json.loads(response_str)
-            
-            return None
-            
+        
+        if not response_data.strip():
+            raise ConnectionError("empty response")
+        return self._decode_response(codec.loads(response_data))
+    
+    def _attempt(self, endpoint: Endpoint, command: dict) -> Optional[dict]:
+        """Envia a um servidor do pool, registrando latência ou falha"""
+        host, port = endpoint.address
+        started = time.monotonic()
+        try:
+            response = self._exchange(endpoint.address, command)
         except socket.timeout:
-            logger.error(f"Timeout connecting to Rendezvous server at {self.host}:{self.port}")
-            return None
+            logger.error(f"Timeout connecting to Rendezvous server at {host}:{port}")
         except ConnectionRefusedError:
-            logger.error(f"Connection refused by Rendezvous server at {self.host}:{self.port}")
-            return None
+            logger.error(f"Connection refused by Rendezvous server at {host}:{port}")
         except Exception as e:
-            logger.error(f"Error communicating with Rendezvous: {e}")
+            logger.error(f"Error communicating with Rendezvous at {host}:{port}: {e}")
+        else:
+            self.pool.record_success(endpoint, time.monotonic() - started)
+            return response
+        self.pool.record_failure(endpoint)
+        return None
+    
+    def _send_command(self, command: dict, node: Optional[str] = None) -> Optional[dict]:
+        """Envia um comando para o servidor Rendezvous (ou para um nó do cluster) e obtém resposta"""
+        if node is not None:
+            # nó do cluster: só ele é dono do namespace, não há alternativa
+            try:
+                return self._exchange(self._address(node), command)
+            except Exception as e:
+                logger.error(f"Error communicating with Rendezvous node {node}: {e}")
+                return None
+        
+        # failover: do servidor saudável mais rápido ao mais lento
+        for endpoint in self.pool.ordered():
+            response = self._attempt(endpoint, command)
+            if response is not None:
+                return response
+        return None
+    
+    def _send_hedged(self, command: dict) -> Optional[dict]:
+        """
+        Envia ao servidor preferido; se não houver resposta dentro do p95 da sua
+        latência (ou se ele falhar), envia também ao próximo. Vale a primeira resposta.
+        """
+        candidates = self.pool.ordered()
+        if not self.hedge or len(candidates) < 2:
+            return self._send_command(command)
+        
+        results: "queue.Queue[Optional[dict]]" = queue.Queue()
+        remaining = iter(candidates)
+        
+        def launch() -> bool:
+            endpoint = next(remaining, None)
+            if endpoint is None:
+                return False
+            threading.Thread(target=lambda: results.put(self._attempt(endpoint, command)),
+                             name=f"hedge-{endpoint}", daemon=True).start()
+            return True
+        
+        launch()
+        pending = 1
+        delay = self.pool.hedge_delay(candidates[0])
+        while pending:
+            try:
+                response = results.get(timeout=delay)
+            except queue.Empty:
+                # servidor lento: repete no próximo, sem cancelar o primeiro
+                if launch():
+                    pending += 1
+                    logger.debug(f"Hedging {command.get('type')} after {delay * 1000:.0f}ms")
+                delay = self.timeout
+                continue
+            pending -= 1
+            if response is not None:
+                return response
+            if launch():
+                pending += 1
+        return None
+    
+    @staticmethod
+    def _decode_response(response: dict) -> dict:
+        """Descomprime respostas no formato {"encoding": "zlib+base64", "data": ...}"""
+        if response.get("encoding") == "zlib+base64":
+            raw = zlib.decompress(base64.b64decode(response["data"]))
+            return codec.loads(raw)
+        return response
+    
+    def load_ring(self, node: Optional[str] = None) -> Optional[str]:
+        """
+        Obtém o anel do cluster (comando RING). Retorna o nome do nó consultado
+        no anel, ou None se o servidor não estiver em modo cluster.
+        """
+        response = self._send_command({"type": "RING"}, node)
+        if not response or response.get("status") != "OK":
+            logger.debug(f"No cluster ring: {response}")
             return None
+        self.ring = HashRing.from_dict(response)
+        logger.info(f"Learned rendezvous ring with {len(self.ring.nodes)} node(s)")
+        return response.get("self")
+    
+    def _node_for(self, namespace: Optional[str]) -> Optional[str]:
+        """Nó dono do namespace (None: servidor configurado)"""
+        if self.ring is None or not namespace:
+            return None
+        return self.ring.owner(namespace)
+    
+    def _send_routed(self, command: dict, namespace: Optional[str]) -> Optional[dict]:
+        """Envia direto ao shard dono do namespace, seguindo um REDIRECT se o anel estiver desatualizado"""
+        node = self._node_for(namespace)
+        response = self._send_command(command, node)
+        if response and response.get("status") == "REDIRECT":
+            self.load_ring(node)
+            logger.debug(f"{command.get('type')} {namespace} redirected to {response.get('owner')}")
+            response = self._send_command(command, response.get("owner"))
+        return response
+    
+    def _group_by_node(self, items, namespace_of) -> Dict[Optional[str], list]:
+        """Agrupa itens pelo nó dono do namespace de cada um (tudo em None sem anel)"""
+        groups: Dict[Optional[str], list] = {}
+        for item in items:
+            groups.setdefault(self._node_for(namespace_of(item)), []).append(item)
+        return groups
     
     def register(self, namespace: str, name: str, port: int, ttl: int = 7200) -> Optional[dict]:
         """Registra peer no servidor Rendezvous"""
@@ -69,7 +201,7 @@ class RendezvousConnection:
         }
         
         logger.info(f"Registering {name}@{namespace} on port {port} with TTL {ttl}s")
-        response = self._send_command(command)
+        response = self._send_routed(command, namespace)
         
         if response and response.get("status") == "OK":
             logger.info(f"Successfully registered: {response}")
@@ -78,23 +210,240 @@ class RendezvousConnection:
             logger.error(f"Registration failed: {response}")
             return None
     
-    def discover(self, namespace: Optional[str] = None) -> List[Dict]:
-        """Descobre peers em um namespace (ou todos se namespace for None)"""
+    def refresh(self, namespace: str, name: str, ttl: Optional[int] = None) -> Optional[dict]:
+        """Renova o TTL de um registro existente sem reenviar o REGISTER completo"""
+        command = {"type": "REFRESH", "namespace": namespace, "name": name}
+        if ttl is not None:
+            command["ttl"] = ttl
+        
+        logger.debug(f"Refreshing {name}@{namespace}")
+        response = self._send_routed(command, namespace)
+        
+        if response and response.get("status") == "OK":
+            return response
+        else:
+            logger.warning(f"Refresh failed: {response}")
+            return None
+    
+    def refresh_many(self, entries: List[Dict], ttl: Optional[int] = None) -> Optional[dict]:
+        """Renova vários registros (lista de {namespace, name}) em uma única requisição"""
+        merged = {"status": "OK", "refreshed": 0, "missing": []}
+        # em modo cluster, uma requisição por shard
+        for node, group in self._group_by_node(entries, lambda e: e.get("namespace")).items():
+            command = {"type": "REFRESH", "peers": group}
+            if ttl is not None:
+                command["ttl"] = ttl
+            
+            response = self._send_command(command, node)
+            
+            if not response or response.get("status") != "OK":
+                logger.warning(f"Batch refresh failed: {response}")
+                return None
+            merged["refreshed"] += response.get("refreshed", 0)
+            merged["missing"].extend(response.get("missing", []))
+        
+        if merged["missing"]:
+            logger.warning(f"Refresh: records not found: {merged['missing']}")
+        return merged
+    
+    def batch(self, requests: List[Dict]) -> Optional[List[dict]]:
+        """
+        Envia vários comandos (REGISTER/UNREGISTER/DISCOVER/REFRESH) em uma única conexão.
+        Retorna a lista de respostas, na mesma ordem dos comandos.
+        """
+        # em modo cluster, um BATCH por shard; as respostas voltam à ordem original
+        results: List[Optional[dict]] = [None] * len(requests)
+        indexed = list(enumerate(requests))
+        for node, group in self._group_by_node(indexed, lambda item: item[1].get("namespace")).items():
+            response = self._send_command({"type": "BATCH", "requests": [r for _, r in group]}, node)
+            
+            if not response or response.get("status") != "OK":
+                logger.error(f"Batch failed: {response}")
+                return None
+            for (i, _), result in zip(group, response.get("results", [])):
+                results[i] = result
+        return results
+    
+    def discover(self, namespace: Optional[str] = None, page_size: Optional[int] = None,
+                 fields: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Descobre peers em um namespace (ou todos se namespace for None).
+        
+        Com page_size, a lista é obtida em páginas (limit + cursor), mantendo cada
+        resposta pequena; fields restringe os campos retornados por peer.
+        """
         command = {"type": "DISCOVER"}
         if namespace:
             command["namespace"] = namespace
+        if page_size:
+            command["limit"] = page_size
+        if fields:
+            command["fields"] = fields
         
         logger.debug(f"Discovering peers in namespace: {namespace or 'all'}")
-        response = self._send_command(command)
+        
+        if namespace or self.ring is None:
+            peers, partial = self._discover_pages(command, self._node_for(namespace))
+            # servidor em modo cluster: os demais namespaces estão nos outros nós
+            nodes = self._other_nodes(self.load_ring()) if partial else []
+        else:
+            peers, nodes = [], self.ring.nodes
+        
+        for node in nodes:
+            peers.extend(self._discover_pages(dict(command), node)[0])
+        
+        logger.debug(f"Discovered {len(peers)} peers")
+        return peers
+    
+    def _other_nodes(self, queried: Optional[str]) -> List[str]:
+        """Nós do anel exceto o já consultado (o servidor configurado)"""
+        if self.ring is None:
+            return []
+        return [n for n in self.ring.nodes if n != queried]
+    
+    def _discover_pages(self, command: dict, node: Optional[str]):
+        """Percorre as páginas de um DISCOVER em um nó; retorna (peers, partial)"""
+        peers = []
+        redirected = False
+        while True:
+            if node is None and "cursor" not in command:
+                # primeira página: hedged entre os servidores alternativos
+                response = self._send_hedged(command)
+            else:
+                response = self._send_command(command, node)
+            
+            if response and response.get("status") == "REDIRECT" and not redirected:
+                # anel desconhecido ou desatualizado: segue para o dono do namespace
+                redirected = True
+                self.load_ring(node)
+                node = response.get("owner")
+                continue
+            
+            if not response or response.get("status") != "OK":
+                logger.warning(f"Discovery failed: {response}")
+                return peers, False
+            
+            peers.extend(response.get("peers", []))
+            
+            cursor = response.get("next_cursor")
+            if not cursor or cursor == command.get("cursor"):
+                return peers, bool(response.get("partial"))
+            command["cursor"] = cursor
+    
+    def discover_stream(self, namespace: Optional[str] = None,
+                        fields: Optional[List[str]] = None) -> Iterator[Dict]:
+        """
+        Descobre peers no modo streaming (NDJSON): um peer por linha, seguido de
+        uma linha terminadora com "status". Os peers são entregues um a um, com
+        memória constante independentemente do tamanho do registro.
+        """
+        command = {"type": "DISCOVER", "stream": True}
+        if namespace:
+            command["namespace"] = namespace
+        if fields:
+            command["fields"] = fields
+        
+        if namespace or self.ring is None:
+            end = yield from self._stream_node(command, self._node_for(namespace))
+            if end and end.get("status") == "REDIRECT":
+                self.load_ring(self._node_for(namespace))
+                end = yield from self._stream_node(command, end.get("owner"))
+            # servidor em modo cluster: os demais namespaces estão nos outros nós
+            nodes = self._other_nodes(self.load_ring()) if end and end.get("partial") else []
+        else:
+            nodes = self.ring.nodes
+        
+        for node in nodes:
+            yield from self._stream_node(command, node)
+    
+    def _stream_node(self, command: dict, node: Optional[str]):
+        """
+        Gera os peers do stream de um nó; retorna a linha terminadora (ou None).
+        Sem nó (servidor configurado), falha antes do primeiro peer passa ao
+        próximo servidor do pool; depois dele o stream só termina, para não
+        entregar peers repetidos.
+        """
+        endpoints = [None] if node is not None else self.pool.ordered()
+        for endpoint in endpoints:
+            host, port = self._address(node) if endpoint is None else endpoint.address
+            delivered = [0]
+            try:
+                return (yield from self._stream_from((host, port), command, delivered))
+            except (OSError, ValueError) as e:
+                # ValueError: linha que não é JSON (codec.DecodeError)
+                logger.error(f"Error streaming from Rendezvous at {host}:{port}: {e}")
+                if endpoint is not None:
+                    self.pool.record_failure(endpoint)
+                if delivered[0]:
+                    return None
+        return None
+    
+    def _stream_from(self, address: Tuple[str, int], command: dict, delivered: List[int]):
+        """Um stream NDJSON de um servidor; conta em delivered[0] os peers entregues"""
+        with socket.create_connection(address, timeout=self.timeout) as sock:
+            sock.sendall(codec.dumpb(command) + b"\n")
+            
+            buffer = bytearray()
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    logger.warning("Discovery stream ended without terminator")
+                    return
+                buffer += chunk
+                
+                start = 0
+                while True:
+                    end = buffer.find(b'\n', start)
+                    if end < 0:
+                        break
+                    line = bytes(buffer[start:end])
+                    start = end + 1
+                    if len(line) > self.max_line_size:
+                        logger.error("Discovery stream line too long")
+                        return
+                    if not line.strip():
+                        continue
+                    
+                    item = codec.loads(line)
+                    if "status" in item:
+                        # Terminador (ou erro/REDIRECT na primeira linha)
+                        if item.get("status") not in ("OK", "REDIRECT"):
+                            logger.warning(f"Discovery failed: {item}")
+                        return item
+                    delivered[0] += 1
+                    yield item
+                
+                del buffer[:start]
+                if len(buffer) > self.max_line_size:
+                    logger.error("Discovery stream line too long")
+                    return
+    
+    def lookup(self, namespace: str, name: str) -> List[Dict]:
+        """Resolve um único peer (name@namespace) sem listar o namespace inteiro"""
+        command = {"type": "LOOKUP", "namespace": namespace, "name": name}
+        
+        logger.debug(f"Looking up {name}@{namespace}")
+        response = self._send_routed(command, namespace)
         
         if response and response.get("status") == "OK":
-            peers = response.get("peers", [])
-            logger.debug(f"Discovered {len(peers)} peers")
-            return peers
+            return response.get("peers", [])
         else:
-            logger.warning(f"Discovery failed: {response}")
+            logger.debug(f"Lookup failed: {response}")
             return []
     
+    def lookup_many(self, peer_ids: List[str]) -> List[Dict]:
+        """Resolve uma lista de peer ids (name@namespace) em uma única requisição"""
+        peers = []
+        # em modo cluster, uma requisição por shard (peer id = name@namespace)
+        for node, group in self._group_by_node(peer_ids, lambda pid: pid.rpartition("@")[2]).items():
+            response = self._send_command({"type": "LOOKUP", "peer_ids": group}, node)
+            
+            if response and response.get("status") == "OK":
+                peers.extend(response.get("peers", []))
+            else:
+                logger.warning(f"Lookup failed: {response}")
+        return peers
+    
     def unregister(self, namespace: str, name: str, port: int) -> bool:
         """Remove registro do peer no servidor Rendezvous"""
         command = {
@@ -105,7 +454,7 @@ class RendezvousConnection:
         }
         
         logger.info(f"Unregistering {name}@{namespace}")
-        response = self._send_command(command)
+        response = self._send_routed(command, namespace)
         
         if response and response.get("status") == "OK":
             logger.info("Successfully unregistered")
@@ -0,0 +1,171 @@
+"""
+Tabela de roteamento distance-vector para mensagens RELAY
+"""
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from common import codec
+
+logger = logging.getLogger(__name__)
+
+INFINITY = float("inf")
+UNREACHABLE = [-1, 0]      # rota retirada / poisoned reverse (JSON não tem infinito)
+DEFAULT_LINK_COST = 100.0  # ms, até a primeira medida de RTT do enlace
+MAX_HOPS = 8               # rotas mais longas são tratadas como inalcançáveis
+MAX_ROUTES_BYTES = 24576   # bytes de rotas por ROUTE (o resto dos 32 KB fica para o envelope)
+
+
+class RoutingTable:
+    """
+    Distance-vector com custo em milissegundos de RTT.
+
+    O custo de um enlace é a média móvel (EWMA) dos RTTs medidos pelo
+    KeepAlive. Cada vizinho anuncia periodicamente, em mensagens ROUTE, o
+    custo e o número de saltos até cada destino que alcança; o melhor
+    próximo salto para um destino é o vizinho que minimiza
+    custo do enlace + custo anunciado.
+
+    Contra laços e contagem ao infinito: split horizon com poisoned reverse
+    (rotas aprendidas de um vizinho voltam para ele como inalcançáveis),
+    limite de MAX_HOPS saltos e expiração das entradas não reanunciadas em
+    `expiry` segundos.
+    """
+
+    def __init__(self, my_peer_id: str, expiry: float = 15.0, alpha: float = 0.3):
+        self.my_peer_id = my_peer_id
+        self.expiry = expiry
+        self.alpha = alpha
+        self.link_cost: Dict[str, float] = {}  # vizinho -> RTT (ms, EWMA)
+        self.measured: set = set()  # vizinhos com RTT já medido
+        # vizinho -> {destino -> (custo anunciado, saltos, recebido em)}
+        self.vectors: Dict[str, Dict[str, Tuple[float, int, float]]] = {}
+        self.lock = threading.Lock()
+
+    def add_neighbor(self, peer_id: str):
+        with self.lock:
+            self.link_cost.setdefault(peer_id, DEFAULT_LINK_COST)
+            self.vectors.setdefault(peer_id, {})
+
+    def remove_neighbor(self, peer_id: str):
+        with self.lock:
+            self.link_cost.pop(peer_id, None)
+            self.vectors.pop(peer_id, None)
+            self.measured.discard(peer_id)
+
+    def update_link(self, peer_id: str, rtt: float):
+        """Nova amostra de RTT (ms) do enlace com um vizinho"""
+        with self.lock:
+            if peer_id in self.measured:
+                self.link_cost[peer_id] = self.alpha * rtt + (1 - self.alpha) * self.link_cost[peer_id]
+            else:
+                self.link_cost[peer_id] = rtt
+                self.measured.add(peer_id)
+            self.vectors.setdefault(peer_id, {})
+
+    def handle_route(self, neighbor: str, routes: Dict[str, list]):
+        """Aplica um anúncio ROUTE: {destino: [custo_ms, saltos]}"""
+        now = time.monotonic()
+        with self.lock:
+            if neighbor not in self.link_cost:
+                return
+            vector = self.vectors.setdefault(neighbor, {})
+            for dst, entry in routes.items():
+                try:
+                    cost, hops = float(entry[0]), int(entry[1])
+                except (TypeError, ValueError, IndexError):
+                    continue
+                if dst == self.my_peer_id:
+                    continue
+                if cost < 0 or hops >= MAX_HOPS:
+                    vector.pop(dst, None)  # rota retirada
+                else:
+                    vector[dst] = (cost, hops, now)
+
+    def _expire_locked(self, now: float):
+        for vector in self.vectors.values():
+            for dst in [d for d, (_, _, t) in vector.items() if now - t > self.expiry]:
+                del vector[dst]
+
+    def _best_locked(self, dst: str, exclude: Iterable[str] = ()) -> Tuple[float, int, Optional[str]]:
+        """(custo, saltos, próximo salto) da melhor rota para dst"""
+        best = (INFINITY, 0, None)
+        for neighbor, link in self.link_cost.items():
+            if neighbor in exclude:
+                continue
+            if neighbor == dst:
+                candidate = (link, 1, neighbor)
+            else:
+                entry = self.vectors.get(neighbor, {}).get(dst)
+                if entry is None:
+                    continue
+                candidate = (link + entry[0], entry[1] + 1, neighbor)
+            if candidate[0] < best[0]:
+                best = candidate
+        return best
+
+    def next_hop(self, dst: str, exclude: Iterable[str] = ()) -> Optional[str]:
+        """Vizinho de menor custo total até dst (None se não há rota)"""
+        with self.lock:
+            self._expire_locked(time.monotonic())
+            return self._best_locked(dst, tuple(exclude))[2]
+
+    def route(self, dst: str) -> Optional[Tuple[float, int, str]]:
+        """(custo_ms, saltos, próximo salto) até dst, ou None"""
+        with self.lock:
+            self._expire_locked(time.monotonic())
+            cost, hops, hop = self._best_locked(dst)
+        return (cost, hops, hop) if hop else None
+
+    def destinations(self) -> List[str]:
+        with self.lock:
+            dsts = set(self.link_cost)
+            for vector in self.vectors.values():
+                dsts.update(vector)
+        dsts.discard(self.my_peer_id)
+        return sorted(dsts)
+
+    def advertisements(self, neighbor: str) -> List[Dict[str, list]]:
+        """
+        Anúncio para um vizinho, dividido em blocos de até MAX_ROUTES_BYTES
+        bytes serializados. Rotas cujo próximo salto é o próprio vizinho vão como
+        UNREACHABLE (poisoned reverse).
+        """
+        routes = {}
+        with self.lock:
+            self._expire_locked(time.monotonic())
+            dsts = set(self.link_cost)
+            for vector in self.vectors.values():
+                dsts.update(vector)
+            dsts.discard(neighbor)
+            dsts.discard(self.my_peer_id)
+            for dst in dsts:
+                cost, hops, hop = self._best_locked(dst)
+                if hop is None:
+                    continue
+                if hop == neighbor or hops >= MAX_HOPS:
+                    routes[dst] = UNREACHABLE
+                else:
+                    routes[dst] = [round(cost, 2), hops]
+
+        # o limite é em bytes, não em entradas: ids de 64+64 caracteres fazem
+        # poucas centenas de rotas passarem da linha máxima
+        chunks = [{}]
+        size = 2  # {}
+        for dst, entry in sorted(routes.items()):
+            entry_size = len(codec.dumpb({dst: entry})) - 1  # "dst":[...] e a vírgula
+            if chunks[-1] and size + entry_size > MAX_ROUTES_BYTES:
+                chunks.append({})
+                size = 2
+            chunks[-1][dst] = entry
+            size += entry_size
+        return chunks
+
+    def table(self) -> List[Tuple[str, float, int, str]]:
+        """Linhas (destino, custo_ms, saltos, próximo salto) para exibição"""
+        rows = []
+        for dst in self.destinations():
+            entry = self.route(dst)
+            if entry:
+                rows.append((dst, *entry))
+        return rows
@@ -0,0 +1,179 @@
+"""
+Gerenciamento da topologia: malha parcial com grau alvo
+"""
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from models import PeerInfo, PeerStatus, ConnectionInfo
+from peer_table import PeerTable
+
+logger = logging.getLogger(__name__)
+
+
+class TopologyManager:
+    """
+    Mantém cada nó com cerca de `target_degree` vizinhos diretos, em vez de
+    conectar a todos os peers descobertos.
+
+    - Abaixo do alvo, conecta aos melhores candidatos: primeiro os de redes
+      (prefixo /24) menos representadas entre os vizinhos atuais, depois os de
+      menor RTT; peers nunca medidos vêm antes dos já medidos como lentos.
+    - Conexões de entrada são aceitas até `max_degree`.
+    - A cada `rotate_interval` segundos, troca até `rotate_slots` vizinhos de
+      saída de maior RTT por candidatos novos, para explorar caminhos melhores
+      e não congelar a topologia.
+
+    Peers fora da vizinhança são alcançados por relay (mensagens diretas) ou
+    gossip (PUB). O custo por nó (sockets, threads) independe do tamanho do
+    namespace.
+    """
+
+    def __init__(self, my_peer_id: str, peer_table: PeerTable,
+                 get_connections: Callable[[], Dict[str, ConnectionInfo]],
+                 connect_to_peer: Callable[[PeerInfo], bool],
+                 disconnect_peer: Callable[[str, str], None],
+                 target_degree: int = 8, max_degree: Optional[int] = None,
+                 rotate_interval: float = 300, rotate_slots: int = 1):
+        self.my_peer_id = my_peer_id
+        self.peer_table = peer_table
+        self.get_connections = get_connections
+        self.connect_to_peer = connect_to_peer
+        self.disconnect_peer = disconnect_peer
+        self.target_degree = target_degree
+        self.max_degree = max_degree or 2 * target_degree
+        self.rotate_interval = rotate_interval
+        self.rotate_slots = rotate_slots
+        self.next_rotation = time.monotonic() + rotate_interval
+        self.retry_at: Dict[str, float] = {}  # peer_id -> próxima tentativa (monotonic)
+        self.lock = threading.Lock()  # uma manutenção por vez
+        self.running = False
+        self.thread = None
+
+    def start(self, threaded: bool = True):
+        """Inicia a manutenção periódica (threaded=False: maintain() agendado externamente)"""
+        self.running = True
+        if threaded:
+            self.thread = threading.Thread(target=self._maintain_loop, daemon=True)
+            self.thread.start()
+        logger.info(f"[Topology] Started (target degree {self.target_degree}, max {self.max_degree})")
+
+    def stop(self):
+        """Para a manutenção periódica"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+
+    def has_room(self) -> bool:
+        """True se ainda cabe mais uma conexão (de entrada ou pedida pelo usuário)"""
+        return len(self.get_connections()) < self.max_degree
+
+    def peer_left(self, peer_id: str):
+        """O vizinho encerrou a conexão (BYE): não o redisca antes da próxima rotação"""
+        self.retry_at[peer_id] = time.monotonic() + self.rotate_interval
+    
+    def reset_backoff(self):
+        """Esquece os tempos de espera entre tentativas (/reconnect)"""
+        self.retry_at.clear()
+
+    def _maintain_loop(self):
+        while self.running:
+            try:
+                time.sleep(5)
+                self.maintain()
+            except Exception as e:
+                logger.error(f"[Topology] Error in maintain loop: {e}")
+
+    def maintain(self):
+        """Completa a vizinhança até o grau alvo e, quando for a hora, faz a rotação"""
+        if not self.running or not self.lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() >= self.next_rotation:
+                self.next_rotation = time.monotonic() + self.rotate_interval
+                self._rotate()
+            self._fill()
+        finally:
+            self.lock.release()
+
+    def _fill(self):
+        connected = set(self.get_connections())
+        missing = self.target_degree - len(connected)
+        if missing <= 0:
+            return
+
+        for peer in self._candidates(connected, missing * 2):
+            if not self.running or missing <= 0:
+                break
+            if peer.status != PeerStatus.DISCONNECTED:
+                continue
+
+            peer.status = PeerStatus.CONNECTING
+            if self.connect_to_peer(peer):
+                self.retry_at.pop(peer.peer_id, None)
+                missing -= 1
+                continue
+
+            # Falhou: espera com backoff exponencial; desiste após o limite de tentativas
+            peer.status = PeerStatus.DISCONNECTED
+            peer.reconnect_attempts += 1
+            if peer.reconnect_attempts >= self.peer_table.max_reconnect_attempts:
+                peer.status = PeerStatus.STALE
+                logger.warning(f"[Topology] Giving up on {peer.peer_id} after "
+                               f"{peer.reconnect_attempts} attempts")
+            else:
+                backoff = min(self.peer_table.backoff_base ** peer.reconnect_attempts,
+                              self.peer_table.backoff_max)
+                self.retry_at[peer.peer_id] = time.monotonic() + backoff
+
+    def _candidates(self, connected: set, limit: int) -> List[PeerInfo]:
+        """Melhores candidatos a vizinho, escolhidos de forma gulosa por diversidade e RTT"""
+        now = time.monotonic()
+        pool = [
+            peer for peer_id, peer in self.peer_table.get_all_peers().items()
+            if peer_id != self.my_peer_id and peer_id not in connected
+            and peer.status == PeerStatus.DISCONNECTED
+            and self.retry_at.get(peer_id, 0) <= now
+        ]
+
+        # quantos vizinhos já temos em cada rede
+        groups: Dict[str, int] = {}
+        for peer_id in connected:
+            peer = self.peer_table.get_peer(peer_id)
+            if peer:
+                key = self._group(peer)
+                groups[key] = groups.get(key, 0) + 1
+
+        random.shuffle(pool)  # desempate aleatório entre candidatos equivalentes
+        chosen = []
+        while pool and len(chosen) < limit:
+            best = min(pool, key=lambda p: (groups.get(self._group(p), 0), p.avg_rtt or 0.0))
+            pool.remove(best)
+            chosen.append(best)
+            key = self._group(best)
+            groups[key] = groups.get(key, 0) + 1
+        return chosen
+
+    @staticmethod
+    def _group(peer: PeerInfo) -> str:
+        """Rede do peer (prefixo /24 do IPv4), usada como medida de diversidade"""
+        return peer.ip.rsplit(".", 1)[0]
+
+    def _rotate(self):
+        """Troca os vizinhos de saída mais lentos por candidatos ainda não conectados"""
+        connections = self.get_connections()
+        if len(connections) < self.target_degree or not self._candidates(set(connections), 1):
+            return
+
+        measured = []
+        for peer_id, info in connections.items():
+            peer = self.peer_table.get_peer(peer_id)
+            if info.direction == "outbound" and peer and peer.avg_rtt is not None:
+                measured.append((peer.avg_rtt, peer_id))
+
+        for rtt, peer_id in sorted(measured, reverse=True)[:self.rotate_slots]:
+            logger.info(f"[Topology] Rotating out {peer_id} (RTT {rtt:.1f} ms)")
+            # não volta como candidato antes da próxima rotação
+            self.retry_at[peer_id] = time.monotonic() + self.rotate_interval
+            self.disconnect_peer(peer_id, "Topology rotation")
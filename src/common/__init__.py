@@ -0,0 +1,3 @@
+"""
+Código compartilhado entre o servidor Rendezvous e o cliente P2P.
+"""
@@ -0,0 +1,75 @@
+"""
+Codec JSON compartilhado pelo servidor Rendezvous e pelo cliente P2P.
+
+Usa separadores compactos e instâncias pré-configuradas de encoder/decoder.
+Quando disponível, usa orjson (ou ujson) como backend, com fallback para a
+biblioteca padrão. O backend pode ser forçado pela variável de ambiente
+PYP2P_JSON ("orjson", "ujson" ou "json").
+
+API:
+- dumps(obj) -> str
+- dumpb(obj) -> bytes (UTF-8, pronto para o socket)
+- loads(str | bytes) -> objeto
+- DecodeError: exceção levantada por loads() para JSON inválido
+"""
+import json
+import os
+
+# Erros de todos os backends derivam de ValueError (json.JSONDecodeError inclusive)
+DecodeError = ValueError
+
+_encoder = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False)
+_decoder = json.JSONDecoder()
+
+
+def _std_dumps(obj) -> str:
+    return _encoder.encode(obj)
+
+
+def _std_dumpb(obj) -> bytes:
+    return _encoder.encode(obj).encode("utf-8")
+
+
+def _std_loads(data):
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return _decoder.decode(data.strip())
+
+
+def _load_backend(preferred: str):
+    if preferred in ("", "orjson"):
+        try:
+            import orjson
+
+            def dumpb(obj) -> bytes:
+                try:
+                    return orjson.dumps(obj)
+                except TypeError:
+                    # tipos não suportados pelo orjson (ex.: int > 64 bits)
+                    return _std_dumpb(obj)
+
+            def dumps(obj) -> str:
+                return dumpb(obj).decode("utf-8")
+
+            return "orjson", dumps, dumpb, orjson.loads
+        except ImportError:
+            pass
+
+    if preferred in ("", "ujson"):
+        try:
+            import ujson
+
+            def dumps(obj) -> str:
+                return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False)
+
+            def dumpb(obj) -> bytes:
+                return dumps(obj).encode("utf-8")
+
+            return "ujson", dumps, dumpb, ujson.loads
+        except ImportError:
+            pass
+
+    return "json", _std_dumps, _std_dumpb, _std_loads
+
+
+BACKEND, dumps, dumpb, loads = _load_backend(os.environ.get("PYP2P_JSON", "").strip().lower())
@@ -0,0 +1,49 @@
+"""
+Anel de hashing consistente usado para dividir os namespaces entre os nós de
+um cluster Rendezvous.
+
+Servidor e cliente constroem o mesmo anel a partir da mesma lista de nós
+("host:port") e do mesmo número de nós virtuais, de modo que ambos concordam
+sobre o dono de cada namespace sem nenhuma coordenação adicional.
+
+API:
+- HashRing(nodes, vnodes=64)
+- ring.owner(key) -> nó responsável pela chave
+- ring.nodes -> lista (ordenada) de nós
+- ring.to_dict() / HashRing.from_dict(d): forma usada no comando RING
+"""
+import bisect
+import hashlib
+from typing import Dict, Iterable, List
+
+DEFAULT_VNODES = 64
+
+
+def _hash(key: str) -> int:
+    # hash estável entre processos (hash() do Python é aleatorizado por execução)
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Anel com `vnodes` pontos por nó; cada chave pertence ao primeiro ponto à sua direita."""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = DEFAULT_VNODES):
+        self.vnodes = vnodes
+        self.nodes: List[str] = sorted(set(nodes))
+        if not self.nodes:
+            raise ValueError("hash ring needs at least one node")
+
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [n for _, n in points]
+
+    def owner(self, key: str) -> str:
+        i = bisect.bisect_right(self._hashes, _hash(key))
+        return self._owners[i % len(self._owners)]
+
+    def to_dict(self) -> Dict:
+        return {"nodes": list(self.nodes), "vnodes": self.vnodes}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "HashRing":
+        return cls(data["nodes"], int(data.get("vnodes", DEFAULT_VNODES)))
@@ -0,0 +1,167 @@
+import hmac
+import socket
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+import threading
+import time
+import logging
+from common import codec
+from common.hashring import HashRing, DEFAULT_VNODES
+
+log = logging.getLogger("cluster")
+
+# commands whose top-level "namespace" decides which shard must serve them
+SHARDED_COMMANDS = ("REGISTER", "UNREGISTER", "DISCOVER", "REFRESH", "LOOKUP")
+MEMBER_TTL = 30.0       # seconds a positive cross-shard membership answer is cached
+MEMBER_NEG_TTL = 30.0   # ... and a negative one (unknown callers must not fan out on every request)
+MEMBER_MAX_PENDING = 16  # distinct IPs being looked up across shards at once; more are refused
+MEMBER_WORKERS = 32     # MEMBER queries in flight at once (all lookups together)
+
+
+class Cluster:
+    """
+    Namespace sharding over a consistent-hash ring.
+
+    Every node is started with the same node list ("host:port", as clients
+    reach them) and vnode count, so all nodes and all clients agree on the
+    owner of each namespace. A namespace-scoped request that reaches another
+    node is answered with a REDIRECT to the owner; the client then learns the
+    ring (RING command) and goes straight to the owning shard.
+
+    Requests are redirected instead of forwarded because REGISTER records the
+    caller's IP: a forwarded request would register the forwarding server.
+
+    The "register first" rule for DISCOVER/LOOKUP is cluster-wide: a node that
+    does not know the caller asks the other shards (MEMBER) in parallel and
+    caches the answer, positive or negative. Concurrent lookups of the same IP
+    share one fan-out, and at most MEMBER_MAX_PENDING IPs are looked up at
+    once. MEMBER requires the cluster secret; without one, only callers
+    registered on this shard pass the check.
+    """
+    def __init__(self, peer_db, nodes, self_node, vnodes=DEFAULT_VNODES, secret=None, timeout=1.0):
+        self.peer_db = peer_db
+        self.ring = HashRing(nodes, vnodes)
+        if self_node not in self.ring.nodes:
+            raise ValueError(f"this node ({self_node}) is not in the cluster node list")
+        self.self_node = self_node
+        self.secret = secret
+        self.timeout = timeout
+        self._members = {}  # ip -> (expires_at monotonic, registered)
+        self._pending = {}  # ip -> Event set when its fan-out ends
+        self._members_lock = threading.Lock()
+        others = len(self.ring.nodes) - 1
+        self._executor = None
+        if secret and others:
+            self._executor = ThreadPoolExecutor(max_workers=min(MEMBER_WORKERS, MEMBER_MAX_PENDING * others),
+                                                thread_name_prefix="member")
+        elif others:
+            log.warning("No cluster secret: MEMBER is disabled, DISCOVER/LOOKUP only "
+                        "accept callers registered on this node")
+
+    def redirect_for(self, cmd, args):
+        """REDIRECT response if `cmd` targets a namespace owned by another node, else None."""
+        if cmd not in SHARDED_COMMANDS:
+            return None
+        namespace = args.get("namespace")
+        if not isinstance(namespace, str) or not namespace:
+            return None
+        owner = self.ring.owner(namespace)
+        if owner == self.self_node:
+            return None
+        log.info("%s ns=%r redirected to %s", cmd, namespace, owner)
+        return {"status": "REDIRECT", "namespace": namespace, "owner": owner}
+
+    def ring_response(self):
+        return {"status": "OK", "self": self.self_node, **self.ring.to_dict()}
+
+    def authorized(self, secret):
+        """Constant-time check of the cluster secret (nobody is accepted without one)."""
+        if not self.secret:
+            return False
+        return isinstance(secret, str) and hmac.compare_digest(secret.encode(), self.secret.encode())
+
+    def handle_member(self, args):
+        """Answer whether `ip` has a live registration on this shard (no further fan-out)."""
+        if not self.authorized(args.get("secret")):
+            log.warning("MEMBER rejected: bad secret")
+            return {"status": "ERROR", "message": "unauthorized"}
+        ip = args.get("ip")
+        if not isinstance(ip, str):
+            return {"status": "ERROR", "message": "bad_ip"}
+        return {"status": "OK", "registered": self.peer_db.is_ip_registered(ip)}
+
+    def is_member(self, ip):
+        """True if `ip` is registered on this shard or (cached) on any other shard."""
+        if self.peer_db.is_ip_registered(ip):
+            return True
+        if self._executor is None:
+            return False
+
+        now = time.monotonic()
+        with self._members_lock:
+            cached = self._members.get(ip)
+            if cached and cached[0] > now:
+                return cached[1]
+            event = self._pending.get(ip)
+            leader = event is None
+            if leader:
+                if len(self._pending) >= MEMBER_MAX_PENDING:
+                    log.warning("Too many MEMBER lookups in progress; %s treated as unregistered", ip)
+                    return False
+                event = self._pending[ip] = threading.Event()
+
+        if not leader:
+            # another request from the same IP is already asking the shards
+            event.wait(self.timeout * 2)
+            with self._members_lock:
+                cached = self._members.get(ip)
+            return bool(cached and cached[1])
+
+        try:
+            registered = self._query_shards(ip)
+            with self._members_lock:
+                ttl = MEMBER_TTL if registered else MEMBER_NEG_TTL
+                self._members[ip] = (now + ttl, registered)
+                # drop stale answers so the cache doesn't grow with every caller ever seen
+                if len(self._members) > 4096:
+                    self._members = {k: v for k, v in self._members.items() if v[0] > now}
+        finally:
+            with self._members_lock:
+                self._pending.pop(ip, None)
+            event.set()
+        return registered
+
+    def _query_shards(self, ip):
+        """Ask every other shard in parallel; True as soon as one has `ip` registered."""
+        req = {"type": "MEMBER", "ip": ip, "secret": self.secret}
+        futures = {self._executor.submit(self._request, node, req): node
+                   for node in self.ring.nodes if node != self.self_node}
+        try:
+            for future in as_completed(futures, timeout=self.timeout * 2):
+                try:
+                    resp = future.result()
+                except (OSError, ValueError) as e:
+                    log.warning("MEMBER query to %s failed: %s", futures[future], e)
+                    continue
+                if resp.get("status") == "OK" and resp.get("registered"):
+                    return True
+        except FutureTimeout:
+            log.warning("MEMBER lookup of %s timed out", ip)
+        finally:
+            for future in futures:
+                future.cancel()  # queries not started yet are no longer needed
+        return False
+
+    def _request(self, node, obj):
+        host, _, port = node.rpartition(":")
+        with socket.create_connection((host, int(port)), timeout=self.timeout) as s:
+            s.sendall(codec.dumpb(obj) + b"\n")
+            buf = bytearray()
+            while b"\n" not in buf:
+                chunk = s.recv(4096)
+                if not chunk:
+                    break
+                buf += chunk
+        line = bytes(buf).split(b"\n", 1)[0]
+        if not line:
+            raise ValueError("empty MEMBER response")
+        return codec.loads(line)
@@ -0,0 +1,196 @@
+import hmac
+import socket
+import threading
+import logging
+from common import codec
+
+log = logging.getLogger("federation")
+
+SYNC_PUSH_BATCH = 64   # entries per SYNC request
+SYNC_PUSH_BYTES = 24 * 1024  # encoded entries per SYNC request (the server's line limit is 32KB)
+SYNC_PULL_BATCH = 500  # entries per SYNC response
+SYNC_MAX_ROUNDS = 20   # SYNC requests per peer and interval while a backlog drains
+MAX_CLOCK_SKEW = 60.0  # seconds a replicated version may be ahead of our clock
+
+
+def parse_peers(spec):
+    """Parse "host:port,host:port" into a list of (host, port) tuples."""
+    peers = []
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        host, sep, port = item.rpartition(":")
+        if not sep or not host:
+            raise ValueError(f"bad federation peer {item!r} (expected host:port)")
+        peers.append((host, int(port)))
+    return peers
+
+
+class Federation:
+    """
+    Anti-entropy replication of the registry between rendezvous servers.
+
+    Every `interval` seconds this server runs a push-pull SYNC with each
+    configured peer: it sends the local changes the peer has not acknowledged
+    yet and receives the peer's changes since the last cursor. Conflicts are
+    resolved per record by last-writer-wins on (version, origin), so replicas
+    converge whatever the order in which deltas arrive, and DISCOVER is always
+    answered from the local copy.
+
+    Cursors are positions in each server's in-memory change feed; when a peer
+    restarts (new incarnation) both directions start over from a full copy.
+
+    SYNC is accepted only with the shared secret or, when none is configured,
+    only from the configured peers' addresses. Entries versioned more than
+    MAX_CLOCK_SKEW seconds in the future are dropped, so a skewed or hostile
+    clock cannot pin a record against later writes.
+    """
+    def __init__(self, peer_db, peers=(), secret=None, interval=2.0, timeout=3.0):
+        self.peer_db = peer_db
+        self.peers = list(peers)
+        self.secret = secret
+        self.interval = interval
+        self.timeout = timeout
+        # per peer: its node id/incarnation and our cursors into both feeds
+        self._state = {addr: {"node": None, "incarnation": None, "pull": 0, "push": 0}
+                       for addr in self.peers}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._allowed_ips = None  # resolved on the first unauthenticated SYNC
+
+    def peer_ips(self):
+        """Resolved IPs of the configured peers (the only SYNC senders accepted without a secret)."""
+        ips = set()
+        for host, _port in self.peers:
+            try:
+                ips.add(socket.gethostbyname(host))
+            except OSError as e:
+                log.warning("Could not resolve federation peer %s: %s", host, e)
+        return ips
+
+    def start(self):
+        """Start the background sync thread (no-op without peers)."""
+        if not self.peers or (self._thread and self._thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sync_loop, name="federation", daemon=True)
+        self._thread.start()
+        log.info("Federation node=%s syncing with %d peer(s) every %.1fs",
+                 self.peer_db.node_id, len(self.peers), self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+    def _sync_loop(self):
+        while not self._stop_event.is_set():
+            self.sync_all()
+            self._stop_event.wait(self.interval)
+
+    def sync_all(self):
+        for addr in self.peers:
+            if self._stop_event.is_set():
+                return
+            try:
+                self.sync_peer(addr)
+            except (OSError, ValueError) as e:
+                log.warning("SYNC with %s:%d failed: %s", *addr, e)
+
+    def sync_peer(self, addr):
+        """Exchange deltas with one peer until both backlogs are drained (or the round limit)."""
+        st = self._state[addr]
+        for _ in range(SYNC_MAX_ROUNDS):
+            push, push_seq, push_more = self.peer_db.changes_since(
+                st["push"], SYNC_PUSH_BATCH, skip_origin=st["node"], max_bytes=SYNC_PUSH_BYTES)
+            req = {
+                "type": "SYNC",
+                "node": self.peer_db.node_id,
+                "incarnation": self.peer_db.incarnation,
+                "seen": st["incarnation"],
+                "since": st["pull"],
+                "limit": SYNC_PULL_BATCH,
+                "changes": push,
+            }
+            if self.secret:
+                req["secret"] = self.secret
+
+            resp = self._request(addr, req)
+            if resp.get("status") != "OK":
+                log.warning("SYNC with %s:%d rejected: %s", *addr, resp.get("message"))
+                return
+
+            if st["incarnation"] is not None and resp["incarnation"] != st["incarnation"]:
+                # the peer restarted: it answered from the start of its new feed,
+                # and whatever it did not persist must be pushed again
+                log.info("Federation peer %s:%d restarted; full resync", *addr)
+                push_seq, push_more = 0, True
+            st["push"] = push_seq
+            st["node"] = resp.get("node")
+            st["incarnation"] = resp["incarnation"]
+            st["pull"] = resp["seq"]
+            self.peer_db.apply_remote(resp.get("changes") or [], max_skew=MAX_CLOCK_SKEW)
+
+            if not push_more and not resp.get("more"):
+                return
+
+    def _request(self, addr, obj):
+        with socket.create_connection(addr, timeout=self.timeout) as s:
+            s.sendall(codec.dumpb(obj) + b"\n")
+            buf = bytearray()
+            while b"\n" not in buf:
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+        line = bytes(buf).split(b"\n", 1)[0]
+        if not line:
+            raise ValueError("empty SYNC response")
+        return codec.loads(line)
+
+    def authorized(self, secret, client_ip=None):
+        """
+        Constant-time check of the shared secret; without one, only the
+        configured peers are accepted.
+        """
+        if not self.secret:
+            if self._allowed_ips is None:
+                self._allowed_ips = self.peer_ips()
+            return client_ip in self._allowed_ips
+        return isinstance(secret, str) and hmac.compare_digest(secret.encode(), self.secret.encode())
+
+    def handle_sync(self, args, client_ip=None):
+        """Serve one SYNC request: apply the caller's changes, return ours since its cursor."""
+        if not self.authorized(args.get("secret"), client_ip):
+            log.warning("SYNC rejected: unauthorized node=%r from %s", args.get("node"), client_ip)
+            return {"status": "ERROR", "message": "unauthorized"}
+
+        changes = args.get("changes") or []
+        since = args.get("since", 0)
+        limit = args.get("limit", SYNC_PULL_BATCH)
+        if not isinstance(changes, list):
+            return {"status": "ERROR", "message": "bad_changes"}
+        if not isinstance(since, int) or since < 0:
+            return {"status": "ERROR", "message": "bad_since"}
+        if not isinstance(limit, int) or not (1 <= limit <= SYNC_PULL_BATCH):
+            limit = SYNC_PULL_BATCH
+
+        # a cursor into a previous incarnation of our feed is meaningless
+        if args.get("seen") != self.peer_db.incarnation:
+            since = 0
+
+        applied = self.peer_db.apply_remote(changes, max_skew=MAX_CLOCK_SKEW)
+        entries, seq, more = self.peer_db.changes_since(since, limit, skip_origin=args.get("node"))
+        log.log(logging.INFO if applied or entries else logging.DEBUG,
+                "SYNC node=%r: applied %d, sent %d change(s)", args.get("node"), applied, len(entries))
+        return {
+            "status": "OK",
+            "node": self.peer_db.node_id,
+            "incarnation": self.peer_db.incarnation,
+            "applied": applied,
+            "seq": seq,
+            "more": more,
+            "changes": entries,
+        }
@@ -1,9 +1,18 @@
 
 
+import sys
+from pathlib import Path
+
+# src/ on the import path for the shared `common` package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 from rendezvous import RendezvousServer
+from federation import parse_peers
+from peer_db import EVICTION_POLICIES
 import logging
 import argparse
-from pathlib import Path
+import os
+import signal
 
 
 def setup_logging(mode: str, logfile: str | None):
@@ -70,9 +79,196 @@ if __name__ == "__main__":
         help="Port for the rendezvous server (default: 8080).",
     )
     
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=10.0,
+        help="Seconds to wait for in-flight requests on shutdown (default: 10).",
+    )
+    
+    parser.add_argument(
+        "--db-file",
+        default="peers.json",
+        help="Registry file (default: peers.json). Use one per server when running several locally.",
+    )
+    
+    parser.add_argument(
+        "--node-id",
+        default=None,
+        help="Federation node id (default: random per start).",
+    )
+    
+    parser.add_argument(
+        "--federation-peers",
+        default="",
+        help="Comma-separated host:port list of rendezvous servers to replicate with.",
+    )
+    
+    parser.add_argument(
+        "--federation-secret",
+        default=os.environ.get("RENDEZVOUS_FEDERATION_SECRET"),
+        help="Shared secret required on SYNC (default: $RENDEZVOUS_FEDERATION_SECRET).",
+    )
+    
+    parser.add_argument(
+        "--federation-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between anti-entropy rounds with each peer (default: 2).",
+    )
+    
+    parser.add_argument(
+        "--cluster-nodes",
+        default="",
+        help="Comma-separated host:port list of all cluster nodes (as clients reach them); enables namespace sharding.",
+    )
+    
+    parser.add_argument(
+        "--cluster-self",
+        default=None,
+        help="This node's host:port in --cluster-nodes (default: 127.0.0.1:<port> when listening on 0.0.0.0).",
+    )
+    
+    parser.add_argument(
+        "--cluster-vnodes",
+        type=int,
+        default=64,
+        help="Virtual nodes per server on the hash ring; must match on every node (default: 64).",
+    )
+    
+    parser.add_argument(
+        "--cluster-secret",
+        default=os.environ.get("RENDEZVOUS_CLUSTER_SECRET"),
+        help="Shared secret for node-to-node MEMBER queries (default: $RENDEZVOUS_CLUSTER_SECRET).",
+    )
+    
+    parser.add_argument(
+        "--probe-interval",
+        type=float,
+        default=0,
+        help="Seconds between liveness probes of registered ip:port (default: 0, disabled).",
+    )
+    
+    parser.add_argument(
+        "--probe-timeout",
+        type=float,
+        default=2.0,
+        help="TCP connect timeout of each probe (default: 2).",
+    )
+    
+    parser.add_argument(
+        "--probe-concurrency",
+        type=int,
+        default=32,
+        help="Maximum probes in flight (default: 32).",
+    )
+    
+    parser.add_argument(
+        "--probe-suspect-after",
+        type=int,
+        default=2,
+        help="Consecutive failed probes before a record is hidden from DISCOVER (default: 2).",
+    )
+    
+    parser.add_argument(
+        "--probe-evict-after",
+        type=int,
+        default=4,
+        help="Consecutive failed probes before a record is removed; 0 never removes (default: 4).",
+    )
+    
+    parser.add_argument(
+        "--probe-max-per-round",
+        type=int,
+        default=512,
+        help="Endpoints probed per round; 0 probes all of them (default: 512).",
+    )
+    
+    parser.add_argument(
+        "--max-records",
+        type=int,
+        default=0,
+        help="Registry cap; 0 disables it (default: 0, no cap).",
+    )
+    
+    parser.add_argument(
+        "--max-per-namespace",
+        type=int,
+        default=0,
+        help="Per-namespace cap; 0 disables it (default: 0, no cap).",
+    )
+    
+    parser.add_argument(
+        "--eviction",
+        choices=EVICTION_POLICIES,
+        default="reject",
+        help="What a full registry does with a new record (default: reject).",
+    )
+    
+    parser.add_argument(
+        "--profiling",
+        action="store_true",
+        help="Enable the PROFILE admin command (default: off).",
+    )
+    
+    parser.add_argument(
+        "--profile-dir",
+        default="profiles",
+        help="Where PROFILE sessions write their pstats/collapsed-stack files (default: profiles).",
+    )
+    
+    parser.add_argument(
+        "--admin-token",
+        default=os.environ.get("RENDEZVOUS_ADMIN_TOKEN"),
+        help="Token for admin commands from non-local clients (default: $RENDEZVOUS_ADMIN_TOKEN; unset = local only).",
+    )
+    
     args = parser.parse_args()
 
     setup_logging(args.log_mode, args.log_file)
     
-    server = RendezvousServer(args.host, args.port)
-    server.start()
+    try:
+        federation_peers = parse_peers(args.federation_peers)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    cluster_nodes = [n.strip() for n in args.cluster_nodes.split(",") if n.strip()]
+    cluster_self = args.cluster_self
+    if cluster_nodes and cluster_self is None:
+        host = "127.0.0.1" if args.host == "0.0.0.0" else args.host
+        cluster_self = f"{host}:{args.port}"
+    
+    server = RendezvousServer(
+        args.host, args.port,
+        db_file=args.db_file,
+        node_id=args.node_id,
+        federation_peers=federation_peers,
+        federation_secret=args.federation_secret,
+        federation_interval=args.federation_interval,
+        cluster_nodes=cluster_nodes,
+        cluster_self=cluster_self,
+        cluster_vnodes=args.cluster_vnodes,
+        cluster_secret=args.cluster_secret,
+        probe_interval=args.probe_interval,
+        probe_timeout=args.probe_timeout,
+        probe_concurrency=args.probe_concurrency,
+        probe_suspect_after=args.probe_suspect_after,
+        probe_evict_after=args.probe_evict_after,
+        probe_max_per_round=args.probe_max_per_round,
+        max_records=args.max_records or None,
+        max_per_namespace=args.max_per_namespace or None,
+        eviction=args.eviction,
+        profiling=args.profiling,
+        profile_dir=args.profile_dir,
+        admin_token=args.admin_token,
+    )
+    
+    # SIGTERM/SIGINT trigger a graceful shutdown: stop accepting, drain, flush
+    def _on_signal(signum, _frame):
+        logging.getLogger("rendezvous").info("Received signal %s", signal.Signals(signum).name)
+        server.stop()
+    
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+    
+    server.start(drain_timeout=args.drain_timeout)
@@ -1,6 +1,8 @@
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from datetime import datetime, timezone, timedelta
 from typing import Optional
+from common import codec
 
 @dataclass
 class PeerRecord:
@@ -10,8 +12,44 @@ class PeerRecord:
     namespace: str
     ttl: int
     timestamp: datetime
+    # Replication metadata for federation: the last write wins, compared as
+    # (version, origin), where version is the writer's clock and origin its node id
+    version: float = 0.0
+    origin: str = ""
 
+    # Runtime caches (never persisted): expiry as epoch seconds and the static part
+    # of the record's JSON, so responses only splice in "expires_in".
+    _expires_at: Optional[float] = field(default=None, init=False, repr=False, compare=False)
+    _fragment: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    # set by the liveness prober while the peer's ip:port is unreachable
+    _suspect: bool = field(default=False, init=False, repr=False, compare=False)
     
+    @property
+    def key(self):
+        """Upsert/index key: one record per (namespace, name, ip)."""
+        return (self.namespace, self.name, self.ip)
+    
+    @property
+    def expires_at(self) -> float:
+        if self._expires_at is None:
+            self._expires_at = (self.timestamp + timedelta(seconds=self.ttl)).timestamp()
+        return self._expires_at
     
     def is_expired(self):
-        return datetime.now(timezone.utc) > self.timestamp + timedelta(seconds=self.ttl)
+        return time.time() > self.expires_at
+    
+    def touch(self, ttl: Optional[int] = None):
+        """Restart the TTL countdown (optionally with a new TTL) and drop stale caches."""
+        self.timestamp = datetime.now(timezone.utc)
+        if ttl is not None:
+            self.ttl = ttl
+        self._expires_at = None
+        self._fragment = None
+    
+    def to_json(self, now: float) -> str:
+        """Serialized record, same layout as codec.dumps of the DISCOVER peer dict."""
+        frag = self._fragment
+        if frag is None:
+            frag = self._fragment = '{"ip":%s,"port":%d,"name":%s,"namespace":%s,"ttl":%d,"expires_in":' % (
+                codec.dumps(self.ip), self.port, codec.dumps(self.name), codec.dumps(self.namespace), self.ttl)
+        return frag + str(max(0, int(self.expires_at - now))) + "}"
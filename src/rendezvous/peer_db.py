@@ -1,17 +1,116 @@
 import json
 import os
+import bisect
+import heapq
+import uuid
+from collections import OrderedDict
 from models import PeerRecord
+from common import codec
 from datetime import datetime, timezone
 import threading
+import time
 import logging
+from contextlib import contextmanager
 
 log = logging.getLogger("peer_db")
 
+# what a full registry does with a new record
+EVICTION_POLICIES = ("soonest_expiry", "oldest_refresh", "reject")
+
+
+def record_from_dict(data):
+    """Build a PeerRecord from its persisted/replicated dict (ISO or epoch timestamp)."""
+    data = dict(data)  # cópia
+    ts = data.get("timestamp")
+
+    #  Normalize to timezone-aware datetime
+    if isinstance(ts, str):
+        s = ts.strip()
+        if s.endswith("Z"):
+            s = s[:-1] + "+00:00"
+        data["timestamp"] = datetime.fromisoformat(s)
+    elif isinstance(ts, (int, float)):
+        data["timestamp"] = datetime.fromtimestamp(ts, tz=timezone.utc)
+
+    data["port"] = int(data["port"])
+    return PeerRecord(**data)
+
+
+def record_to_dict(p, iso=True):
+    """Persisted fields of a record; runtime caches (_*) are left out."""
+    d = {k: v for k, v in p.__dict__.items() if not k.startswith("_")}
+    ts = d.get("timestamp")
+    if not isinstance(ts, datetime):
+        # se por algum motivo já for str/epoch, garante datetime
+        ts = datetime.fromtimestamp(float(ts), tz=timezone.utc)
+    d["timestamp"] = ts.isoformat() if iso else ts.timestamp()
+    return d
+
+
 class PeerDatabase:
-    def __init__(self, filename="peers.json"):
+    """
+    In-memory peer registry persisted lazily to a JSON file.
+
+    Mutations only mark the registry as dirty; a background flusher writes the
+    file at most once every `flush_interval` seconds, and `close()` performs the
+    final flush on shutdown.
+
+    Every change is also appended to an in-memory change feed (see
+    `changes_since`/`apply_remote`) that federated servers use to replicate
+    the registry.
+
+    `max_records` and `max_per_namespace` bound the registry (no cap when None).
+    A new record that would exceed a cap is rejected ("reject", the default) or
+    evicts the record chosen by `eviction` (the one expiring soonest, or the one
+    refreshed longest ago, in the same scope). Victims are kept in lazy min-heaps, so finding one
+    is O(log n) amortized.
+    """
+    def __init__(self, filename="peers.json", flush_interval=2.0, sweep_interval=1.0, node_id=None,
+                 max_records=None, max_per_namespace=None, eviction="reject"):
+        if eviction not in EVICTION_POLICIES:
+            raise ValueError(f"unknown eviction policy {eviction!r}")
         self.filename = filename
+        self.max_records = max_records
+        self.max_per_namespace = max_per_namespace
+        self.eviction = eviction
+        self.counters = {"evicted_global": 0, "evicted_namespace": 0, "rejected": 0}
+        self.node_id = node_id or uuid.uuid4().hex[:12]
+        # the change feed lives in memory: a restart gets a new incarnation so
+        # replicas know their cursors into the old feed are meaningless
+        self.incarnation = uuid.uuid4().hex
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
         self._lock = threading.RLock()
-        self.peers = self._load()
+        self._io_lock = threading.Lock()  # serializes writers of the DB file
+        self._dirty = False
+        self._stop_event = threading.Event()
+        self._flusher = None
+        self._last_sweep = 0.0
+        self._batch_depth = 0
+        self._batch_dirty = False
+        
+        # (namespace, name, ip) -> PeerRecord, plus secondary indexes to sets of keys:
+        # ip -> keys and (namespace, name) -> keys
+        self.peers = {}
+        self._by_ip = {}
+        self._by_name = {}
+        # keys of the visible records kept sorted, so a namespace is a contiguous range
+        # and pages resume by key; records the prober marked suspect are left out
+        self._order = []
+        # change feed: key -> seq of its latest change, oldest first;
+        # removed keys keep a tombstone so the deletion wins over stale replicas
+        self._seq = 0
+        self._changes = OrderedDict()
+        self._tombstones = {}
+        # records per namespace, and eviction candidates as (metric, key) heaps
+        # (global and per namespace); stale entries are skipped when popped
+        self._ns_count = {}
+        self._heap = []
+        self._ns_heap = {}
+        for rec in self._load():
+            if rec.key in self.peers or self._make_room_locked(rec):
+                self._insert_locked(rec)
+                self._changed_locked(rec.key)
 
     def _load(self):
         if not os.path.exists(self.filename):
@@ -27,65 +126,259 @@ class PeerDatabase:
 
         records = []
         for peer in raw:
-            data = dict(peer)  # cópia
-            ts = data.get("timestamp")
-
-            #  Normalize to timezone-aware datetime
-            if isinstance(ts, str):
-                s = ts.strip()
-                if s.endswith("Z"):
-                    s = s[:-1] + "+00:00"
-                data["timestamp"] = datetime.fromisoformat(s)
-            elif isinstance(ts, (int, float)):
-                data["timestamp"] = datetime.fromtimestamp(ts, tz=timezone.utc)
-                
             try:
-                data["port"] = int(data["port"])
-            except Exception:
-                log.warning("Skipping record with invalid port: %r", data.get("port"))
-                continue
-            
-            records.append(PeerRecord(**data))
+                records.append(record_from_dict(peer))
+            except (KeyError, TypeError, ValueError):
+                log.warning("Skipping record with invalid port: %r", peer.get("port"))
             
         log.info("Loaded %d peer(s) from %s", len(records), self.filename)
         return records
 
 
-    def _save_locked(self):
+    def _snapshot_locked(self):
         # MUST be called with self._lock held
+        # prepara conteúdo serializável
+        return [record_to_dict(p) for p in self.peers.values()]
+
+    def _write(self, payload):
         tmpf = self.filename + ".tmp"
 
-        # prepara conteúdo serializável
-        payload = []
-        for p in self.peers:
-            d = dict(p.__dict__)  # se for dataclass, poderia usar asdict(p)
-            ts = d.get("timestamp")
-            if isinstance(ts, datetime):
-                d["timestamp"] = ts.isoformat()
-            else:
-                # se por algum motivo já for str/epoch, garante string ISO
-                d["timestamp"] = datetime.fromtimestamp(float(ts), tz=timezone.utc).isoformat()
-            payload.append(d)
-
-        with open(tmpf, "w", encoding="utf-8") as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2, sort_keys=True)
-            f.flush()
-            os.fsync(f.fileno())
-        os.replace(tmpf, self.filename)
+        with self._io_lock:
+            with open(tmpf, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmpf, self.filename)
         
-        log.info("Saved %d peer(s) into %s", len(self.peers), self.filename)
+        log.info("Saved %d peer(s) into %s", len(payload), self.filename)
+
+    def _save_locked(self):
+        # MUST be called with self._lock held
+        self._write(self._snapshot_locked())
+        self._dirty = False
         
     def _save(self):
         with self._lock:
             self._save_locked()
 
+    def _mark_dirty_locked(self):
+        # MUST be called with self._lock held; the flusher persists it later
+        if self._batch_depth:
+            self._batch_dirty = True
+        else:
+            self._dirty = True
+
+    @contextmanager
+    def batch(self):
+        """
+        Group several operations under a single lock acquisition.
+
+        Nested calls re-enter the (reentrant) lock for free, and the registry is
+        marked for persistence once when the outermost batch exits.
+        """
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._batch_dirty:
+                    self._batch_dirty = False
+                    self._dirty = True
+
+    def flush(self):
+        """Persist the registry if it changed since the last flush."""
+        with self._lock:
+            if not self._dirty:
+                return False
+            payload = self._snapshot_locked()
+            self._dirty = False
+        # file I/O happens outside the registry lock so requests don't wait on fsync
+        try:
+            self._write(payload)
+        except Exception:
+            with self._lock:
+                self._dirty = True
+            raise
+        return True
+
+    def start(self):
+        """Start the background flusher thread."""
+        if self._flusher and self._flusher.is_alive():
+            return
+        self._stop_event.clear()
+        self._flusher = threading.Thread(target=self._flush_loop, name="db-flusher", daemon=True)
+        self._flusher.start()
+
+    def close(self):
+        """Stop the flusher and write any pending changes once."""
+        self._stop_event.set()
+        if self._flusher:
+            self._flusher.join(timeout=self.flush_interval + 1)
+            self._flusher = None
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Periodic flush of %s failed", self.filename)
+
+    def _insert_locked(self, peer: PeerRecord):
+        # MUST be called with self._lock held
+        key = peer.key
+        old = self.peers.get(key)
+        if old is None:
+            self._ns_count[key[0]] = self._ns_count.get(key[0], 0) + 1
+        if (old is None or old._suspect) and not peer._suspect:
+            bisect.insort(self._order, key)
+        self.peers[key] = peer
+        self._by_ip.setdefault(peer.ip, set()).add(key)
+        self._by_name.setdefault(key[:2], set()).add(key)
+        if self.max_records or self.max_per_namespace:
+            self._push_candidate_locked(peer)
+
+    def _delete_locked(self, key):
+        # MUST be called with self._lock held
+        peer = self.peers.pop(key, None)
+        if peer is None:
+            return None
+        self._unorder_locked(key)
+        count = self._ns_count.get(key[0], 0) - 1
+        if count > 0:
+            self._ns_count[key[0]] = count
+        else:
+            self._ns_count.pop(key[0], None)
+            self._ns_heap.pop(key[0], None)
+        for index, ikey in ((self._by_ip, peer.ip), (self._by_name, key[:2])):
+            keys = index.get(ikey)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[ikey]
+        return peer
+
+    def _unorder_locked(self, key):
+        # MUST be called with self._lock held
+        i = bisect.bisect_left(self._order, key)
+        if i < len(self._order) and self._order[i] == key:
+            del self._order[i]
+
+    def _metric(self, peer: PeerRecord):
+        # eviction order: smallest first
+        if self.eviction == "oldest_refresh":
+            return peer.timestamp.timestamp()
+        return peer.expires_at
+
+    def _push_candidate_locked(self, peer: PeerRecord):
+        # MUST be called with self._lock held, whenever the record's metric may have changed
+        entry = (self._metric(peer), peer.key)
+        heapq.heappush(self._heap, entry)
+        heapq.heappush(self._ns_heap.setdefault(peer.namespace, []), entry)
+        # rebuild when stale entries (from refreshes) dominate
+        if len(self._heap) > 2 * len(self.peers) + 64:
+            self._heap = [(self._metric(p), k) for k, p in self.peers.items()]
+            heapq.heapify(self._heap)
+        ns_heap = self._ns_heap[peer.namespace]
+        if len(ns_heap) > 2 * self._ns_count.get(peer.namespace, 0) + 64:
+            keys = {k for _, k in ns_heap if k in self.peers}
+            ns_heap[:] = [(self._metric(self.peers[k]), k) for k in keys]
+            heapq.heapify(ns_heap)
+
+    def _pop_victim_locked(self, heap):
+        # MUST be called with self._lock held; removes and returns the best live candidate
+        while heap:
+            metric, key = heapq.heappop(heap)
+            peer = self.peers.get(key)
+            if peer is not None and self._metric(peer) == metric:
+                return peer
+        return None
+
+    def _make_room_locked(self, peer: PeerRecord):
+        # MUST be called with self._lock held, before inserting a new key.
+        # Returns False if the record must be rejected.
+        ns_full = (self.max_per_namespace
+                   and self._ns_count.get(peer.namespace, 0) >= self.max_per_namespace)
+        full = self.max_records and len(self.peers) >= self.max_records
+        if not ns_full and not full:
+            return True
+        if self.eviction == "reject":
+            self.counters["rejected"] += 1
+            log.debug("Registry full (%s); rejected %s", "namespace" if ns_full else "global", peer.key)
+            return False
+
+        if ns_full:
+            victim = self._pop_victim_locked(self._ns_heap.get(peer.namespace, []))
+            counter = "evicted_namespace"
+        else:
+            victim = self._pop_victim_locked(self._heap)
+            counter = "evicted_global"
+        if victim is None:
+            self.counters["rejected"] += 1
+            return False
+        # eviction is local memory management: no tombstone, replicas keep their copy
+        self._delete_locked(victim.key)
+        self._changes.pop(victim.key, None)
+        self.counters[counter] += 1
+        log.debug("Registry full; evicted %s (%s)", victim.key, self.eviction)
+        return True
+
+    def stats(self):
+        """Sizes, caps and eviction counters of the registry."""
+        with self._lock:
+            return {
+                "records": len(self.peers),
+                "namespaces": len(self._ns_count),
+                "max_records": self.max_records,
+                "max_per_namespace": self.max_per_namespace,
+                "eviction": self.eviction,
+                **self.counters,
+            }
+
+    def _changed_locked(self, key):
+        # MUST be called with self._lock held; moves `key` to the tail of the change feed
+        self._seq += 1
+        self._changes[key] = self._seq
+        self._changes.move_to_end(key)
+
+    def _stamp_locked(self, peer: PeerRecord):
+        # MUST be called with self._lock held; marks `peer` as a local write.
+        # The version never goes backwards for a key, even if the wall clock does.
+        prev = self.peers.get(peer.key) or self._tombstones.get(peer.key)
+        floor = max(peer.version, prev.version if prev is not None else 0.0)
+        peer.version = max(time.time(), floor + 1e-6)
+        peer.origin = self.node_id
+        self._tombstones.pop(peer.key, None)
+
+    def _tombstone_locked(self, peer: PeerRecord):
+        # MUST be called with self._lock held. A stale copy of the record can
+        # only come back while it is still alive, so the tombstone lives as long.
+        self._tombstones[peer.key] = PeerRecord(
+            peer.ip, peer.port, peer.name, peer.namespace, peer.ttl, peer.timestamp,
+            version=peer.version, origin=peer.origin)
+        self._changed_locked(peer.key)
+
     def _sweep(self):
         with self._lock:
-            before = len(self.peers)
-            self.peers = [p for p in self.peers if not p.is_expired()]
-            expired = before - len(self.peers)
+            expired = [k for k, p in self.peers.items() if p.is_expired()]
+            for k in expired:
+                self._delete_locked(k)
+                self._changes.pop(k, None)
+            for k in [k for k, t in self._tombstones.items() if t.is_expired()]:
+                del self._tombstones[k]
+                self._changes.pop(k, None)
+            if expired:
+                self._mark_dirty_locked()
+            self._last_sweep = time.monotonic()
         if expired:
-            log.info("Expired %d peer(s) removed", expired)
+            log.info("Expired %d peer(s) removed", len(expired))
+
+    def _maybe_sweep_locked(self):
+        # Full sweeps are O(n); run them at most once per sweep_interval.
+        # Point lookups check expiry per record, so results stay correct in between.
+        if time.monotonic() - self._last_sweep >= self.sweep_interval:
+            self._sweep()
 
 
     def is_ip_registered(self, ip: str) -> bool:
@@ -94,75 +387,252 @@ class PeerDatabase:
 
         This method performs a thread-safe lookup to determine if any peer with the given
         IP address exists in the peer database.
-        It first performs a sweep operation to remove stale entries before checking.
+        It uses the per-IP index and ignores records that already expired.
         """
-        found = False
-
         with self._lock:
-            self._sweep()
-            for p in self.peers:
-                if p.ip == ip:
-                    found = True
-                    break
-            self._save_locked()
-
-        return found
+            self._maybe_sweep_locked()
+            for key in self._by_ip.get(ip, ()):
+                if not self.peers[key].is_expired():
+                    return True
+        return False
+    
     def add_peer(self, peer: PeerRecord):
-        """Upsert by (ip, namespace, name) to avoid duplicates."""
+        """
+        Upsert by (ip, namespace, name) to avoid duplicates.
+        Returns False if the registry is full and the policy rejects new records.
+        """
         
         with self._lock:
-            # optional dedup key: (ip, namespace, name)
-            self._sweep()
-            updated = False
-            
-            for i, p in enumerate(self.peers):
-                if p.ip == peer.ip and p.namespace == peer.namespace and p.name == peer.name:
-                    # update existing record (port/ttl/timestamp/observed_*)
-                    self.peers[i] = peer  # update existing
-                    updated = True
-                    break
-            if not updated:
-                self.peers.append(peer)
-            
-            self._save_locked()
+            self._maybe_sweep_locked()
+            if peer.key not in self.peers and not self._make_room_locked(peer):
+                return False
+            # update existing record (port/ttl/timestamp) or insert a new one
+            self._stamp_locked(peer)
+            self._insert_locked(peer)
+            self._changed_locked(peer.key)
+            self._mark_dirty_locked()
+            return True
+
+    def refresh_peer(self, ip: str, namespace: str, name: str, ttl=None):
+        """
+        Extend the expiry of an existing, non-expired record owned by `ip`.
+
+        Only the timestamp (and optionally the TTL) is touched: no validation of
+        the other fields and no scan of the registry.
+        Returns the refreshed record, or None if there is nothing to refresh.
+        """
+        with self._lock:
+            peer = self.peers.get((namespace, name, ip))
+            if peer is None or peer.is_expired():
+                return None
+            peer.touch(ttl)
+            self._stamp_locked(peer)
+            self._changed_locked(peer.key)
+            if self.max_records or self.max_per_namespace:
+                self._push_candidate_locked(peer)
+            self._mark_dirty_locked()
+            return peer
 
     def remove_peer(self, ip : str, namespace : str, name=None, port=None):
         """
         Remove all peers that match (ip, namespace) and, if provided, also match name and/or port.
-        Thread-safe: the in-memory list and the persisted file are updated under the lock.
+        Thread-safe: the in-memory registry is updated under the lock and persisted by the flusher.
         """
         
         with self._lock:
-            before = len(self.peers)
-            
             def match(p):
-                ok = (p.ip == ip and p.namespace == namespace)
+                ok = (p.namespace == namespace)
                 if name is not None:
                     ok &= (p.name == name)
                 if port is not None:
                     ok &= (p.port == port)
                 return ok
             
-            self.peers = [p for p in self.peers if not match(p)]
-            removed = before - len(self.peers)
+            victims = [k for k in self._by_ip.get(ip, ()) if match(self.peers[k])]
+            for k in victims:
+                peer = self._delete_locked(k)
+                self._stamp_locked(peer)
+                self._tombstone_locked(peer)
+            removed = len(victims)
             log.info("Removed %d peer(s) ip=%s ns=%s name=%r port=%r",
                      removed, ip, namespace, name, port)
             
-            # Persist under the same lock to keep file and memory in sync.
-            self._save_locked()
+            if removed:
+                self._mark_dirty_locked()
             
             # return True if any peer was removed
             return removed > 0 
 
         
 
-    def get_peers(self, namespace=None):
+    def endpoints(self):
+        """Distinct (ip, port) of the live records, for the liveness prober."""
         with self._lock:
-            self._sweep()
-            if namespace:
-                return [p for p in self.peers if p.namespace == namespace]
-            return self.peers  # return a shallow copy
+            return {(p.ip, p.port) for p in self.peers.values() if not p.is_expired()}
+
+    def set_suspect(self, ip: str, port: int, suspect: bool):
+        """Hide (or show again) the records served at ip:port; returns how many changed."""
+        changed = 0
+        with self._lock:
+            for key in self._by_ip.get(ip, ()):
+                peer = self.peers[key]
+                if peer.port == port and peer._suspect != suspect:
+                    peer._suspect = suspect
+                    if suspect:
+                        self._unorder_locked(key)
+                    else:
+                        bisect.insort(self._order, key)
+                    changed += 1
+        return changed
+
+    def remove_endpoint(self, ip: str, port: int):
+        """Remove every record served at ip:port (as an UNREGISTER would); returns the count."""
+        with self._lock:
+            victims = [k for k in self._by_ip.get(ip, ()) if self.peers[k].port == port]
+            for k in victims:
+                peer = self._delete_locked(k)
+                self._stamp_locked(peer)
+                self._tombstone_locked(peer)
+            if victims:
+                self._mark_dirty_locked()
+        return len(victims)
+
+    def lookup(self, namespace: str, name: str):
+        """Return the live records registered as `name` in `namespace` (O(1) index lookup)."""
+        with self._lock:
+            return [self.peers[k] for k in self._by_name.get((namespace, name), ())
+                    if not self.peers[k].is_expired() and not self.peers[k]._suspect]
+
+    def page(self, namespace=None, after=None, limit=None):
+        """
+        Return up to `limit` live records in key order, optionally restricted to a namespace.
+        Records the liveness prober marked as unreachable are not in the key order at all,
+        so they cost nothing here.
+
+        `after` is the key (namespace, name, ip) where the previous page stopped.
+        Returns (records, next_key); next_key is None when there is nothing left.
+        Work is proportional to the page size, not to the registry size.
+        """
+        with self._lock:
+            self._maybe_sweep_locked()
+            order = self._order
+            
+            i = bisect.bisect_left(order, (namespace,)) if namespace else 0
+            if after is not None:
+                i = max(i, bisect.bisect_right(order, tuple(after)))
+            
+            records = []
+            while i < len(order) and (limit is None or len(records) < limit):
+                key = order[i]
+                if namespace and key[0] != namespace:
+                    break
+                peer = self.peers[key]
+                if not peer.is_expired():
+                    records.append(peer)
+                i += 1
+            
+            more = i < len(order) and (not namespace or order[i][0] == namespace)
+            return records, (order[i - 1] if more and i > 0 else None)
+
+    def get_peers(self, namespace=None):
+        records, _ = self.page(namespace)
+        return records  # new list: safe to use outside the lock
     
     def get_all_db(self):
         with self._lock:
-            return list(self.peers)
+            return list(self.peers.values())
+
+    def changes_since(self, seq: int, limit: int = 500, skip_origin=None, max_bytes=None):
+        """
+        Changes made after position `seq` of the change feed, oldest first.
+
+        Returns (entries, next_seq, more): each entry is the replicated form of a
+        record (epoch timestamp) or, for removals, of its tombstone with
+        "deleted": true. `next_seq` is the cursor for the following call.
+        Entries written by `skip_origin` are left out (the caller already has them)
+        but still advance the cursor. With `max_bytes`, the batch also stops
+        before its encoded entries exceed that size (at least one is returned).
+        """
+        with self._lock:
+            # the feed is ordered by seq: walk back from the tail to the cursor
+            keys = []
+            for key, kseq in reversed(self._changes.items()):
+                if kseq <= seq:
+                    break
+                keys.append((kseq, key))
+            keys.reverse()
+
+            more = len(keys) > limit
+            keys = keys[:limit]
+            entries = []
+            size = 0
+            next_seq = seq
+            for i, (kseq, key) in enumerate(keys):
+                rec = self.peers.get(key)
+                deleted = rec is None
+                if deleted:
+                    rec = self._tombstones.get(key)
+                if rec is not None and (skip_origin is None or rec.origin != skip_origin):
+                    d = record_to_dict(rec, iso=False)
+                    if deleted:
+                        d["deleted"] = True
+                    if max_bytes is not None:
+                        size += len(codec.dumpb(d)) + 1  # separating comma
+                        if entries and size > max_bytes:
+                            return entries, next_seq, True
+                    entries.append(d)
+                next_seq = kseq
+            return entries, next_seq, more
+
+    def apply_remote(self, entries, max_skew=None):
+        """
+        Merge replicated entries from another server (last writer wins).
+
+        An entry replaces the local state of its key only if its (version, origin)
+        is newer than the local record's or tombstone's. Applied entries join the
+        local change feed, so they keep spreading to the other replicas.
+        With `max_skew`, entries whose version is more than that many seconds
+        ahead of the local clock are dropped: they would win every later write.
+        Returns the number of entries applied.
+        """
+        applied = 0
+        horizon = time.time() + max_skew if max_skew is not None else None
+        with self._lock:
+            self._maybe_sweep_locked()
+            for entry in entries:
+                try:
+                    deleted = bool(entry.get("deleted"))
+                    rec = record_from_dict({k: v for k, v in entry.items() if k != "deleted"})
+                    rec.version, rec.origin = float(rec.version), str(rec.origin)
+                except (AttributeError, KeyError, TypeError, ValueError):
+                    log.warning("Skipping malformed replicated entry: %r", entry)
+                    continue
+
+                if horizon is not None and rec.version > horizon:
+                    log.warning("Skipping replicated entry %s from the future (version %.0f, origin %s)",
+                                rec.key, rec.version, rec.origin)
+                    continue
+
+                key = rec.key
+                local = self.peers.get(key) or self._tombstones.get(key)
+                if local is not None and (rec.version, rec.origin) <= (local.version, local.origin):
+                    continue
+                if rec.is_expired():
+                    continue
+
+                if deleted:
+                    self._delete_locked(key)
+                    self._tombstone_locked(rec)
+                else:
+                    if key not in self.peers and not self._make_room_locked(rec):
+                        continue
+                    self._tombstones.pop(key, None)
+                    self._insert_locked(rec)
+                    self._changed_locked(key)
+                applied += 1
+
+            if applied:
+                self._mark_dirty_locked()
+        if applied:
+            log.info("Applied %d replicated change(s)", applied)
+        return applied
@@ -0,0 +1,110 @@
+import random
+import socket
+import threading
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("prober")
+
+
+class LivenessProber:
+    """
+    Periodically TCP-connects to the ip:port of every registered record.
+
+    A record whose endpoint fails `suspect_after` consecutive probes is hidden
+    from DISCOVER/LOOKUP (it comes back on the first successful probe); after
+    `evict_after` consecutive failures it is removed as if it had unregistered
+    (0 keeps it hidden until it expires).
+
+    Probes run in rounds every `interval` seconds (+/- `jitter`, as a fraction),
+    in random order, at most `concurrency` at a time, so a large registry never
+    turns into a connection burst. A round probes at most `max_per_round`
+    endpoints (0: all of them), which bounds its duration to about
+    max_per_round / concurrency * timeout; a large registry is covered over
+    several rounds, each endpoint once per pass.
+    """
+    def __init__(self, peer_db, interval=30.0, timeout=2.0, concurrency=32,
+                 suspect_after=2, evict_after=4, jitter=0.2, max_per_round=512):
+        self.peer_db = peer_db
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.suspect_after = suspect_after
+        self.evict_after = evict_after
+        self.jitter = jitter
+        self.max_per_round = max_per_round
+        self._failures = {}  # (ip, port) -> consecutive failed probes
+        self._queue = deque()  # endpoints still to probe in the current pass
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._probe_loop, name="prober", daemon=True)
+        self._thread.start()
+        log.info("Liveness prober every %.1fs (timeout=%.1fs, concurrency=%d, max %d per round, "
+                 "suspect after %d, evict after %d)", self.interval, self.timeout, self.concurrency,
+                 self.max_per_round, self.suspect_after, self.evict_after)
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+
+    def _probe_loop(self):
+        while not self._stop_event.wait(self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)):
+            try:
+                self.probe_round()
+            except Exception:
+                log.exception("Probe round failed")
+
+    def probe(self, endpoint):
+        """True if a TCP connection to (ip, port) succeeds within the timeout."""
+        try:
+            with socket.create_connection(endpoint, timeout=self.timeout):
+                return True
+        except OSError:
+            return False
+
+    def probe_round(self):
+        """Probe the next batch of endpoints of the current pass; returns (probed, suspect, evicted)."""
+        if not self._queue:
+            # new pass over the registry
+            endpoints = list(self.peer_db.endpoints())
+            random.shuffle(endpoints)
+            # forget endpoints that are no longer registered
+            registered = set(endpoints)
+            self._failures = {e: n for e, n in self._failures.items() if e in registered}
+            self._queue = deque(endpoints)
+        count = len(self._queue)
+        if self.max_per_round:
+            count = min(count, self.max_per_round)
+        endpoints = [self._queue.popleft() for _ in range(count)]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="probe") as pool:
+            results = list(pool.map(self.probe, endpoints))
+
+        suspect = evicted = 0
+        for (ip, port), alive in zip(endpoints, results):
+            if alive:
+                if self._failures.pop((ip, port), 0) >= self.suspect_after:
+                    self.peer_db.set_suspect(ip, port, False)
+                    log.info("Endpoint %s:%d reachable again", ip, port)
+                continue
+
+            failures = self._failures[(ip, port)] = self._failures.get((ip, port), 0) + 1
+            if self.evict_after and failures >= self.evict_after:
+                evicted += self.peer_db.remove_endpoint(ip, port)
+                self._failures.pop((ip, port), None)
+                log.info("Endpoint %s:%d unreachable %d times: evicted", ip, port, failures)
+            elif failures >= self.suspect_after:
+                suspect += 1
+                if self.peer_db.set_suspect(ip, port, True):
+                    log.info("Endpoint %s:%d unreachable %d times: hidden from DISCOVER", ip, port, failures)
+
+        log.debug("Probed %d endpoint(s): %d suspect, %d record(s) evicted", len(endpoints), suspect, evicted)
+        return len(endpoints), suspect, evicted
@@ -0,0 +1,158 @@
+import cProfile
+import hmac
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import logging
+from collections import Counter
+from contextlib import contextmanager
+
+log = logging.getLogger("profiler")
+
+PROFILE_MODES = ("cprofile", "sample")
+MAX_DURATION = 300.0
+LOCAL_IPS = ("127.0.0.1", "::1")
+# before 3.12 a cProfile.Profile only sees the thread that enabled it; from 3.12
+# on it hooks sys.monitoring, so one enabled profile covers the whole interpreter
+# and a second enable() raises ValueError
+PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+
+
+class Profiler:
+    """
+    Time-bounded profiling sessions started at runtime by the PROFILE admin command.
+
+    - "cprofile": written as a pstats file (snakeviz, gprof2dot, `python -m pstats`).
+      Before Python 3.12 every request served during the session runs under its
+      own cProfile.Profile (profilers are per thread) and the results are merged;
+      from 3.12 on a single session-wide profile covers all threads. If another
+      profiling tool already owns the interpreter, the session falls back to
+      "sample".
+    - "sample": a background thread samples the stacks of all threads every
+      `interval` seconds and writes them in collapsed-stack format
+      ("frame;frame;frame count" per line), ready for flamegraph.pl or speedscope.
+      Threads blocked on a lock show up with the acquiring line as leaf frame.
+
+    Only one session runs at a time; the file is written when it ends.
+    """
+    def __init__(self, out_dir="profiles", token=None):
+        self.out_dir = out_dir
+        self.token = token
+        self._lock = threading.Lock()
+        self._mode = None
+        self._stats = None
+        self._path = None
+        self._session = None
+
+    def authorized(self, client_ip, token):
+        """Local callers always; remote ones only with the admin token."""
+        if client_ip in LOCAL_IPS:
+            return True
+        if not self.token or not isinstance(token, str):
+            return False
+        return hmac.compare_digest(token.encode(), self.token.encode())
+
+    def start(self, mode, duration, interval=0.005):
+        """Start a session; returns the output path, or None if one is already running."""
+        with self._lock:
+            if self._mode is not None:
+                return None
+            os.makedirs(self.out_dir, exist_ok=True)
+            if mode == "cprofile" and not PER_THREAD_CPROFILE:
+                session = cProfile.Profile()
+                try:
+                    session.enable()
+                    self._session = session
+                except ValueError as e:
+                    log.warning("cProfile unavailable (%s); sampling instead", e)
+                    mode = "sample"
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            ext = "prof" if mode == "cprofile" else "folded"
+            self._path = os.path.join(self.out_dir, f"profile-{stamp}.{ext}")
+            self._mode = mode
+            self._stats = None if mode == "cprofile" else Counter()
+            path = self._path
+
+        target = self._run_cprofile if mode == "cprofile" else self._run_sampler
+        threading.Thread(target=target, args=(duration, interval), name="profiler", daemon=True).start()
+        log.info("Profiling (%s) for %.0fs -> %s", mode, duration, path)
+        return path
+
+    @contextmanager
+    def request(self):
+        """Wrap the serving of one request; profiles it while a per-thread cProfile session runs."""
+        if self._mode != "cprofile" or not PER_THREAD_CPROFILE:
+            yield
+            return
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # another profiler already owns this thread; serve the request unprofiled
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.disable()
+            with self._lock:
+                if self._mode == "cprofile":
+                    if self._stats is None:
+                        self._stats = pstats.Stats(prof)
+                    else:
+                        self._stats.add(prof)
+
+    def _run_cprofile(self, duration, _interval):
+        time.sleep(duration)
+        with self._lock:
+            stats, path, session = self._stats, self._path, self._session
+            self._mode = self._stats = self._session = None
+        if session is not None:
+            session.disable()
+            try:
+                stats = pstats.Stats(session)
+            except TypeError:  # nothing recorded
+                stats = None
+        if stats is None:
+            log.warning("Profiling ended with no requests served; nothing written")
+            return
+        stats.dump_stats(path)
+        log.info("Profile written to %s", path)
+
+    def _run_sampler(self, duration, interval):
+        me = threading.get_ident()
+        names = {}
+        stacks = self._stats
+        deadline = time.monotonic() + duration
+        samples = 0
+        while time.monotonic() < deadline:
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                leaf = True
+                while frame is not None:
+                    code = frame.f_code
+                    where = frame.f_lineno if leaf else code.co_firstlineno
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{where})")
+                    frame = frame.f_back
+                    leaf = False
+                # worker threads are renamed per client ("cli-ip:port"); group them
+                thread = re.sub(r"(-[\da-f.:]+|_\d+)$", "", names.get(ident, "?"))
+                stack.append(thread)
+                stacks[";".join(reversed(stack))] += 1
+            samples += 1
+            time.sleep(interval)
+
+        with self._lock:
+            path = self._path
+            self._mode = self._stats = None
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        log.info("Profile written to %s (%d samples, %d stacks)", path, samples, len(stacks))
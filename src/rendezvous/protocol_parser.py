@@ -1,5 +1,5 @@
 
-import json
+from common import codec
 import logging
 
 log = logging.getLogger("parser")
@@ -13,7 +13,7 @@ class Request:
 class ProtocolParser:
     def parse(self, raw_data):
         try:
-            data = json.loads(raw_data)
+            data = codec.loads(raw_data)
             
             if not isinstance(data.get("type"), str):
                 log.warning("Missing 'type' in JSON: %s", raw_data)
@@ -22,7 +22,7 @@ class ProtocolParser:
             return Request(data.get("type").upper(), data)
         
         
-        except json.JSONDecodeError:
+        except codec.DecodeError:
             log.warning("Invalid JSON: %s", raw_data)
             return Request("ERROR", {"message": "invalid_json", "hint": "Expect JSON object per line"})
         except Exception:
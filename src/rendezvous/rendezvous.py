@@ -5,14 +5,34 @@ import time
 from collections import defaultdict, deque
 from peer_db import PeerDatabase
 from protocol_parser import ProtocolParser
-from request_handler import RequestHandler
-import json
+from request_handler import RequestHandler, StreamingResponse
+from federation import Federation
+from cluster import Cluster
+from prober import LivenessProber
+from profiler import Profiler
+from common import codec
 import logging
 
 
 log = logging.getLogger("rendezvous")
 
 MAX_LINE = 32 * 1024  # 32KB
+STREAM_CHUNK = 64 * 1024  # bytes buffered before each sendall when streaming
+
+
+def response_status(body: str) -> str:
+    """
+    Status of a serialized response, for logging.
+
+    Every response object starts with its "status" key, so the value is read
+    from the prefix instead of parsing the whole (possibly large) body again.
+    """
+    prefix = '{"status":"'
+    if body.startswith(prefix):
+        end = body.find('"', len(prefix))
+        if end > 0:
+            return body[len(prefix):end]
+    return "?"
 
 class RendezvousServer:
     """
@@ -38,13 +58,41 @@ class RendezvousServer:
     - Consider using external rate-limiting solutions (e.g., fail2ban, iptables)
       for more sophisticated protection
     """
-    def __init__(self, host='0.0.0.0', port=5000, max_attempts=50, window_seconds=60, block_time=60):
+    def __init__(self, host='0.0.0.0', port=5000, max_attempts=50, window_seconds=60, block_time=60,
+                 db_file="peers.json", node_id=None, federation_peers=None, federation_secret=None,
+                 federation_interval=2.0, cluster_nodes=None, cluster_self=None, cluster_vnodes=64,
+                 cluster_secret=None, probe_interval=0, probe_timeout=2.0, probe_concurrency=32,
+                 probe_suspect_after=2, probe_evict_after=4, probe_max_per_round=512, max_records=None,
+                 max_per_namespace=None, eviction="reject", profiling=False, profile_dir="profiles",
+                 admin_token=None):
         self.host = host
         self.port = port
-        self.peer_db = PeerDatabase()
+        self.peer_db = PeerDatabase(db_file, node_id=node_id, max_records=max_records,
+                                    max_per_namespace=max_per_namespace, eviction=eviction)
         self.parser = ProtocolParser()
-        self.handler = RequestHandler(self.peer_db)
         
+        # Federation: replicate the registry with other rendezvous servers
+        self.federation = None
+        if federation_peers or federation_secret:
+            self.federation = Federation(self.peer_db, federation_peers or (),
+                                         secret=federation_secret, interval=federation_interval)
+        
+        # Cluster: namespaces sharded over a consistent-hash ring of servers
+        self.cluster = None
+        if cluster_nodes:
+            self.cluster = Cluster(self.peer_db, cluster_nodes, cluster_self or f"{host}:{port}",
+                                   vnodes=cluster_vnodes, secret=cluster_secret)
+        # PROFILE admin command: on-demand cProfile/sampling sessions
+        self.profiler = Profiler(profile_dir, admin_token) if profiling else None
+        self.handler = RequestHandler(self.peer_db, self.federation, self.cluster, self.profiler)
+        
+        # Optional liveness prober: hides/evicts records whose ip:port stopped answering
+        self.prober = None
+        if probe_interval > 0:
+            self.prober = LivenessProber(self.peer_db, interval=probe_interval, timeout=probe_timeout,
+                                         concurrency=probe_concurrency, suspect_after=probe_suspect_after,
+                                         evict_after=probe_evict_after,
+                                         max_per_round=probe_max_per_round)
         # IP blocking configuration
         self.max_attempts = max_attempts  # Maximum connection attempts in the time window
         self.window_seconds = window_seconds  # Time window for counting attempts (in seconds)
@@ -55,7 +103,40 @@ class RendezvousServer:
         self.blocked_ips = {}  # IP -> block timestamp
         self.attempts_lock = threading.Lock()  # Lock to protect shared data structures
         
+        # Shutdown control: stop() flips the event, the accept loop drains and exits
+        self._stop_event = threading.Event()
+        self._inflight = set()  # futures of requests being served
+        self._inflight_lock = threading.Lock()
+        
+    def stop(self):
+        """
+        Request a graceful shutdown (safe to call from signal handlers).
+
+        The accept loop stops taking new connections, waits for in-flight
+        requests up to the drain deadline and flushes the registry once.
+        """
+        if not self._stop_event.is_set():
+            log.info("Shutdown requested")
+        self._stop_event.set()
+
+    def _track(self, future):
+        with self._inflight_lock:
+            self._inflight.add(future)
+        future.add_done_callback(self._untrack)
+
+    def _untrack(self, future):
+        with self._inflight_lock:
+            self._inflight.discard(future)
+
+    def _serve(self, connection, address):
+        # runs in a worker thread; profiled while a PROFILE cprofile session is active
+        if self.profiler is None:
+            self.handle_client(connection, address)
+            return
+        with self.profiler.request():
+            self.handle_client(connection, address)
         
+
     def handle_client(self, connection, address):
         connection.settimeout(5)
         buf = b""
@@ -77,7 +158,7 @@ class RendezvousServer:
                     log.warning(f"Connection from {peer} blocked due to too many attempts "
                                f"({int(self.block_time - time_since_block)}s remaining)")
                     
-                    msg = json.dumps({
+                    msg = codec.dumps({
                         "status": "ERROR",
                         "message": f"Connection from {peer} has been blocked due to excessive login attempts (limit: {self.max_attempts}). The block will be lifted in {int(self.block_time - time_since_block)} seconds."
                     })
@@ -115,7 +196,7 @@ class RendezvousServer:
                 connection.close()
                 return
             
-            # Record this connection attempt
+            # Record this connection attempt (refunded below for authenticated server traffic)
             attempts_deque.append(now)
         
         log.info(f"Connection from {peer}")
@@ -140,7 +221,7 @@ class RendezvousServer:
                         log.warning("Request line too long from %s: %d bytes (limit=%d). Closing.", peer, len(buf), MAX_LINE)
                         log.debug("First 200 bytes from %s: %r", peer, buf[:200])
                         
-                        msg = json.dumps({"status": "ERROR","message": "line_too_long","limit": MAX_LINE})
+                        msg = codec.dumps({"status": "ERROR","message": "line_too_long","limit": MAX_LINE})
                         try:
                             connection.sendall((msg + "\n").encode("utf-8"))
                         except (socket.timeout, BrokenPipeError, ConnectionResetError) as e:
@@ -153,7 +234,7 @@ class RendezvousServer:
                         break
                     
                 except (TimeoutError, socket.timeout):
-                    msg = json.dumps({"status": "ERROR", "message": "Timeout: no data received, closing connection"}) 
+                    msg = codec.dumps({"status": "ERROR", "message": "Timeout: no data received, closing connection"}) 
                     
                     log.warning("Timeout waiting data from %s; sending error and closing", peer)
 
@@ -164,7 +245,7 @@ class RendezvousServer:
                     
             # if did come useful data, process it and close connection        
             if not line or not line.strip():
-                msg = json.dumps({"status": "ERROR", "message": "Empty request line"})
+                msg = codec.dumps({"status": "ERROR", "message": "Empty request line"})
                 log.warning("Empty request line from %s; sending error", peer)
 
                 connection.sendall((msg + "\n").encode("utf-8"))
@@ -172,20 +253,31 @@ class RendezvousServer:
             
             # parse and handle request    
             raw = line.decode("utf-8", errors="replace")         
-            log.info("Received from %s: %s", peer, raw.strip())  
-        
             request = self.parser.parse(raw)
             
+            # replication batches are large and carry the federation secret
+            if request.command == "SYNC":
+                log.debug("Received SYNC from %s (%d bytes)", peer, len(raw))
+            else:
+                log.info("Received from %s: %s", peer, raw.strip())  
+            
             log.info("Parsed request (%s) from %s", request.command, peer)
 
+            # federation/cluster servers talk to us all the time: once they prove
+            # who they are, their connections don't count towards the rate limit
+            if self._authenticated_peer(request, client_ip):
+                self._refund_attempt(client_ip, now)
+
             response = self.handler.handle(request, address[0])
+            
+            if isinstance(response, StreamingResponse):
+                sent = self._send_stream(connection, response)
+                log.info("Responded to %s (status=OK, stream, %d bytes)", peer, sent)
+                return
+            
             connection.sendall((response + "\n").encode("utf-8"))
             
-            try:  
-                status = json.loads(response).get("status") 
-            except Exception:
-                status = "?"
-            log.info("Responded to %s (status=%s)", peer, status)
+            log.info("Responded to %s (status=%s)", peer, response_status(response))
 
             # after sending response, just close connection
             return
@@ -200,7 +292,36 @@ class RendezvousServer:
             connection.close()
             log.info("Connection closed with %s", peer)
 
-            
+
+    def _authenticated_peer(self, request, client_ip):
+        """SYNC/MEMBER that passes the federation/cluster check (server traffic, not a client)."""
+        if request.command == "SYNC" and self.federation:
+            return self.federation.authorized(request.args.get("secret"), client_ip)
+        if request.command == "MEMBER" and self.cluster:
+            return self.cluster.authorized(request.args.get("secret"))
+        return False
+
+    def _refund_attempt(self, client_ip, stamp):
+        with self.attempts_lock:
+            attempts = self.attempts.get(client_ip)
+            if attempts and stamp in attempts:
+                attempts.remove(stamp)
+
+    def _send_stream(self, connection, response):
+        """Write a StreamingResponse line by line, coalescing lines into ~64KB sends."""
+        buf = bytearray()
+        sent = 0
+        for line in response:
+            buf += line.encode("utf-8")
+            buf += b"\n"
+            if len(buf) >= STREAM_CHUNK:
+                connection.sendall(buf)
+                sent += len(buf)
+                buf.clear()
+        if buf:
+            connection.sendall(buf)
+            sent += len(buf)
+        return sent
             
     def start(
         self,
@@ -209,6 +330,8 @@ class RendezvousServer:
         ka_idle: int = 60,
         ka_intvl: int = 15,
         ka_cnt: int = 4,
+        drain_timeout: float = 10.0,
+        accept_poll: float = 0.5,
     ):
         import concurrent.futures  # keep import local to avoid new global deps
             
@@ -232,15 +355,32 @@ class RendezvousServer:
 
         server.bind((self.host, self.port))
         server.listen(backlog)
+        # Periodic accept timeout so the loop can notice stop() requests
+        server.settimeout(accept_poll)
         
         log.info("Rendezvous server listening on %s:%d (backlog=%d, workers=%d)",
                  self.host, self.port, backlog, max_workers)
         
-        with concurrent.futures.ThreadPoolExecutor(
+        self._stop_event.clear()
+        self.peer_db.start()
+        if self.federation:
+            self.federation.start()
+        if self.prober:
+            self.prober.start()
+        executor = concurrent.futures.ThreadPoolExecutor(
             max_workers=max_workers, thread_name_prefix='cli'
-        ) as executor:
-            while True:
-                connection, address = server.accept()
+        )
+        
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    connection, address = server.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    if self._stop_event.is_set():
+                        break
+                    raise
                 
                 # Also enable keepalive on accepted sockets (some OSes don't inherit all opts)
                 try:
@@ -257,6 +397,34 @@ class RendezvousServer:
                     log.debug("Keepalive not supported on accepted socket %s:%s: %s", *address, e)
 
                 # Hand over to the pool (limits concurrency)
-                executor.submit(self.handle_client, connection, address)
+                self._track(executor.submit(self._serve, connection, address))
+        finally:
+            # 1) stop accepting: pending connections in the backlog are refused
+            try:
+                server.close()
+            except Exception:
+                pass
+            
+            # 2) drain in-flight requests within the deadline
+            with self._inflight_lock:
+                inflight = list(self._inflight)
+            if inflight:
+                log.info("Draining %d in-flight request(s) (deadline=%.1fs)", len(inflight), drain_timeout)
+            _done, pending = concurrent.futures.wait(inflight, timeout=drain_timeout)
+            if pending:
+                log.warning("Drain deadline reached; abandoning %d request(s)", len(pending))
+            executor.shutdown(wait=False, cancel_futures=True)
+            if self.federation:
+                self.federation.stop()
+            if self.prober:
+                self.prober.stop()
+            
+            # 3) final flush of the registry (exactly once)
+            try:
+                self.peer_db.close()
+            except Exception:
+                log.exception("Final flush of the peer DB failed")
+            
+            log.info("Rendezvous server stopped")
 
 
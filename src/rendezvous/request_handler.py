@@ -1,162 +1,575 @@
-import json
+import base64
+import binascii
+import zlib
 from models import PeerRecord
 from datetime import datetime, timezone
+import time
 import logging
 
 from peer_db import PeerDatabase
+from profiler import PROFILE_MODES, MAX_DURATION
+from common import codec
 
 log = logging.getLogger("Handler")
 
+MAX_REFRESH_BATCH = 256
+MAX_BATCH = 64
+MAX_LOOKUP_IDS = 256
+BATCH_COMMANDS = ("REGISTER", "UNREGISTER", "DISCOVER", "REFRESH", "LOOKUP")
+MAX_PAGE = 1000
+STREAM_PAGE = 256  # records fetched per lock acquisition while streaming
+COMPRESS_THRESHOLD = 1024  # responses shorter than this are never compressed
+COMPRESS_LEVEL = 6
+PEER_FIELDS = ("ip", "port", "name", "namespace", "ttl", "expires_in")
+
+
+def clamp_ttl(ttl):
+    """TTL clamp (1 .. 86400); raises ValueError/TypeError for non-integers."""
+    ttl = int(ttl)
+    return max(1, min(ttl, 86400))
+
+
+def peer_to_dict(p, now):
+    return {
+        "ip": p.ip,
+        "port": p.port,
+        "name": p.name,
+        "namespace": p.namespace,
+        "ttl": p.ttl,
+        "expires_in": max(0, int(p.ttl - (now - p.timestamp).total_seconds()))
+    }
+
+
+class RawJSON:
+    """Already-serialized JSON text, spliced verbatim by dumps()."""
+    __slots__ = ("text",)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def dumps(obj):
+    """
+    codec.dumps that understands RawJSON values (same compact output layout).
+
+    Containers are only walked by hand when they may hold RawJSON; everything
+    else goes straight to codec.dumps.
+    """
+    if isinstance(obj, RawJSON):
+        return obj.text
+    if isinstance(obj, dict):
+        if any(isinstance(v, RawJSON) for v in obj.values()) or any(
+                isinstance(v, list) and any(isinstance(x, dict) for x in v) for v in obj.values()):
+            return "{" + ",".join(codec.dumps(k) + ":" + dumps(v) for k, v in obj.items()) + "}"
+        return codec.dumps(obj)
+    if isinstance(obj, list):
+        return "[" + ",".join(dumps(v) for v in obj) + "]"
+    return codec.dumps(obj)
+
+
+def project(d, fields):
+    return {f: d[f] for f in fields} if fields else d
+
+
+def compress_response(status, body):
+    """
+    Wrap a serialized response as {"status", "encoding": "zlib+base64", "data"}.
+
+    The status stays in clear so logs and simple clients can still read it.
+    """
+    data = base64.b64encode(zlib.compress(body.encode("utf-8"), COMPRESS_LEVEL)).decode("ascii")
+    return codec.dumps({"status": status, "encoding": "zlib+base64", "data": data})
+
+
+def encode_cursor(key):
+    """Opaque continuation token for a registry key (namespace, name, ip)."""
+    raw = codec.dumpb(list(key))
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on malformed tokens."""
+    try:
+        key = codec.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, codec.DecodeError, AttributeError) as e:
+        raise ValueError("bad cursor") from e
+    if not (isinstance(key, list) and len(key) == 3 and all(isinstance(k, str) for k in key)):
+        raise ValueError("bad cursor")
+    return tuple(key)
+
+
+class StreamingResponse:
+    """
+    Multi-line (NDJSON) response: one JSON object per line, produced lazily.
+
+    The server writes the lines as they are generated instead of building the
+    whole response in memory; the last line is the terminator
+    {"status": "OK", "end": true, "count": N}.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __iter__(self):
+        return iter(self.lines)
+
+
 class RequestHandler:
-    def __init__(self, peer_db : PeerDatabase):
+    def __init__(self, peer_db : PeerDatabase, federation=None, cluster=None, profiler=None):
         self.peer_db = peer_db
+        self.federation = federation
+        self.cluster = cluster
+        self.profiler = profiler
 
     def handle(self, request, client_ip):
-        cmd = request.command
-        args = request.args
-        
+        if request.command == "DISCOVER" and request.args.get("stream") is True:
+            redirect = self.cluster and self.cluster.redirect_for(request.command, request.args)
+            if redirect:
+                return codec.dumps(redirect)
+            return self._handle_discover_stream(request.args, client_ip)
+
+        response = self.dispatch(request.command, request.args, client_ip)
+        body = dumps(response)
+
+        # opt-in compression ({"compress": "zlib"}) for large responses
+        if request.args.get("compress") == "zlib" and len(body) >= COMPRESS_THRESHOLD:
+            packed = compress_response(response.get("status"), body)
+            if len(packed) < len(body):
+                log.debug("Compressed %s response: %d -> %d bytes", request.command, len(body), len(packed))
+                return packed
+        return body
+
+    def dispatch(self, cmd, args, client_ip):
+        """Run one command and return the response object (not yet serialized)."""
+        if self.cluster:
+            # namespace owned by another shard: send the client there
+            redirect = self.cluster.redirect_for(cmd, args)
+            if redirect:
+                return redirect
+
         if cmd == "REGISTER":
-            namespace = request.args.get("namespace")
-            name = request.args.get("name")
-            port = request.args.get("port")
-            ttl = request.args.get("ttl", 7200)
-            
-            log.info(
-                "REGISTER from ip=%s ns=%r name=%r port=%r ttl=%r",
-                client_ip, namespace, name, port, ttl
+            return self._handle_register(args, client_ip)
+        elif cmd == "DISCOVER":
+            return self._handle_discover(args, client_ip)
+        elif cmd == "UNREGISTER":
+            return self._handle_unregister(args, client_ip)
+        elif cmd == "REFRESH":
+            return self._handle_refresh(args, client_ip)
+        elif cmd == "LOOKUP":
+            return self._handle_lookup(args, client_ip)
+        elif cmd == "BATCH":
+            return self._handle_batch(args, client_ip)
+        elif cmd == "SYNC":
+            return self._handle_sync(args, client_ip)
+        elif cmd == "RING":
+            return self._handle_ring(args, client_ip)
+        elif cmd == "MEMBER":
+            return self._handle_member(args, client_ip)
+        elif cmd == "STATS":
+            return self._handle_stats(args, client_ip)
+        elif cmd == "PROFILE":
+            return self._handle_profile(args, client_ip)
+
+        log.warning("Unknown command: %s", cmd)
+        return {"status": "ERROR", "message": "Unknown command"}
+
+    def _handle_register(self, args, client_ip):
+        namespace = args.get("namespace")
+        name = args.get("name")
+        port = args.get("port")
+        ttl = args.get("ttl", 7200)
+
+        log.info(
+            "REGISTER from ip=%s ns=%r name=%r port=%r ttl=%r",
+            client_ip, namespace, name, port, ttl
+        )
+
+        if not isinstance(name, str) or not name or len(name) > 64:
+            log.warning("REGISTER invalid (name)")
+            return {"status": "ERROR", "message": "bad_name"}
+
+        # TTL clamp (1 .. 86400)
+        try:
+            ttl = clamp_ttl(ttl)
+        except (ValueError, TypeError):
+            log.warning("REGISTER invalid (ttl)")
+            return {"status": "ERROR", "message": "bad_ttl"}
+
+        #lets validate required fields
+        if not isinstance(namespace, str) or not namespace or len(namespace) > 64:
+            log.warning("REGISTER invalid (namespace)")
+            return {"status": "ERROR", "message": "bad_namespace"}
+
+        try:
+            port = int(port)
+            if not (1 <= port <= 65535):
+                raise ValueError()
+        except (ValueError, TypeError):
+            log.warning("REGISTER invalid (port)")
+            return {"status": "ERROR", "message": "bad_port"}
+
+        try:
+            peer = PeerRecord(
+                ip=client_ip,
+                port=port,
+                name=name,
+                namespace=namespace,
+                ttl=ttl,
+                timestamp=datetime.now(timezone.utc),
             )
-            
-            if not isinstance(name, str) or not name or len(name) > 64:
-                log.warning("REGISTER invalid (name)")
-                return json.dumps({"status": "ERROR", "message": "bad_name"})
-            
-            # TTL clamp (1 .. 86400)
-            try:
-                ttl = int(ttl)
-                if ttl < 1 or ttl > 86400:
-                    ttl = max(1, min(ttl, 86400))
-            except (ValueError, TypeError):
-                log.warning("REGISTER invalid (ttl)")
-                return json.dumps({"status": "ERROR", "message": "bad_ttl"})
-            
-            #lets validate required fields
-            if not isinstance(namespace, str) or not namespace or len(namespace) > 64:
-                log.warning("REGISTER invalid (namespace)")
-                return json.dumps({"status": "ERROR", "message": "bad_namespace"})
-            
-            try:
-                port = int(port)
-                if not (1 <= port <= 65535):
-                    raise ValueError()
-            except (ValueError, TypeError):
-                log.warning("REGISTER invalid (port)")
-                return json.dumps({"status": "ERROR", "message": "bad_port"})
-            
+            if not self.peer_db.add_peer(peer):
+                log.warning("REGISTER ip=%s ns=%r name=%r rejected: registry full", client_ip, namespace, name)
+                return {"status": "ERROR", "message": "registry_full"}
+
+            log.info("REGISTER OK: %s:%d ns=%s ttl=%d", peer.ip, peer.port, peer.namespace, peer.ttl)
+
+            return {
+                "status": "OK",
+                "ttl": peer.ttl,
+                "ip": peer.ip,
+                "port": peer.port
+            }
+
+        except Exception as e:
+            log.exception("REGISTER failed")
+            return {"status": "ERROR", "message": str(e)}
+
+    def _parse_discover(self, args, client_ip):
+        """Validate DISCOVER arguments; returns (error, namespace, after, limit, fields)."""
+        if not self._is_member(client_ip):
+            log.info("DISCOVER client should register first: %s", client_ip)
+            return {"status": "ERROR", "message": "peer_not_registered"}, None, None, None, None
+
+        namespace = args.get("namespace")
+
+        if namespace is not None and not (1 <= len(namespace) <= 64):
+            log.warning("DISCOVER invalid (namespace:%r)", namespace)
+            return {"status": "ERROR", "message": "bad_namespace"}, None, None, None, None
+
+        # optional pagination (limit + cursor) and projection (fields)
+        limit = args.get("limit")
+        if limit is not None:
+            if isinstance(limit, bool) or not isinstance(limit, int) or not (1 <= limit <= MAX_PAGE):
+                log.warning("DISCOVER invalid (limit:%r)", limit)
+                return {"status": "ERROR", "message": "bad_limit", "limit": MAX_PAGE}, None, None, None, None
+
+        after = None
+        cursor = args.get("cursor")
+        if cursor is not None:
             try:
-                peer = PeerRecord(
-                    ip=client_ip,
-                    port=int(args.get("port")),
-                    name=args.get("name"),
-                    namespace=args["namespace"],
-                    ttl=ttl,
-                    timestamp=datetime.now(timezone.utc),
-                )
-                self.peer_db.add_peer(peer)
-                
-                log.info("REGISTER OK: %s:%d ns=%s ttl=%d", peer.ip, peer.port, peer.namespace, peer.ttl)
-                
-                return json.dumps({
-                    "status": "OK",
-                    "ttl": peer.ttl,
-                    "ip": peer.ip,       
-                    "port": peer.port    
-                })  
-                          
-            except Exception as e:
-                log.exception("REGISTER failed")
-                return json.dumps({"status": "ERROR", "message": str(e)})
-
-            
-        elif cmd == "DISCOVER":
-            
-            if not self.peer_db.is_ip_registered(client_ip):
-                log.info("DISCOVER client should register first: %s", client_ip)
-                return json.dumps({"status": "ERROR", "message": "peer_not_registered"})
-            
+                after = decode_cursor(cursor)
+            except ValueError:
+                after = None
+            if after is None or (namespace and after[0] != namespace):
+                log.warning("DISCOVER invalid (cursor:%r)", cursor)
+                return {"status": "ERROR", "message": "bad_cursor"}, None, None, None, None
+
+        fields = args.get("fields")
+        if fields is not None:
+            if (not isinstance(fields, list) or not fields
+                    or any(f not in PEER_FIELDS for f in fields)):
+                log.warning("DISCOVER invalid (fields:%r)", fields)
+                return ({"status": "ERROR", "message": "bad_fields", "allowed": list(PEER_FIELDS)},
+                        None, None, None, None)
+
+        return None, namespace, after, limit, fields
+
+    def _handle_discover(self, args, client_ip):
+        error, namespace, after, limit, fields = self._parse_discover(args, client_ip)
+        if error:
+            return error
+
+        peers, next_key = self.peer_db.page(namespace, after=after, limit=limit)
+
+        if fields:
+            now = datetime.now(timezone.utc)
+            peer_list = [project(peer_to_dict(p, now), fields) for p in peers]
+        else:
+            # full records: join the cached per-record fragments
+            now_ts = time.time()
+            peer_list = RawJSON("[" + ",".join(p.to_json(now_ts) for p in peers) + "]")
+
+        log.info("DISCOVER ns=%r -> %d peer(s)%s", namespace, len(peers),
+                 " (more)" if next_key else "")
+
+        response = {"status": "OK", "peers": peer_list}
+        if next_key is not None:
+            response["next_cursor"] = encode_cursor(next_key)
+        if self.cluster and namespace is None:
+            # only this shard's namespaces; cluster-aware clients ask every node
+            response["partial"] = True
+        return response
+
+    def _handle_discover_stream(self, args, client_ip):
+        """
+        DISCOVER with "stream": true -> one peer per line plus a terminator line.
+
+        Peers are read from the registry one page at a time, so memory stays
+        constant regardless of registry size (limit is ignored; cursor and
+        fields apply as usual).
+        """
+        error, namespace, after, _limit, fields = self._parse_discover(args, client_ip)
+        if error:
+            return codec.dumps(error)
+
+        def lines(after):
+            count = 0
+            while True:
+                peers, next_key = self.peer_db.page(namespace, after=after, limit=STREAM_PAGE)
+                now = datetime.now(timezone.utc)
+                now_ts = now.timestamp()
+                for p in peers:
+                    count += 1
+                    if fields:
+                        yield codec.dumps(project(peer_to_dict(p, now), fields))
+                    else:
+                        yield p.to_json(now_ts)
+                if next_key is None:
+                    break
+                after = next_key
+
+            log.info("DISCOVER (stream) ns=%r -> %d peer(s)", namespace, count)
+            end = {"status": "OK", "end": True, "count": count}
+            if self.cluster and namespace is None:
+                end["partial"] = True
+            yield codec.dumps(end)
+
+        return StreamingResponse(lines(after))
+
+    def _is_member(self, client_ip):
+        """The "register first" check: local registry, or any shard when clustered."""
+        if self.cluster:
+            return self.cluster.is_member(client_ip)
+        return self.peer_db.is_ip_registered(client_ip)
+
+    def _handle_unregister(self, args, client_ip):
+        try:
+
+            ip_registered = self.peer_db.is_ip_registered(client_ip)
+
+            if not ip_registered:
+                log.info("UNREGISTER client should register first: %s", client_ip)
+                return {"status": "ERROR", "message": "peer_not_registered"}
+
             namespace = args.get("namespace")
-            
+            name = args.get("name")
+            port = args.get("port")
+
+            if namespace is None:
+                log.warning("UNREGISTER invalid (namespace)")
+                return {"status": "ERROR", "message": "namespace_required"}
+
             if namespace is not None and not (1 <= len(namespace) <= 64):
-                    log.warning("UNREGISTER invalid (namespace:%r)", namespace)
-                    return json.dumps({"status": "ERROR", "message": "bad_namespace"})
-            
-            
-            peers = self.peer_db.get_peers(namespace)
-            now = datetime.now(timezone.utc)
-            
-            peer_list = [{
-                "ip": p.ip,
-                "port": p.port,
-                "name": p.name,
-                "namespace": p.namespace,
-                "ttl": p.ttl,
-                "expires_in": max(0, int(p.ttl - (now - p.timestamp).total_seconds()))
-            } for p in peers]
-            
-            log.info("DISCOVER ns=%r -> %d peer(s)", namespace, len(peer_list)) 
-            
-            return json.dumps({"status": "OK", "peers": peer_list})
-        
-        elif cmd == "UNREGISTER":
+                log.warning("UNREGISTER invalid (namespace:%r)", namespace)
+                return {"status": "ERROR", "message": "bad_namespace"}
+
+            if port is not None:
+                try:
+                    port = int(port)
+
+                    if not (1 <= port <= 65535):
+                        raise ValueError()
+                except (ValueError, TypeError):
+                    log.warning(f"UNREGISTER invalid (port:{port})")
+                    return {"status": "ERROR", "message": f"bad_port ({port})"}
+
+            removed = self.peer_db.remove_peer(client_ip, namespace, name=name, port=port)
+
+            if not removed and ip_registered:
+                log.info("UNREGISTER ip=%s ns=%r name=%r port=%r NOT FOUND",
+                         client_ip, namespace, name, port)
+                return {"status": "ERROR", "message": "peer_credentials_do_not_match"}
+            elif not removed:
+                log.info("UNREGISTER ip=%s ns=%r name=%r port=%r NOT FOUND",
+                         client_ip, namespace, name, port)
+                return {"status": "ERROR", "message": "peer_not_registered"}
+            else:
+                log.info("UNREGISTER ip=%s ns=%r name=%r port=%r OK",
+                            client_ip, namespace, name, port)
+
+                return {"status": "OK"}
+
+        except Exception as e:
+            log.exception("UNREGISTER failed")
+            return {"status": "ERROR", "message": str(e)}
+
+    def _handle_refresh(self, args, client_ip):
+        """
+        Extend the expiry of records owned by the caller's IP.
+
+        Single form: {"type": "REFRESH", "namespace": ..., "name": ..., "ttl"?: ...}
+        Batch form:  {"type": "REFRESH", "peers": [{"namespace": ..., "name": ...}, ...], "ttl"?: ...}
+        """
+        ttl = args.get("ttl")
+        if ttl is not None:
             try:
-                
-                ip_registered = self.peer_db.is_ip_registered(client_ip)
-                
-                if not ip_registered:
-                    log.info("UNREGISTER client should register first: %s", client_ip)
-                    return json.dumps({"status": "ERROR", "message": "peer_not_registered"})
-                
-                namespace = args.get("namespace")
-                name = args.get("name")
-                port = args.get("port")
-                
-                if namespace is None:
-                    log.warning("UNREGISTER invalid (namespace)")
-                    return json.dumps({"status": "ERROR", "message": "namespace_required"})
-                
-                if namespace is not None and not (1 <= len(namespace) <= 64):
-                    log.warning("UNREGISTER invalid (namespace:%r)", namespace)
-                    return json.dumps({"status": "ERROR", "message": "bad_namespace"})
-                
-                if port is not None:
-                    try:
-                        port = int(port)
-                        
-                        if not (1 <= port <= 65535):
-                            raise ValueError()
-                    except (ValueError, TypeError):
-                        log.warning(f"UNREGISTER invalid (port:{port})")
-                        return json.dumps({"status": "ERROR", "message": f"bad_port ({port})"})
-                    
-                removed = self.peer_db.remove_peer(client_ip, namespace, name=name, port=port)
-                
-                if not removed and ip_registered:
-                    log.info("UNREGISTER ip=%s ns=%r name=%r port=%r NOT FOUND", 
-                             client_ip, namespace, name, port)
-                    return json.dumps({"status": "ERROR", "message": "peer_credentials_do_not_match"})
-                elif not removed:
-                    log.info("UNREGISTER ip=%s ns=%r name=%r port=%r NOT FOUND", 
-                             client_ip, namespace, name, port)
-                    return json.dumps({"status": "ERROR", "message": "peer_not_registered"})
+                ttl = clamp_ttl(ttl)
+            except (ValueError, TypeError):
+                log.warning("REFRESH invalid (ttl)")
+                return {"status": "ERROR", "message": "bad_ttl"}
+
+        entries = args.get("peers")
+        if entries is None:
+            namespace = args.get("namespace")
+            name = args.get("name")
+            if not isinstance(namespace, str) or not isinstance(name, str):
+                log.warning("REFRESH invalid (namespace/name)")
+                return {"status": "ERROR", "message": "bad_request"}
+
+            peer = self.peer_db.refresh_peer(client_ip, namespace, name, ttl)
+            if peer is None:
+                log.info("REFRESH ip=%s ns=%r name=%r NOT FOUND", client_ip, namespace, name)
+                return {"status": "ERROR", "message": "peer_not_registered"}
+
+            log.info("REFRESH OK: %s ns=%s name=%s ttl=%d", client_ip, namespace, name, peer.ttl)
+            return {"status": "OK", "ttl": peer.ttl}
+
+        if not isinstance(entries, list) or not entries or len(entries) > MAX_REFRESH_BATCH:
+            log.warning("REFRESH invalid (peers)")
+            return {"status": "ERROR", "message": "bad_peers", "limit": MAX_REFRESH_BATCH}
+
+        refreshed = 0
+        missing = []
+        with self.peer_db.batch():
+            for e in entries:
+                namespace = e.get("namespace") if isinstance(e, dict) else None
+                name = e.get("name") if isinstance(e, dict) else None
+                if (isinstance(namespace, str) and isinstance(name, str)
+                        and self.peer_db.refresh_peer(client_ip, namespace, name, ttl) is not None):
+                    refreshed += 1
                 else:
-                    log.info("UNREGISTER ip=%s ns=%r name=%r port=%r OK", 
-                                client_ip, namespace, name, port)
+                    missing.append({"namespace": namespace, "name": name})
 
-                    return json.dumps({"status": "OK"})
-            
-            except Exception as e:
-                log.exception("UNREGISTER failed")
-                return json.dumps({"status": "ERROR", "message": str(e)})
+        log.info("REFRESH batch ip=%s -> %d/%d refreshed", client_ip, refreshed, len(entries))
+        return {"status": "OK", "refreshed": refreshed, "missing": missing}
 
-        log.warning("Unknown command: %s", cmd)
-        return json.dumps({"status": "ERROR", "message": "Unknown command"})    
+    def _handle_lookup(self, args, client_ip):
+        """
+        Resolve specific peers without listing their whole namespace.
+
+        By name:     {"type": "LOOKUP", "namespace": ..., "name": ...}
+        By peer ids: {"type": "LOOKUP", "peer_ids": ["name@namespace", ...]}
+        """
+        if not self._is_member(client_ip):
+            log.info("LOOKUP client should register first: %s", client_ip)
+            return {"status": "ERROR", "message": "peer_not_registered"}
+
+        now = datetime.now(timezone.utc)
+        peer_ids = args.get("peer_ids")
+
+        if peer_ids is None:
+            namespace = args.get("namespace")
+            name = args.get("name")
+            if not isinstance(namespace, str) or not namespace or len(namespace) > 64:
+                log.warning("LOOKUP invalid (namespace:%r)", namespace)
+                return {"status": "ERROR", "message": "bad_namespace"}
+            if not isinstance(name, str) or not name or len(name) > 64:
+                log.warning("LOOKUP invalid (name:%r)", name)
+                return {"status": "ERROR", "message": "bad_name"}
+
+            found = self.peer_db.lookup(namespace, name)
+            log.info("LOOKUP ns=%r name=%r -> %d record(s)", namespace, name, len(found))
+            if not found:
+                return {"status": "ERROR", "message": "peer_not_found"}
+            return {"status": "OK", "peers": [peer_to_dict(p, now) for p in found]}
+
+        if not isinstance(peer_ids, list) or not peer_ids or len(peer_ids) > MAX_LOOKUP_IDS:
+            log.warning("LOOKUP invalid (peer_ids)")
+            return {"status": "ERROR", "message": "bad_peer_ids", "limit": MAX_LOOKUP_IDS}
+
+        peer_list = []
+        missing = []
+        for peer_id in peer_ids:
+            # peer id format used by the clients: name@namespace
+            name, sep, namespace = peer_id.rpartition("@") if isinstance(peer_id, str) else ("", "", "")
+            found = self.peer_db.lookup(namespace, name) if sep else []
+            if found:
+                peer_list.extend(peer_to_dict(p, now) for p in found)
+            else:
+                missing.append(peer_id)
+
+        log.info("LOOKUP %d id(s) -> %d record(s), %d missing", len(peer_ids), len(peer_list), len(missing))
+        return {"status": "OK", "peers": peer_list, "missing": missing}
+
+    def _handle_batch(self, args, client_ip):
+        """
+        Run a list of sub-commands in order and answer them in a single response.
+
+        {"type": "BATCH", "requests": [{"type": "REGISTER", ...}, {"type": "DISCOVER", ...}]}
+
+        All sub-commands run under one registry lock acquisition and the registry
+        is marked for persistence once; each sub-command gets its own result object
+        (so one bad entry does not fail the rest).
+        """
+        requests = args.get("requests")
+        if not isinstance(requests, list) or not requests or len(requests) > MAX_BATCH:
+            log.warning("BATCH invalid (requests)")
+            return {"status": "ERROR", "message": "bad_requests", "limit": MAX_BATCH}
+
+        results = []
+        with self.peer_db.batch():
+            for sub in requests:
+                if not isinstance(sub, dict) or not isinstance(sub.get("type"), str):
+                    results.append({"status": "ERROR", "message": "missing_type"})
+                    continue
+
+                sub_cmd = sub["type"].upper()
+                if sub_cmd not in BATCH_COMMANDS:
+                    results.append({"status": "ERROR", "message": "command_not_allowed_in_batch"})
+                    continue
+
+                results.append(self.dispatch(sub_cmd, sub, client_ip))
+
+        ok = sum(1 for r in results if r.get("status") == "OK")
+        log.info("BATCH ip=%s -> %d/%d OK", client_ip, ok, len(results))
+
+        return {"status": "OK", "results": results}
+
+    def _handle_sync(self, args, client_ip):
+        """Replication exchange between federated servers (see federation.py)."""
+        if self.federation is None:
+            log.info("SYNC from %s but federation is disabled", client_ip)
+            return {"status": "ERROR", "message": "federation_disabled"}
+        return self.federation.handle_sync(args, client_ip)
+
+    def _handle_ring(self, args, client_ip):
+        """Cluster layout, so clients can route namespaces to their shard."""
+        if self.cluster is None:
+            return {"status": "ERROR", "message": "cluster_disabled"}
+        return self.cluster.ring_response()
+
+    def _handle_member(self, args, client_ip):
+        """Cross-shard "is this IP registered here?" query between cluster nodes."""
+        if self.cluster is None:
+            return {"status": "ERROR", "message": "cluster_disabled"}
+        return self.cluster.handle_member(args)
+
+    def _handle_stats(self, args, client_ip):
+        """Registry size, caps and eviction counters."""
+        return {"status": "OK", **self.peer_db.stats()}
+
+    def _handle_profile(self, args, client_ip):
+        """
+        Admin: profile the server for a while without restarting it.
+
+        {"type": "PROFILE", "mode": "cprofile" | "sample", "duration": 10, "token"?: ...}
+        Allowed from localhost, or remotely with the admin token.
+        """
+        if self.profiler is None:
+            return {"status": "ERROR", "message": "profiling_disabled"}
+        if not self.profiler.authorized(client_ip, args.get("token")):
+            log.warning("PROFILE from %s rejected: not authorized", client_ip)
+            return {"status": "ERROR", "message": "unauthorized"}
+
+        mode = args.get("mode", "sample")
+        duration = args.get("duration", 10)
+        if mode not in PROFILE_MODES:
+            return {"status": "ERROR", "message": "bad_mode", "allowed": list(PROFILE_MODES)}
+        if (isinstance(duration, bool) or not isinstance(duration, (int, float))
+                or not (0 < duration <= MAX_DURATION)):
+            return {"status": "ERROR", "message": "bad_duration", "limit": MAX_DURATION}
 
+        path = self.profiler.start(mode, float(duration))
+        if path is None:
+            return {"status": "ERROR", "message": "profile_in_progress"}
+        log.info("PROFILE %s for %ss requested by %s", mode, duration, client_ip)
+        return {"status": "OK", "mode": mode, "duration": duration, "file": path}
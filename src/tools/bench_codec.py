@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Benchmark do codec JSON compartilhado (src/common/codec.py) contra o uso
+direto de json.dumps/json.loads que existia nos caminhos quentes.
+
+Uso: python bench_codec.py [--iterations N]
+     PYP2P_JSON=json python bench_codec.py   (força o backend da stdlib)
+"""
+import argparse, json, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import codec  # noqa: E402
+
+SAMPLES = {
+    "p2p SEND": {"type": "SEND", "ttl": 1, "msg_id": "5f1c7a2e-9d5b-4c8e-8e2a-3f7d0c9b1a44",
+                 "src": "alice@CIC", "dst": "bob@CIC", "payload": "olá, tudo bem?", "require_ack": True},
+    "rdv REGISTER": {"type": "REGISTER", "namespace": "CIC", "name": "alice", "port": 4000, "ttl": 7200},
+    "rdv DISCOVER (200 peers)": {"status": "OK", "peers": [
+        {"ip": "45.171.%d.%d" % (i // 250, i % 250), "port": 4000 + i, "name": "peer%d" % i,
+         "namespace": "CIC", "ttl": 7200, "expires_in": 7000 - i} for i in range(200)]},
+}
+
+def bench(fn, arg, n):
+    t = time.perf_counter()
+    for _ in range(n):
+        fn(arg)
+    return (time.perf_counter() - t) / n * 1e6  # us/op
+
+def main():
+    ap = argparse.ArgumentParser(description="JSON codec benchmark")
+    ap.add_argument("--iterations", type=int, default=20000)
+    args = ap.parse_args()
+
+    print(f"codec backend: {codec.BACKEND}")
+    print(f"{'sample':28} {'op':7} {'stdlib us':>10} {'codec us':>10} {'speedup':>8}")
+    for name, obj in SAMPLES.items():
+        n = max(1, args.iterations // (50 if "DISCOVER" in name else 1))
+        wire = (json.dumps(obj) + "\n").encode("utf-8")
+
+        enc_old = bench(lambda o: (json.dumps(o) + "\n").encode("utf-8"), obj, n)
+        enc_new = bench(lambda o: codec.dumpb(o) + b"\n", obj, n)
+        dec_old = bench(lambda b: json.loads(b.decode("utf-8").strip()), wire, n)
+        dec_new = bench(codec.loads, wire, n)
+
+        print(f"{name:28} {'encode':7} {enc_old:10.2f} {enc_new:10.2f} {enc_old / enc_new:7.1f}x")
+        print(f"{name:28} {'decode':7} {dec_old:10.2f} {dec_new:10.2f} {dec_old / dec_new:7.1f}x")
+
+if __name__ == "__main__":
+    main()
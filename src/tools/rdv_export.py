@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Exporta o registro do servidor Rendezvous em NDJSON (um peer por linha),
+usando o DISCOVER em modo streaming: a memória usada é constante,
+independentemente do número de peers registrados.
+"""
+import argparse, json, socket, sys
+
+def export(host: str, port: int, out, namespace=None, timeout: float = 10.0) -> int:
+    cmd = {"type": "DISCOVER", "stream": True}
+    if namespace:
+        cmd["namespace"] = namespace
+
+    count = 0
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall((json.dumps(cmd) + "\n").encode("utf-8"))
+        f = sock.makefile("rb")
+        for raw in f:
+            line = raw.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if "status" in obj:
+                if obj.get("status") != "OK":
+                    raise RuntimeError(f"server error: {obj}")
+                return count
+            out.write(line.decode("utf-8") + "\n")
+            count += 1
+    raise RuntimeError("stream ended without terminator")
+
+def main():
+    ap = argparse.ArgumentParser(description="Rendezvous registry exporter (NDJSON)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--namespace", default=None, help="Export only this namespace")
+    ap.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    args = ap.parse_args()
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        n = export(args.host, args.port, out, args.namespace)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Exported {n} peer(s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
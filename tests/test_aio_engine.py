@@ -0,0 +1,179 @@
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from aio_engine import (MAX_LINE_SIZE, AsyncEngine, AsyncPeerConnection, AsyncPeerServer,  # noqa: E402
+                        PeerRefused, StreamLink)
+from common import codec  # noqa: E402
+from models import PROTOCOL_FEATURES, Message, MessageType, PeerStatus  # noqa: E402
+from peer_connection import PeerConnection, PeerServer  # noqa: E402
+from peer_table import PeerTable  # noqa: E402
+
+
+def free_port():
+    with socket.create_server(("127.0.0.1", 0)) as s:
+        return s.getsockname()[1]
+
+
+def hello(src="x@N"):
+    return Message(MessageType.HELLO, "h", src=src, version="1.0", features=PROTOCOL_FEATURES)
+
+
+def frame(payload):
+    return codec.dumpb(Message(MessageType.SEND, "m", src="x@N", dst="me@N", payload=payload).to_dict()) + b"\n"
+
+
+class ReceiveLoopTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = AsyncEngine()
+        self.engine.start()
+        self.addCleanup(self.engine.stop)
+        self.listener = socket.create_server(("127.0.0.1", 0))
+        self.addCleanup(self.listener.close)
+
+    def receive(self, data, pace=0.0):
+        """Envia `data` por uma conexão e devolve os payloads recebidos até ela fechar"""
+        port = self.listener.getsockname()[1]
+        reader, writer = self.engine.run(asyncio.open_connection("127.0.0.1", port, limit=MAX_LINE_SIZE), 5)
+        sock, _ = self.listener.accept()
+        received = []
+        closed = threading.Event()
+        conn = AsyncPeerConnection("x@N", StreamLink(self.engine, reader, writer), "outbound",
+                                   lambda _peer, msg: received.append(msg.payload),
+                                   lambda _peer: closed.set())
+        conn.start()
+        with sock:
+            for i in range(0, len(data), 8192):
+                sock.sendall(data[i:i + 8192])
+                time.sleep(pace)  # o leitor vê a linha longa aos pedaços
+            sock.shutdown(socket.SHUT_WR)
+            self.assertTrue(closed.wait(5))
+        return received
+
+    def test_line_too_long_is_discarded_up_to_the_next_newline(self):
+        # a cauda da linha longa parece um quadro válido: não pode ser entregue
+        data = frame("first") + b"x" * (MAX_LINE_SIZE * 2 + 5000) + frame("tail") + frame("last")
+        with self.assertLogs("aio_engine", "ERROR") as logs:
+            received = self.receive(data, pace=0.01)
+        self.assertEqual(received, ["first", "last"])
+        self.assertEqual([r.getMessage() for r in logs.records], ["Line too long from x@N"])
+
+    def test_unterminated_long_line_closes_cleanly(self):
+        received = self.receive(frame("first") + b"x" * (MAX_LINE_SIZE * 3))
+        self.assertEqual(received, ["first"])
+
+    def test_last_line_without_newline_is_delivered(self):
+        self.assertEqual(self.receive(frame("a") + frame("b").rstrip(b"\n")), ["a", "b"])
+
+
+class HandshakeTest(unittest.TestCase):
+    def setUp(self):
+        self.engine = AsyncEngine()
+        self.engine.start()
+        self.addCleanup(self.engine.stop)
+        self.port = free_port()
+        self.inbound = []
+
+    def on_connection(self, peer_id, link, _framer, features):
+        self.inbound.append((peer_id, link, features))
+
+    def test_hello_handshake(self):
+        server = AsyncPeerServer(self.engine, self.port, "me@N", self.on_connection)
+        self.assertTrue(server.start())
+        self.addCleanup(server.stop)
+        link = self.engine.connect("me@N", "127.0.0.1", self.port, hello())
+        self.addCleanup(link.close)
+        self.assertEqual(link.features, PROTOCOL_FEATURES)
+        deadline = time.monotonic() + 2
+        while not self.inbound and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([(p, f) for p, _, f in self.inbound], [("x@N", PROTOCOL_FEATURES)])
+
+    def test_refused_peer(self):
+        server = AsyncPeerServer(self.engine, self.port, "me@N", self.on_connection, accept=lambda _p: False)
+        server.start()
+        self.addCleanup(server.stop)
+        with self.assertRaises(PeerRefused):
+            self.engine.connect("me@N", "127.0.0.1", self.port, hello())
+        self.assertEqual(self.inbound, [])
+
+    def test_talks_to_the_threaded_engine(self):
+        # servidor do motor de threads, cliente asyncio: mesmo protocolo
+        received = []
+        server = PeerServer(self.port, "me@N", lambda p, sock, framer, f: self.inbound.append(
+            PeerConnection(p, sock, "inbound", lambda _p, m: received.append(m.payload), lambda _p: None,
+                           framer=framer)))
+        server.start()
+        self.addCleanup(server.stop)
+        link = self.engine.connect("me@N", "127.0.0.1", self.port, hello())
+        conn = AsyncPeerConnection("me@N", link, "outbound", lambda _p, _m: None, lambda _p: None)
+        conn.start()
+        self.addCleanup(conn.stop)
+        deadline = time.monotonic() + 2
+        while not self.inbound and time.monotonic() < deadline:
+            time.sleep(0.01)
+        inbound = self.inbound[0]
+        inbound.start()
+        self.addCleanup(inbound.stop)
+        for i in range(3):
+            conn.send_message(Message(MessageType.SEND, f"m{i}", src="x@N", dst="me@N", payload=str(i)))
+        while len(received) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(received, ["0", "1", "2"])
+
+    def test_periodic_tasks(self):
+        ticks = []
+        self.engine.every(0.02, lambda: ticks.append(self.engine.in_loop()), "tick", initial=True)
+        self.engine.every(0.02, lambda: ticks.append(self.engine.in_loop()), "blocking", blocking=True)
+        time.sleep(0.2)
+        self.assertIn(True, ticks)   # no loop
+        self.assertIn(False, ticks)  # no pool de threads
+
+
+class ReconnectRoundTest(unittest.TestCase):
+    def test_connects_outside_the_table_lock(self):
+        table = None
+        lock_free = []
+
+        def try_lock():
+            if table.lock.acquire(timeout=1):
+                table.lock.release()
+                lock_free.append(True)
+            else:
+                lock_free.append(False)
+
+        def connect(peer):
+            # outra thread (callback do loop) precisa do lock durante a conexão
+            t = threading.Thread(target=try_lock)
+            t.start()
+            t.join()
+            return peer.name == "up"
+
+        table = PeerTable(3, 1, 10, connect)
+        table.running = True
+        for name in ("up", "down"):
+            table.upsert_peer({"name": name, "namespace": "N", "ip": "127.0.0.1", "port": 1})
+        table.reconnect_round()
+        self.assertEqual(lock_free, [True, True])
+        self.assertEqual(table.get_peer("up@N").status, PeerStatus.CONNECTING)  # o pai marca conectado
+        self.assertEqual(table.get_peer("down@N").status, PeerStatus.DISCONNECTED)
+
+    def test_gives_up_after_max_attempts(self):
+        table = PeerTable(2, 1, 10, lambda _peer: False)
+        table.running = True
+        table.upsert_peer({"name": "down", "namespace": "N", "ip": "127.0.0.1", "port": 1})
+        for _ in range(3):
+            table.reconnect_round()
+        peer = table.get_peer("down@N")
+        self.assertEqual((peer.status, peer.reconnect_attempts), (PeerStatus.STALE, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from common import codec  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from request_handler import MAX_BATCH, RequestHandler, dumps  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+IP = "10.0.0.1"
+
+
+def register(name, namespace="UnB", port=4000):
+    return {"type": "REGISTER", "namespace": namespace, "name": name, "port": port}
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = PeerDatabase(os.path.join(tmp.name, "peers.json"))
+        self.addCleanup(self.db.close)
+        self.handler = RequestHandler(self.db)
+
+    def batch(self, requests):
+        # serializado e lido de volta, como o cliente recebe
+        return codec.loads(dumps(self.handler.dispatch("BATCH", {"requests": requests}, IP)))
+
+    def test_results_follow_request_order(self):
+        reply = self.batch([register("a"), register("b", namespace="CIC"),
+                            {"type": "discover", "namespace": "UnB"}])
+        self.assertEqual(reply["status"], "OK")
+        a, b, discover = reply["results"]
+        self.assertEqual((a["status"], b["status"]), ("OK", "OK"))
+        # o DISCOVER já enxerga os REGISTER anteriores do mesmo lote
+        self.assertEqual([p["name"] for p in discover["peers"]], ["a"])
+
+    def test_one_bad_entry_does_not_fail_the_rest(self):
+        reply = self.batch([register("a"), register("b", port=0), "junk", {"type": "SYNC"},
+                            {"type": "UNREGISTER", "namespace": "UnB", "name": "a"}])
+        self.assertEqual([r["status"] for r in reply["results"]], ["OK", "ERROR", "ERROR", "ERROR", "OK"])
+        self.assertEqual(reply["results"][1]["message"], "bad_port")
+        self.assertEqual(reply["results"][2]["message"], "missing_type")
+        self.assertEqual(reply["results"][3]["message"], "command_not_allowed_in_batch")
+        self.assertEqual(self.db.get_all_db(), [])
+
+    def test_batches_are_bounded(self):
+        self.assertEqual(self.batch([])["message"], "bad_requests")
+        self.assertEqual(self.batch([register(f"p{i}") for i in range(MAX_BATCH + 1)])["message"],
+                         "bad_requests")
+        self.assertEqual(len(self.batch([register(f"p{i}") for i in range(MAX_BATCH)])["results"]), MAX_BATCH)
+
+    def test_registry_is_marked_dirty_once_at_the_end(self):
+        with self.db.batch():
+            self.batch([register("a"), register("b")])
+            self.assertFalse(self.db._dirty)  # lote externo ainda aberto
+        self.assertTrue(self.db._dirty)
+        self.assertTrue(self.db.flush())
+        self.assertFalse(self.db.flush())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+import cluster  # noqa: E402
+from cluster import Cluster  # noqa: E402
+from common import codec  # noqa: E402
+from common.hashring import HashRing  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from rendezvous import RendezvousServer  # noqa: E402
+from rendezvous_connection import RendezvousConnection  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+NODES = ["127.0.0.1:9001", "127.0.0.1:9002", "127.0.0.1:9003", "127.0.0.1:9004"]
+KEYS = [f"namespace-{i}" for i in range(10000)]
+
+
+def free_port():
+    with socket.create_server(("127.0.0.1", 0)) as s:
+        return s.getsockname()[1]
+
+
+class HashRingTest(unittest.TestCase):
+    def test_owner_is_stable_across_processes_and_node_order(self):
+        ring = HashRing(NODES)
+        self.assertEqual(HashRing(reversed(NODES)).owner("UnB"), ring.owner("UnB"))
+        code = ("import sys; sys.path.insert(0, sys.argv[1]); from common.hashring import HashRing; "
+                "print(HashRing(sys.argv[2].split(',')).owner('UnB'))")
+        src = os.path.join(os.path.dirname(__file__), "..", "src")
+        env = dict(os.environ, PYTHONHASHSEED="12345")
+        out = subprocess.run([sys.executable, "-c", code, src, ",".join(NODES)],
+                             env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), ring.owner("UnB"))
+
+    def test_keys_spread_over_every_node(self):
+        ring = HashRing(NODES)
+        counts = {node: 0 for node in NODES}
+        for key in KEYS:
+            counts[ring.owner(key)] += 1
+        for node, count in counts.items():
+            self.assertGreater(count, len(KEYS) / len(NODES) * 0.6, node)
+            self.assertLess(count, len(KEYS) / len(NODES) * 1.4, node)
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        before = HashRing(NODES)
+        after = HashRing(NODES + ["127.0.0.1:9005"])
+        moved = [k for k in KEYS if before.owner(k) != after.owner(k)]
+        self.assertTrue(all(after.owner(k) == "127.0.0.1:9005" for k in moved))
+        self.assertLess(len(moved), len(KEYS) * 0.3)
+
+    def test_round_trip_through_the_ring_command(self):
+        ring = HashRing(NODES, vnodes=16)
+        copy = HashRing.from_dict(codec.loads(codec.dumpb(ring.to_dict())))
+        self.assertEqual([copy.owner(k) for k in KEYS[:500]], [ring.owner(k) for k in KEYS[:500]])
+        self.assertRaises(ValueError, HashRing, [])
+
+
+class RedirectTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        ports = [free_port(), free_port()]
+        self.nodes = [f"127.0.0.1:{p}" for p in ports]
+        self.servers = []
+        for i, port in enumerate(ports):
+            server = RendezvousServer("127.0.0.1", port, db_file=os.path.join(tmp.name, f"{i}.json"),
+                                      cluster_nodes=self.nodes, cluster_self=self.nodes[i],
+                                      cluster_secret="s3")
+            thread = threading.Thread(target=server.start, kwargs={"accept_poll": 0.05}, daemon=True)
+            thread.start()
+            self.addCleanup(thread.join, 5)
+            self.addCleanup(server.stop)
+            self.servers.append(server)
+        self.ring = HashRing(self.nodes)
+        # um namespace de cada shard
+        self.namespaces = {self.ring.owner(k): k for k in KEYS}
+
+    def test_redirect_for_sharded_commands_only(self):
+        c = self.servers[0].cluster
+        remote = self.namespaces[self.nodes[1]]
+        self.assertEqual(c.redirect_for("REGISTER", {"namespace": remote}),
+                         {"status": "REDIRECT", "namespace": remote, "owner": self.nodes[1]})
+        self.assertIsNone(c.redirect_for("REGISTER", {"namespace": self.namespaces[self.nodes[0]]}))
+        self.assertIsNone(c.redirect_for("STATS", {"namespace": remote}))
+        self.assertIsNone(c.redirect_for("DISCOVER", {}))
+
+    def test_client_follows_the_redirect_and_learns_the_ring(self):
+        host, port = self.nodes[0].split(":")
+        conn = RendezvousConnection(host, int(port), hedge=False)
+        deadline = time.monotonic() + 2
+        while conn.load_ring() is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        conn.ring = None  # anel desconhecido: o primeiro REGISTER recebe REDIRECT
+
+        remote = self.namespaces[self.nodes[1]]
+        self.assertEqual(conn.register(remote, "alice", 4000)["status"], "OK")
+        self.assertEqual(conn.ring.nodes, sorted(self.nodes))
+        self.assertEqual([p.name for p in self.servers[1].peer_db.get_peers(remote)], ["alice"])
+        self.assertEqual(self.servers[0].peer_db.get_all_db(), [])
+
+        # DISCOVER sem namespace junta os dois shards
+        self.assertEqual(conn.register(self.namespaces[self.nodes[0]], "bob", 4001)["status"], "OK")
+        self.assertEqual(sorted(p["name"] for p in conn.discover()), ["alice", "bob"])
+
+
+class ClusterMemberTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = PeerDatabase(os.path.join(tmp.name, "peers.json"))
+        self.addCleanup(self.db.close)
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def cluster(self, secret="s3", delay=0.0, registered_on=()):
+        c = Cluster(self.db, NODES, NODES[0], secret=secret, timeout=1.0)
+
+        def request(node, obj):
+            with self.lock:
+                self.queries.append((node, obj["ip"]))
+            time.sleep(delay)
+            return {"status": "OK", "registered": node in registered_on}
+
+        c._request = request
+        return c
+
+    def test_member_requires_the_secret(self):
+        self.assertEqual(self.cluster(secret=None).handle_member({"ip": "1.2.3.4"})["message"], "unauthorized")
+        c = self.cluster()
+        self.assertEqual(c.handle_member({"ip": "1.2.3.4"})["message"], "unauthorized")
+        self.assertEqual(c.handle_member({"ip": "1.2.3.4", "secret": "x"})["message"], "unauthorized")
+        self.assertEqual(c.handle_member({"ip": "1.2.3.4", "secret": "s3"}),
+                         {"status": "OK", "registered": False})
+
+    def test_no_fan_out_without_a_secret(self):
+        c = self.cluster(secret=None)
+        self.assertFalse(c.is_member("1.2.3.4"))
+        self.assertEqual(self.queries, [])
+
+    def test_shards_are_queried_in_parallel(self):
+        c = self.cluster(delay=0.3)
+        start = time.monotonic()
+        self.assertFalse(c.is_member("1.2.3.4"))
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(sorted(n for n, _ in self.queries), NODES[1:])
+
+    def test_positive_answer_from_any_shard(self):
+        c = self.cluster(registered_on=(NODES[2],))
+        self.assertTrue(c.is_member("1.2.3.4"))
+
+    def test_negative_answers_are_cached(self):
+        c = self.cluster()
+        for _ in range(20):
+            self.assertFalse(c.is_member("1.2.3.4"))
+        self.assertEqual(len(self.queries), len(NODES) - 1)
+        self.assertGreaterEqual(cluster.MEMBER_NEG_TTL, 10)
+
+    def test_concurrent_lookups_of_one_ip_share_a_fan_out(self):
+        c = self.cluster(delay=0.2, registered_on=(NODES[3],))
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(c.is_member("1.2.3.4")))
+                   for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(results, [True] * 10)
+        self.assertLessEqual(len(self.queries), len(NODES) - 1)
+
+    def test_pending_lookups_are_capped(self):
+        c = self.cluster(delay=0.3)
+        threads = [threading.Thread(target=c.is_member, args=(f"10.0.0.{i}",))
+                   for i in range(cluster.MEMBER_MAX_PENDING + 8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        ips = {ip for _, ip in self.queries}
+        self.assertEqual(len(ips), cluster.MEMBER_MAX_PENDING)
+
+
+class RateLimitTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.server = RendezvousServer(port=9001, db_file=os.path.join(tmp.name, "peers.json"),
+                                       max_attempts=3, cluster_nodes=NODES[:2], cluster_self=NODES[0],
+                                       cluster_secret="s3")
+        self.addCleanup(self.server.peer_db.close)
+
+    def send(self, request, ip="127.0.0.1"):
+        ours, theirs = socket.socketpair()
+        with ours:
+            ours.sendall(codec.dumpb(request) + b"\n")
+            self.server.handle_client(theirs, (ip, 50000))
+            return codec.loads(ours.makefile("rb").readline())
+
+    def test_authenticated_member_traffic_is_not_rate_limited(self):
+        for _ in range(10):
+            resp = self.send({"type": "MEMBER", "ip": "1.2.3.4", "secret": "s3"})
+            self.assertEqual(resp["status"], "OK")
+
+    def test_unauthenticated_traffic_from_a_node_ip_is_rate_limited(self):
+        for _ in range(3):
+            self.assertEqual(self.send({"type": "MEMBER", "ip": "1.2.3.4"})["message"], "unauthorized")
+        self.assertNotIn("127.0.0.1", self.server.blocked_ips)
+        ours, theirs = socket.socketpair()
+        with ours:
+            self.server.handle_client(theirs, ("127.0.0.1", 50000))
+        self.assertIn("127.0.0.1", self.server.blocked_ips)
+
+
+if __name__ == "__main__":
+    unittest.main()
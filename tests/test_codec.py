@@ -0,0 +1,66 @@
+import os
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from common import codec  # noqa: E402
+
+SAMPLE = {"type": "PUB", "dst": "#UnB", "payload": "olá \"mundo\"\n🛰️", "ttl": 1, "ok": True,
+          "sack": [[1, 2], [5, 9]], "none": None, "ratio": 0.5}
+
+
+def backends():
+    """Backends disponíveis neste ambiente (json sempre)"""
+    found = {}
+    for name in ("json", "orjson", "ujson"):
+        backend = codec._load_backend(name)
+        if backend[0] == name:
+            found[name] = backend[1:]
+    return found
+
+
+class CodecTest(unittest.TestCase):
+    def test_round_trip_on_every_backend(self):
+        for name, (dumps, dumpb, loads) in backends().items():
+            with self.subTest(backend=name):
+                text = dumps(SAMPLE)
+                self.assertIsInstance(text, str)
+                self.assertIsInstance(dumpb(SAMPLE), bytes)
+                self.assertEqual(dumpb(SAMPLE), text.encode("utf-8"))
+                self.assertEqual(loads(text), SAMPLE)
+                self.assertEqual(loads(dumpb(SAMPLE)), SAMPLE)
+                self.assertEqual(loads(dumpb(SAMPLE) + b"\n"), SAMPLE)  # linha do socket
+
+    def test_backends_agree_on_the_wire_format(self):
+        std = codec._std_dumps(SAMPLE)
+        self.assertNotIn(", ", std)
+        self.assertNotIn("\\u00e1", std)  # UTF-8 direto, sem escapes ASCII
+        for name, (dumps, _dumpb, _loads) in backends().items():
+            with self.subTest(backend=name):
+                self.assertEqual(dumps(SAMPLE), std)
+
+    def test_invalid_input_raises_decode_error(self):
+        for name, (_dumps, _dumpb, loads) in backends().items():
+            for bad in (b"", b"{", b"not json", b'{"a":1}x', b"\xff\xfe"):
+                with self.subTest(backend=name, data=bad), self.assertRaises(codec.DecodeError):
+                    loads(bad)
+
+    def test_integers_beyond_64_bits(self):
+        # orjson só codifica inteiros de 64 bits; dumpb recorre à biblioteca padrão
+        for name, (_dumps, dumpb, loads) in backends().items():
+            if name == "ujson":
+                continue
+            with self.subTest(backend=name):
+                self.assertEqual(loads(dumpb({"n": 2 ** 70})), {"n": 2 ** 70})
+
+    def test_backend_can_be_forced(self):
+        code = "from common import codec; print(codec.BACKEND)"
+        env = dict(os.environ, PYP2P_JSON="json", PYTHONPATH=os.path.join(os.path.dirname(__file__), "..", "src"))
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "json")
+
+
+if __name__ == "__main__":
+    unittest.main()
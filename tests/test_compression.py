@@ -0,0 +1,80 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from common import codec  # noqa: E402
+from models import PeerRecord  # noqa: E402
+from protocol_parser import Request  # noqa: E402
+from rendezvous import RendezvousServer  # noqa: E402
+from rendezvous_connection import RendezvousConnection  # noqa: E402
+from request_handler import COMPRESS_THRESHOLD  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+CALLER = "127.0.0.1"
+
+
+def free_port():
+    with socket.create_server(("127.0.0.1", 0)) as s:
+        return s.getsockname()[1]
+
+
+class CompressionTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.port = free_port()
+        self.server = RendezvousServer("127.0.0.1", self.port, db_file=os.path.join(tmp.name, "peers.json"))
+        with self.server.peer_db.batch():
+            for i in range(200):
+                self.server.peer_db.add_peer(
+                    PeerRecord(CALLER, 4000 + i, f"peer-{i}", "UnB", 3600, datetime.now(timezone.utc)))
+
+    def handle(self, **args):
+        return self.server.handler.handle(Request(args.get("type", "DISCOVER"), args), CALLER)
+
+    def test_large_response_is_compressed_on_request(self):
+        plain = self.handle(namespace="UnB")
+        packed = self.handle(namespace="UnB", compress="zlib")
+        self.assertLess(len(packed), len(plain) / 3)
+        reply = codec.loads(packed)
+        self.assertEqual(reply["status"], "OK")  # status continua legível
+        self.assertEqual(reply["encoding"], "zlib+base64")
+        self.assertEqual(RendezvousConnection._decode_response(reply), codec.loads(plain))
+
+    def test_small_or_unrequested_responses_stay_plain(self):
+        small = self.handle(namespace="UnB", limit=1, compress="zlib")
+        self.assertLess(len(small), COMPRESS_THRESHOLD)
+        self.assertNotIn("encoding", codec.loads(small))
+        self.assertNotIn("encoding", codec.loads(self.handle(namespace="UnB")))
+        self.assertNotIn("encoding", codec.loads(self.handle(namespace="UnB", compress="gzip")))
+
+    def test_client_negotiates_and_decodes(self):
+        thread = threading.Thread(target=self.server.start, kwargs={"accept_poll": 0.05}, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(self.server.stop)
+
+        conn = RendezvousConnection("127.0.0.1", self.port, compress=True, hedge=False)
+        deadline = time.monotonic() + 2
+        peers = []
+        while not peers and time.monotonic() < deadline:
+            peers = conn.discover("UnB")
+        self.assertEqual(len(peers), 200)
+        self.assertEqual(peers[0]["namespace"], "UnB")
+
+
+if __name__ == "__main__":
+    unittest.main()
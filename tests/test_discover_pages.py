@@ -0,0 +1,89 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from common import codec  # noqa: E402
+from models import PeerRecord  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from protocol_parser import Request  # noqa: E402
+from request_handler import MAX_PAGE, RequestHandler, encode_cursor  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+CALLER = "10.0.0.1"
+
+
+class DiscoverPagesTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = PeerDatabase(os.path.join(tmp.name, "peers.json"))
+        self.addCleanup(self.db.close)
+        self.handler = RequestHandler(self.db)
+        for i in range(25):
+            self.add(f"u{i:02d}", "UnB")
+        for i in range(5):
+            self.add(f"c{i}", "CIC")
+
+    def add(self, name, namespace):
+        self.db.add_peer(PeerRecord(CALLER, 4000, name, namespace, 3600, datetime.now(timezone.utc)))
+
+    def discover(self, **args):
+        return codec.loads(self.handler.handle(Request("DISCOVER", args), CALLER))
+
+    def walk(self, **args):
+        names = []
+        while True:
+            reply = self.discover(**args)
+            self.assertEqual(reply["status"], "OK")
+            names += [p["name"] for p in reply["peers"]]
+            if "next_cursor" not in reply:
+                return names
+            args["cursor"] = reply["next_cursor"]
+
+    def test_pages_cover_the_namespace_once(self):
+        reply = self.discover(namespace="UnB", limit=10)
+        self.assertEqual(len(reply["peers"]), 10)
+        self.assertIn("next_cursor", reply)
+        self.assertEqual(self.walk(namespace="UnB", limit=10), [f"u{i:02d}" for i in range(25)])
+        self.assertNotIn("next_cursor", self.discover(namespace="UnB", limit=25))
+
+    def test_pages_across_all_namespaces(self):
+        names = self.walk(limit=7)
+        self.assertEqual(len(names), 30)
+        self.assertEqual(len(set(names)), 30)
+
+    def test_cursor_survives_changes_between_pages(self):
+        reply = self.discover(namespace="UnB", limit=10)
+        self.db.remove_peer(CALLER, "UnB", name="u10")  # o próximo da página seguinte
+        self.add("u05b", "UnB")                          # antes do cursor: não aparece
+        self.add("u99", "UnB")                           # depois: aparece
+        rest = self.walk(namespace="UnB", limit=10, cursor=reply["next_cursor"])
+        self.assertEqual(rest, [f"u{i:02d}" for i in range(11, 25)] + ["u99"])
+
+    def test_projection(self):
+        reply = self.discover(namespace="CIC", fields=["name", "port"])
+        self.assertEqual(reply["peers"], [{"name": f"c{i}", "port": 4000} for i in range(5)])
+
+    def test_bad_arguments(self):
+        self.assertEqual(self.discover(limit=0)["message"], "bad_limit")
+        self.assertEqual(self.discover(limit=MAX_PAGE + 1)["message"], "bad_limit")
+        self.assertEqual(self.discover(limit=True)["message"], "bad_limit")
+        self.assertEqual(self.discover(cursor="!!")["message"], "bad_cursor")
+        # cursor de outro namespace
+        cursor = encode_cursor(("CIC", "c0", CALLER))
+        self.assertEqual(self.discover(namespace="UnB", cursor=cursor)["message"], "bad_cursor")
+        self.assertEqual(self.discover(fields=["password"])["message"], "bad_fields")
+        self.assertEqual(self.discover(fields=[])["message"], "bad_fields")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from common import codec  # noqa: E402
+from models import PeerRecord  # noqa: E402
+from protocol_parser import Request  # noqa: E402
+from rendezvous import RendezvousServer  # noqa: E402
+from request_handler import STREAM_PAGE, StreamingResponse  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+CALLER = "10.0.0.1"
+
+
+class DiscoverStreamTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.server = RendezvousServer(port=0, db_file=os.path.join(tmp.name, "peers.json"))
+        self.addCleanup(self.server.peer_db.close)
+        self.db = self.server.peer_db
+        self.count = STREAM_PAGE * 2 + 10  # várias páginas do registro
+        with self.db.batch():
+            for i in range(self.count):
+                self.db.add_peer(PeerRecord(CALLER, 4000, f"p{i:04d}", "UnB", 3600, datetime.now(timezone.utc)))
+
+    def request(self, obj, ip=CALLER):
+        """Requisição por um socket, com o servidor escrevendo em outra thread"""
+        ours, theirs = socket.socketpair()
+        with ours:
+            ours.sendall(codec.dumpb(obj) + b"\n")
+            worker = threading.Thread(target=self.server.handle_client, args=(theirs, (ip, 50000)))
+            worker.start()
+            lines = [codec.loads(line) for line in ours.makefile("rb")]
+            worker.join(timeout=5)
+        return lines
+
+    def test_one_peer_per_line_and_a_terminator(self):
+        lines = self.request({"type": "DISCOVER", "namespace": "UnB", "stream": True})
+        peers, end = lines[:-1], lines[-1]
+        self.assertEqual(end, {"status": "OK", "end": True, "count": self.count})
+        self.assertEqual([p["name"] for p in peers], [f"p{i:04d}" for i in range(self.count)])
+        self.assertEqual(set(peers[0]), {"ip", "port", "name", "namespace", "ttl", "expires_in"})
+
+    def test_fields_and_cursor_apply(self):
+        first = self.server.handler.handle(
+            Request("DISCOVER", {"type": "DISCOVER", "namespace": "UnB", "limit": 5}), CALLER)
+        cursor = codec.loads(first)["next_cursor"]
+        lines = self.request({"type": "DISCOVER", "namespace": "UnB", "stream": True,
+                              "cursor": cursor, "fields": ["name"]})
+        self.assertEqual(lines[0], {"name": "p0005"})
+        self.assertEqual(lines[-1]["count"], self.count - 5)
+
+    def test_errors_are_a_single_line(self):
+        lines = self.request({"type": "DISCOVER", "stream": True}, ip="10.9.9.9")
+        self.assertEqual(lines, [{"status": "ERROR", "message": "peer_not_registered"}])
+
+    def test_response_is_generated_lazily(self):
+        response = self.server.handler.handle(Request("DISCOVER", {"stream": True}), CALLER)
+        self.assertIsInstance(response, StreamingResponse)
+        lines = iter(response)
+        next(lines)
+        # registro alterado no meio do stream: páginas seguintes já veem a mudança
+        self.db.add_peer(PeerRecord(CALLER, 4000, "zzz", "UnB", 3600, datetime.now(timezone.utc)))
+        rest = [codec.loads(line) for line in lines]
+        self.assertEqual(rest[-2]["name"], "zzz")
+        self.assertEqual(rest[-1]["count"], self.count + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
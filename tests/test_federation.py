@@ -0,0 +1,199 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+import uuid
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from common import codec  # noqa: E402
+from federation import MAX_CLOCK_SKEW, Federation  # noqa: E402
+from models import PeerRecord  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from rendezvous import MAX_LINE  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+
+class FederationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.db = PeerDatabase(os.path.join(self.tmp.name, "peers.json"), node_id="a1")
+        self.addCleanup(self.db.close)
+
+    def entry(self, name="alice", version=None, deleted=False):
+        now = time.time()
+        entry = {"ip": "10.0.0.5", "port": 4000, "name": name, "namespace": "UnB",
+                 "ttl": 7200, "timestamp": now, "version": version or now, "origin": "b2"}
+        if deleted:
+            entry["deleted"] = True
+        return entry
+
+    def sync(self, federation, client_ip, changes, secret=None):
+        args = {"node": "b2", "incarnation": str(uuid.uuid4()), "since": 0, "changes": changes}
+        if secret is not None:
+            args["secret"] = secret
+        return federation.handle_sync(args, client_ip)
+
+    def test_without_secret_only_configured_peers_may_sync(self):
+        federation = Federation(self.db, [("127.0.0.1", 8082)])
+        resp = self.sync(federation, "203.0.113.7", [self.entry()])
+        self.assertEqual(resp, {"status": "ERROR", "message": "unauthorized"})
+        self.assertEqual(self.db.lookup("UnB", "alice"), [])
+
+        resp = self.sync(federation, "127.0.0.1", [self.entry()])
+        self.assertEqual(resp["status"], "OK")
+        self.assertEqual(resp["applied"], 1)
+
+    def test_secret_is_required_when_configured(self):
+        federation = Federation(self.db, [("127.0.0.1", 8082)], secret="s3")
+        self.assertEqual(self.sync(federation, "127.0.0.1", [self.entry()])["message"], "unauthorized")
+        self.assertEqual(self.sync(federation, "127.0.0.1", [self.entry()], secret="x")["message"],
+                         "unauthorized")
+        self.assertEqual(self.sync(federation, "203.0.113.7", [self.entry()], secret="s3")["applied"], 1)
+
+    def test_entries_from_the_future_are_dropped(self):
+        federation = Federation(self.db, [("127.0.0.1", 8082)])
+        future = time.time() + MAX_CLOCK_SKEW + 3600
+        resp = self.sync(federation, "127.0.0.1", [self.entry(version=future),
+                                                   self.entry("bob", version=future, deleted=True),
+                                                   self.entry("carol")])
+        self.assertEqual(resp["applied"], 1)
+        self.assertEqual(self.db.lookup("UnB", "alice"), [])
+        self.assertEqual(len(self.db.lookup("UnB", "carol")), 1)
+
+    def test_push_batches_fit_the_line_limit_with_worst_case_entries(self):
+        # 64 caracteres, mas até 6 bytes cada depois do escape JSON
+        for i in range(300):
+            name = (f"{i:03d}" + "\u0001\"é😀" * 16)[:64]
+            namespace = ("\u0002\\" * 32)[:64]
+            self.db.add_peer(PeerRecord(f"10.0.{i // 250}.{i % 250}", 4000, name, namespace, 7200,
+                                        datetime.now(timezone.utc)))
+
+        other = PeerDatabase(os.path.join(self.tmp.name, "other.json"), node_id="b2")
+        self.addCleanup(other.close)
+        remote = Federation(other, [("127.0.0.1", 8081)])
+        federation = Federation(self.db, [("127.0.0.1", 8082)])
+        lines = []
+
+        def request(_addr, obj):
+            line = codec.dumpb(obj) + b"\n"
+            lines.append(len(line))
+            if len(line) > MAX_LINE:
+                return {"status": "ERROR", "message": "line_too_long"}
+            return remote.handle_sync(obj, "127.0.0.1")
+
+        federation._request = request
+        federation.sync_peer(("127.0.0.1", 8082))
+
+        self.assertGreater(len(lines), 1)
+        self.assertLessEqual(max(lines), MAX_LINE)
+        self.assertEqual(len(other.get_all_db()), 300)
+
+
+class ReplicationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def db(self, node_id):
+        db = PeerDatabase(os.path.join(self.tmp.name, f"{node_id}.json"), node_id=node_id)
+        self.addCleanup(db.close)
+        return db
+
+    def link(self, local, remote, remote_addr=("127.0.0.1", 8082)):
+        """Federation de `local` falando com `remote` sem rede"""
+        federation = Federation(local, [remote_addr])
+        server = Federation(remote, [("127.0.0.1", 8081)])
+        federation._request = lambda _addr, obj: server.handle_sync(obj, "127.0.0.1")
+        return federation, remote_addr
+
+    def add(self, db, name, ip="10.0.0.1", port=4000):
+        db.add_peer(PeerRecord(ip, port, name, "UnB", 7200, datetime.now(timezone.utc)))
+
+    def names(self, db):
+        return sorted(p.name for p in db.get_peers())
+
+    def test_change_feed_cursor_and_origin_filter(self):
+        a = self.db("a1")
+        for name in ("x", "y", "z"):
+            self.add(a, name)
+        entries, seq, more = a.changes_since(0, limit=2)
+        self.assertEqual([e["name"] for e in entries], ["x", "y"])
+        self.assertTrue(more)
+        self.add(a, "x", port=5000)  # x volta ao fim do feed
+        entries, _, more = a.changes_since(seq)
+        self.assertEqual([(e["name"], e["port"]) for e in entries], [("z", 4000), ("x", 5000)])
+        self.assertFalse(more)
+        self.assertEqual(a.changes_since(0, skip_origin="a1")[0], [])
+
+    def test_push_pull_converges_including_deletions(self):
+        a, b = self.db("a1"), self.db("b2")
+        self.add(a, "alice")
+        self.add(a, "bob")
+        self.add(b, "carol", ip="10.0.0.2")
+        federation, addr = self.link(a, b)
+        federation.sync_peer(addr)
+        self.assertEqual(self.names(a), ["alice", "bob", "carol"])
+        self.assertEqual(self.names(b), ["alice", "bob", "carol"])
+
+        a.remove_peer("10.0.0.1", "UnB", name="bob")
+        federation.sync_peer(addr)
+        self.assertEqual(self.names(b), ["alice", "carol"])
+        entries, _, _ = b.changes_since(0)
+        self.assertIn({"name": "bob", "deleted": True},
+                      [{"name": e["name"], "deleted": e.get("deleted")} for e in entries])
+
+    def test_tombstone_beats_a_stale_copy(self):
+        a, b = self.db("a1"), self.db("b2")
+        self.add(a, "bob")
+        stale, _, _ = a.changes_since(0)
+        a.remove_peer("10.0.0.1", "UnB", name="bob")
+        # uma réplica atrasada reenvia a cópia antiga: a remoção vence
+        self.assertEqual(a.apply_remote(stale), 0)
+        self.assertEqual(self.names(a), [])
+        # e quem recebe a remoção primeiro também ignora a cópia antiga
+        tomb, _, _ = a.changes_since(0)
+        self.assertEqual(b.apply_remote(tomb), 1)
+        self.assertEqual(b.apply_remote(stale), 0)
+        self.assertEqual(self.names(b), [])
+
+    def test_last_writer_wins_in_any_order(self):
+        a, b, c = self.db("a1"), self.db("b2"), self.db("c3")
+        self.add(a, "alice", port=4001)
+        self.add(b, "alice", port=4002)  # escrita posterior (versão maior)
+        older, _, _ = a.changes_since(0)
+        newer, _, _ = b.changes_since(0)
+        self.assertGreater(newer[0]["version"], older[0]["version"])
+        for i, (first, second) in enumerate(((older, newer), (newer, older))):
+            target = self.db(f"t{i}")
+            target.apply_remote(first)
+            target.apply_remote(second)
+            self.assertEqual([p.port for p in target.lookup("UnB", "alice")], [4002])
+        # empate de versão: decide a origem
+        tie = [dict(older[0], version=older[0]["version"], origin="zz", port=4009)]
+        c.apply_remote(older)
+        c.apply_remote(tie)
+        self.assertEqual([p.port for p in c.lookup("UnB", "alice")], [4009])
+
+    def test_restarted_peer_gets_a_full_resync(self):
+        a, b = self.db("a1"), self.db("b2")
+        self.add(a, "alice")
+        federation, addr = self.link(a, b)
+        federation.sync_peer(addr)
+        # b reinicia sem ter persistido nada: novo feed, nova incarnation
+        fresh = self.db("b2-restarted")
+        federation._request = self.link(a, fresh)[0]._request
+        federation.sync_peer(addr)
+        self.assertEqual(self.names(fresh), ["alice"])
+
+
+if __name__ == "__main__":
+    unittest.main()
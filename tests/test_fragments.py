@@ -0,0 +1,58 @@
+import os
+import sys
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from common import codec  # noqa: E402
+from models import PeerRecord  # noqa: E402
+from request_handler import RawJSON, dumps, peer_to_dict  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+NAMES = ["alice", 'quo"te', "back\\slash", "tab\tnew\nline", "\x01ctl", "ção", "emoji 🛰️", "</script>"]
+
+
+def record(name, ttl=3600, age=0, ip="10.0.0.1"):
+    return PeerRecord(ip, 4000, name, "UnB", ttl, datetime.now(timezone.utc) - timedelta(seconds=age))
+
+
+class FragmentTest(unittest.TestCase):
+    def test_fragment_matches_the_encoded_dict(self):
+        for name in NAMES:
+            peer = record(name, age=100)
+            now = datetime.now(timezone.utc)
+            self.assertEqual(peer.to_json(now.timestamp()), codec.dumps(peer_to_dict(peer, now)), name)
+
+    def test_expires_in_is_computed_per_call(self):
+        peer = record("a", ttl=100)
+        now = peer.timestamp.timestamp()
+        self.assertEqual(codec.loads(peer.to_json(now + 40))["expires_in"], 60)
+        self.assertEqual(codec.loads(peer.to_json(now + 500))["expires_in"], 0)
+
+    def test_touch_drops_the_cached_fragment(self):
+        peer = record("a", ttl=100, age=50)
+        peer.to_json(0)
+        self.assertIsNotNone(peer._fragment)
+        peer.touch(ttl=900)
+        reply = codec.loads(peer.to_json(datetime.now(timezone.utc).timestamp()))
+        self.assertEqual(reply["ttl"], 900)
+        self.assertGreater(reply["expires_in"], 890)
+
+    def test_raw_json_is_spliced_verbatim(self):
+        peers = [record(name) for name in NAMES]
+        now = datetime.now(timezone.utc)
+        raw = RawJSON("[" + ",".join(p.to_json(now.timestamp()) for p in peers) + "]")
+        expected = {"status": "OK", "peers": [peer_to_dict(p, now) for p in peers], "next_cursor": "x"}
+        self.assertEqual(dumps({"status": "OK", "peers": raw, "next_cursor": "x"}), codec.dumps(expected))
+        self.assertEqual(dumps({"status": "OK", "results": [{"a": 1}, {"peers": raw}]}),
+                         codec.dumps({"status": "OK", "results": [{"a": 1}, {"peers": expected["peers"]}]}))
+
+
+if __name__ == "__main__":
+    unittest.main()
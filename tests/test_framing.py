@@ -0,0 +1,80 @@
+import os
+import socket
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from framing import LineFramer, LineTooLong  # noqa: E402
+
+
+class LineFramerTest(unittest.TestCase):
+    def setUp(self):
+        self.ours, self.theirs = socket.socketpair()
+        self.addCleanup(self.ours.close)
+        self.addCleanup(self.theirs.close)
+
+    def feed(self, framer, data):
+        """Envia `data` e devolve as linhas (ou LineTooLong) que o framer produzir"""
+        self.ours.sendall(data)
+        out = []
+        pending = len(data)
+        while pending:
+            pending -= framer.recv(self.theirs)
+            while True:
+                try:
+                    line = framer.next_line()
+                except LineTooLong:
+                    out.append(LineTooLong)
+                    continue
+                if line is None:
+                    break
+                out.append(line)
+        return out
+
+    def test_many_lines_in_one_recv(self):
+        framer = LineFramer(chunk_size=65536)
+        lines = [b"msg-%d" % i for i in range(500)]
+        self.assertEqual(self.feed(framer, b"\n".join(lines) + b"\n"), lines)
+
+    def test_line_split_across_recvs(self):
+        framer = LineFramer()
+        self.assertEqual(self.feed(framer, b'{"a":'), [])
+        self.assertEqual(self.feed(framer, b'1}\n{"b"'), [b'{"a":1}'])
+        self.assertEqual(self.feed(framer, b':2}\n'), [b'{"b":2}'])
+
+    def test_buffer_compacts_instead_of_growing(self):
+        framer = LineFramer(max_line_size=64, chunk_size=16)
+        size = len(framer._buf)
+        lines = [b"%02d-" % i + b"x" * 40 for i in range(100)]
+        out = []
+        for line in lines:
+            out += self.feed(framer, line + b"\n")
+        self.assertEqual(out, lines)
+        self.assertEqual(len(framer._buf), size)
+
+    def test_long_line_is_dropped_up_to_the_next_newline(self):
+        framer = LineFramer(max_line_size=64, chunk_size=16)
+        out = self.feed(framer, b"ok\n" + b"x" * 500)
+        out += self.feed(framer, b"y" * 500 + b"\nafter\n")
+        self.assertEqual(out, [b"ok", LineTooLong, b"after"])
+        self.assertEqual(len(framer._buf), 80)  # nunca cresce com a linha longa
+
+    def test_long_line_in_a_single_chunk(self):
+        framer = LineFramer(max_line_size=64, chunk_size=4096)
+        self.assertEqual(self.feed(framer, b"a\n" + b"z" * 200 + b"\nb\n"), [b"a", LineTooLong, b"b"])
+
+    def test_line_at_the_limit_is_accepted(self):
+        framer = LineFramer(max_line_size=64, chunk_size=16)
+        line = b"x" * 64
+        self.assertEqual(self.feed(framer, line + b"\n"), [line])
+
+    def test_closed_connection(self):
+        framer = LineFramer()
+        self.ours.close()
+        self.assertEqual(framer.recv(self.theirs), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import random
+import sys
+import unittest
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from common import codec  # noqa: E402
+from message_router import MessageRouter  # noqa: E402
+from models import Message, MessageType  # noqa: E402
+
+
+class Network:
+    """Malha parcial aleatória de roteadores em modo gossip, com entrega em fila (sem sockets)"""
+
+    def __init__(self, n, degree, fanout, ttl, seed=7):
+        rng = random.Random(seed)
+        self.ids = [f"n{i}@UnB" for i in range(n)]
+        self.links = {p: set() for p in self.ids}
+        # anel + atalhos aleatórios: conexo e com grau limitado
+        for i, p in enumerate(self.ids):
+            self.connect(p, self.ids[(i + 1) % n])
+        for p in self.ids:
+            while len(self.links[p]) < degree:
+                self.connect(p, rng.choice(self.ids))
+        self.queue = deque()
+        self.sent = {p: 0 for p in self.ids}
+        self.delivered = {p: 0 for p in self.ids}
+        self.routers = {p: self.router(p, fanout, ttl) for p in self.ids}
+
+    def connect(self, a, b):
+        if a != b:
+            self.links[a].add(b)
+            self.links[b].add(a)
+
+    def router(self, me, fanout, ttl):
+        def send_frame(peer_id, frame):
+            self.sent[me] += 1
+            self.queue.append((me, peer_id, frame))
+            return True
+
+        neighbors = lambda: sorted(self.links[me])  # noqa: E731
+        return MessageRouter(me, None, neighbors, lambda _ns: neighbors(), send_frame=send_frame,
+                             pub_mode="gossip", gossip_fanout=fanout, gossip_ttl=ttl)
+
+    def run(self):
+        while self.queue:
+            src, dst, frame = self.queue.popleft()
+            if self.routers[dst].handle_pub(src, Message.from_dict(codec.loads(frame))):
+                self.delivered[dst] += 1
+
+
+class GossipTest(unittest.TestCase):
+    def test_reaches_the_whole_namespace_with_bounded_sends(self):
+        random.seed(1)
+        net = Network(200, degree=8, fanout=6, ttl=8)
+        net.routers["n0@UnB"].publish("#UnB", "hello")
+        net.run()
+        reached = [p for p, n in net.delivered.items() if n]
+        self.assertGreaterEqual(len(reached), 199)  # todos menos a origem
+        self.assertTrue(all(n <= 1 for n in net.delivered.values()))  # duplicatas descartadas
+        self.assertTrue(all(n <= 6 for n in net.sent.values()))
+
+    def test_forwarding_rules(self):
+        forwarded = []
+        router = MessageRouter("me@UnB", None, lambda: [], lambda _ns: ["a@UnB", "b@UnB", "src@UnB"],
+                               send_frame=lambda p, f: forwarded.append((p, codec.loads(f))) or True,
+                               pub_mode="gossip", gossip_fanout=6)
+        pub = Message(MessageType.PUB, "m1", src="src@UnB", dst="#UnB", payload="x", ttl=3)
+        self.assertTrue(router.handle_pub("a@UnB", pub))
+        # não volta para quem enviou nem para a origem; ttl decrementado
+        self.assertEqual([(p, m["ttl"]) for p, m in forwarded], [("b@UnB", 2)])
+        self.assertFalse(router.handle_pub("b@UnB", Message(MessageType.PUB, "m1", src="src@UnB",
+                                                            dst="#UnB", payload="x", ttl=2)))
+        self.assertEqual(len(forwarded), 1)
+
+        last = Message(MessageType.PUB, "m2", src="src@UnB", dst="#UnB", payload="x", ttl=1)
+        self.assertTrue(router.handle_pub("a@UnB", last))
+        self.assertEqual(len(forwarded), 1)  # ttl esgotado: entrega sem repassar
+
+    def test_publish_samples_the_fanout(self):
+        targets = []
+        peers = [f"p{i}@UnB" for i in range(20)]
+        router = MessageRouter("me@UnB", None, lambda: peers, lambda _ns: peers,
+                               send_frame=lambda p, f: targets.append(p) or True,
+                               pub_mode="gossip", gossip_fanout=4, gossip_ttl=5)
+        self.assertEqual(router.publish("#UnB", "x"), 4)
+        self.assertEqual(len(set(targets)), 4)
+        self.assertRaises(ValueError, MessageRouter, "me@UnB", None, list, list, pub_mode="flood")
+
+
+if __name__ == "__main__":
+    unittest.main()
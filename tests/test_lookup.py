@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from models import PeerRecord  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from request_handler import MAX_LOOKUP_IDS, RequestHandler  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+CALLER = "10.0.0.9"
+
+
+class LookupTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = PeerDatabase(os.path.join(tmp.name, "peers.json"))
+        self.addCleanup(self.db.close)
+        self.handler = RequestHandler(self.db)
+        self.add(CALLER, "me", "UnB")
+        self.add("10.0.0.1", "alice", "UnB", port=4001)
+        self.add("10.0.0.2", "alice", "UnB", port=4002)  # mesmo nome em outra máquina
+        self.add("10.0.0.3", "bob", "CIC", port=4003)
+
+    def add(self, ip, name, namespace, port=4000, ttl=3600, age=0):
+        self.db.add_peer(PeerRecord(ip, port, name, namespace, ttl,
+                                    datetime.now(timezone.utc) - timedelta(seconds=age)))
+
+    def lookup(self, ip=CALLER, **args):
+        return self.handler.dispatch("LOOKUP", args, ip)
+
+    def test_lookup_by_name(self):
+        reply = self.lookup(namespace="UnB", name="alice")
+        self.assertEqual(reply["status"], "OK")
+        self.assertEqual(sorted((p["ip"], p["port"]) for p in reply["peers"]),
+                         [("10.0.0.1", 4001), ("10.0.0.2", 4002)])
+        self.assertEqual(self.lookup(namespace="CIC", name="alice")["message"], "peer_not_found")
+
+    def test_lookup_by_peer_ids(self):
+        reply = self.lookup(peer_ids=["bob@CIC", "ghost@UnB", "no-namespace", 42])
+        self.assertEqual([p["name"] for p in reply["peers"]], ["bob"])
+        self.assertEqual(reply["missing"], ["ghost@UnB", "no-namespace", 42])
+
+    def test_name_with_at_sign(self):
+        self.add("10.0.0.4", "carol@home", "UnB")
+        reply = self.lookup(peer_ids=["carol@home@UnB"])
+        self.assertEqual([p["name"] for p in reply["peers"]], ["carol@home"])
+
+    def test_expired_records_are_not_returned(self):
+        self.add("10.0.0.5", "old", "UnB", ttl=10, age=60)
+        self.assertEqual(self.lookup(namespace="UnB", name="old")["message"], "peer_not_found")
+
+    def test_caller_must_be_registered(self):
+        self.assertEqual(self.lookup(ip="10.9.9.9", namespace="UnB", name="alice")["message"],
+                         "peer_not_registered")
+
+    def test_bad_arguments(self):
+        self.assertEqual(self.lookup(namespace="UnB")["message"], "bad_name")
+        self.assertEqual(self.lookup(name="alice")["message"], "bad_namespace")
+        self.assertEqual(self.lookup(peer_ids=[])["message"], "bad_peer_ids")
+        self.assertEqual(self.lookup(peer_ids=["a@b"] * (MAX_LOOKUP_IDS + 1))["message"], "bad_peer_ids")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from peer_connection import MAX_BATCH_FRAMES, PeerConnection  # noqa: E402
+
+
+class FakeSocket:
+    """Socket de teste: registra cada escrita; `gate` segura a primeira até ser liberado"""
+
+    def __init__(self, partial=False):
+        self.writes = []
+        self.gate = threading.Event()
+        self.closed = threading.Event()
+        self.partial = partial  # sendmsg escreve só metade
+
+    def sendmsg(self, frames):
+        self.gate.wait(5)
+        data = b"".join(frames)
+        sent = len(data) // 2 if self.partial else len(data)
+        self.writes.append(("sendmsg", data[:sent]))
+        return sent
+
+    def sendall(self, data):
+        self.gate.wait(5)
+        self.writes.append(("sendall", bytes(data)))
+
+    def recv_into(self, _view):
+        self.closed.wait()
+        return 0
+
+    def shutdown(self, _how):
+        self.closed.set()
+
+    def close(self):
+        self.closed.set()
+
+    def data(self):
+        return b"".join(d for _, d in self.writes)
+
+
+class SendQueueTest(unittest.TestCase):
+    def connection(self, sock, **kwargs):
+        disconnected = threading.Event()
+        conn = PeerConnection("x@N", sock, "outbound", lambda _p, _m: None,
+                              lambda _p: disconnected.set(), **kwargs)
+        conn.start()
+        self.addCleanup(conn.stop, False)
+        return conn, disconnected
+
+    def test_pending_frames_are_coalesced(self):
+        sock = FakeSocket()
+        conn, _ = self.connection(sock)
+        conn.send_frame(b"first\n")
+        time.sleep(0.05)  # escritor preso na primeira escrita
+        frames = [b"m%d\n" % i for i in range(300)]
+        for f in frames:
+            self.assertTrue(conn.send_frame(f))
+        sock.gate.set()
+        conn.stop()
+        self.assertEqual(sock.data(), b"first\n" + b"".join(frames))
+        # 1 + 300 quadros em 3 escritas (no máximo MAX_BATCH_FRAMES por chamada)
+        self.assertEqual(len(sock.writes), 1 + -(-300 // MAX_BATCH_FRAMES))
+
+    def test_partial_sendmsg_is_completed(self):
+        sock = FakeSocket(partial=True)
+        conn, _ = self.connection(sock)
+        conn.send_frame(b"first\n")
+        time.sleep(0.05)
+        conn.send_frame(b"a" * 99 + b"\n")
+        conn.send_frame(b"b" * 99 + b"\n")
+        sock.gate.set()
+        conn.stop()
+        self.assertEqual(sock.data(), b"first\n" + b"a" * 99 + b"\n" + b"b" * 99 + b"\n")
+
+    def fill(self, overflow):
+        sock = FakeSocket()
+        conn, disconnected = self.connection(sock, send_queue_size=3, overflow=overflow)
+        conn.send_frame(b"0\n")
+        time.sleep(0.05)
+        results = [conn.send_frame(b"%d\n" % i) for i in range(1, 6)]
+        return sock, conn, disconnected, results
+
+    def test_drop_oldest(self):
+        sock, conn, _, results = self.fill("drop_oldest")
+        self.assertEqual(results, [True] * 5)
+        sock.gate.set()
+        conn.stop()
+        self.assertEqual(sock.data(), b"0\n3\n4\n5\n")
+        self.assertEqual(conn.dropped, 2)
+
+    def test_drop_new(self):
+        sock, conn, _, results = self.fill("drop_new")
+        self.assertEqual(results, [True, True, True, False, False])
+        sock.gate.set()
+        conn.stop()
+        self.assertEqual(sock.data(), b"0\n1\n2\n3\n")
+
+    def test_disconnect(self):
+        sock, conn, disconnected, results = self.fill("disconnect")
+        self.assertEqual(results, [True, True, True, False, False])
+        self.assertTrue(disconnected.wait(2))
+        self.assertFalse(conn.running)
+        sock.gate.set()
+
+    def test_oversized_frames_and_bad_policy(self):
+        conn, _ = self.connection(FakeSocket())
+        self.assertFalse(conn.send_frame(b"x" * (conn.max_line_size + 1)))
+        with self.assertRaises(ValueError):
+            PeerConnection("x@N", FakeSocket(), "outbound", None, None, overflow="block")
+
+    def test_no_sends_after_stop(self):
+        sock = FakeSocket()
+        sock.gate.set()
+        conn, _ = self.connection(sock)
+        conn.stop()
+        self.assertFalse(conn.send_frame(b"late\n"))
+        self.assertEqual(sock.writes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
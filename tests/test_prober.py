@@ -0,0 +1,120 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from models import PeerRecord  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from prober import LivenessProber  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+
+def record(name, ip, port=4000, namespace="UnB"):
+    return PeerRecord(ip, port, name, namespace, 7200, datetime.now(timezone.utc))
+
+
+class ProberTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = PeerDatabase(os.path.join(tmp.name, "peers.json"))
+        self.addCleanup(self.db.close)
+        self.down = set()
+        self.probed = []
+
+    def prober(self, **kwargs):
+        prober = LivenessProber(self.db, **kwargs)
+
+        def probe(endpoint):
+            self.probed.append(endpoint)
+            return endpoint not in self.down
+
+        prober.probe = probe
+        return prober
+
+    def names(self, namespace="UnB"):
+        return [p.name for p in self.db.get_peers(namespace)]
+
+    def test_rounds_are_capped_and_cover_every_endpoint_once_per_pass(self):
+        for i in range(10):
+            self.db.add_peer(record(f"p{i}", f"10.0.0.{i}"))
+        prober = self.prober(max_per_round=4)
+        self.assertEqual([prober.probe_round()[0] for _ in range(3)], [4, 4, 2])
+        self.assertEqual(sorted(self.probed), sorted(self.db.endpoints()))
+        self.assertEqual(prober.probe_round()[0], 4)  # nova passada
+
+    def test_unlimited_round_probes_everything(self):
+        for i in range(10):
+            self.db.add_peer(record(f"p{i}", f"10.0.0.{i}"))
+        self.assertEqual(self.prober(max_per_round=0).probe_round()[0], 10)
+
+    def test_suspect_then_evict(self):
+        self.db.add_peer(record("alive", "10.0.0.1"))
+        self.db.add_peer(record("dead", "10.0.0.2"))
+        self.down.add(("10.0.0.2", 4000))
+        prober = self.prober(suspect_after=2, evict_after=3)
+
+        prober.probe_round()
+        self.assertEqual(self.names(), ["alive", "dead"])
+        prober.probe_round()
+        self.assertEqual(self.names(), ["alive"])
+        self.assertEqual(self.db.lookup("UnB", "dead"), [])
+        self.assertEqual(len(self.db.get_all_db()), 2)  # escondido, ainda não removido
+        prober.probe_round()
+        self.assertEqual([p.name for p in self.db.get_all_db()], ["alive"])
+
+    def test_suspect_comes_back_on_success(self):
+        self.db.add_peer(record("flaky", "10.0.0.3"))
+        self.down.add(("10.0.0.3", 4000))
+        prober = self.prober(suspect_after=1, evict_after=0)
+        prober.probe_round()
+        self.assertEqual(self.names(), [])
+        self.down.clear()
+        prober.probe_round()
+        self.assertEqual(self.names(), ["flaky"])
+
+
+class SuspectPagingTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = PeerDatabase(os.path.join(tmp.name, "peers.json"))
+        self.addCleanup(self.db.close)
+        for i in range(200):
+            self.db.add_peer(record(f"s{i:03d}", "10.1.0.1", port=5000))
+        for i in range(5):
+            self.db.add_peer(record(f"v{i}", f"10.2.0.{i}"))
+        self.db.set_suspect("10.1.0.1", 5000, True)
+
+    def test_pages_only_walk_visible_records(self):
+        self.assertEqual(len(self.db._order), 5)  # os suspeitos não estão na ordem de chaves
+        records, next_key = self.db.page("UnB", limit=2)
+        names = [p.name for p in records]
+        while next_key:
+            records, next_key = self.db.page("UnB", after=next_key, limit=2)
+            names += [p.name for p in records]
+        self.assertEqual(names, [f"v{i}" for i in range(5)])
+
+    def test_cleared_suspects_reappear_in_order(self):
+        self.db.set_suspect("10.1.0.1", 5000, False)
+        names = [p.name for p in self.db.get_peers("UnB")]
+        self.assertEqual(names, sorted(names))
+        self.assertEqual(len(names), 205)
+
+    def test_reregistering_a_suspect_shows_it_again(self):
+        self.db.add_peer(record("s000", "10.1.0.1", port=5000))
+        self.assertIn("s000", [p.name for p in self.db.get_peers("UnB")])
+        self.db.remove_endpoint("10.1.0.1", 5000)
+        self.assertEqual(len(self.db._order), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from profiler import Profiler  # noqa: E402
+from rendezvous import RendezvousServer  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+
+def busy(n=20000):
+    return sum(i * i for i in range(n))
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.profiler = Profiler(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def wait_for_file(self, path, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.profiler._mode is None and os.path.exists(path):
+                return
+            time.sleep(0.02)
+        self.fail(f"profile not written to {path}")
+
+    def test_concurrent_requests_during_cprofile_session(self):
+        path = self.profiler.start("cprofile", 0.5)
+        self.assertIsNotNone(path)
+
+        served = []
+        errors = []
+        barrier = threading.Barrier(8)
+
+        def serve(i):
+            try:
+                with self.profiler.request():
+                    barrier.wait(timeout=5)  # all requests inside request() at once
+                    busy()
+                    served.append(i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=serve, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(served), list(range(8)))
+        self.wait_for_file(path)
+        self.assertGreater(os.path.getsize(path), 0)
+
+    def test_only_one_session_at_a_time(self):
+        self.assertIsNotNone(self.profiler.start("cprofile", 0.2))
+        self.assertIsNone(self.profiler.start("sample", 0.2))
+        time.sleep(0.5)
+
+    def test_request_is_served_when_another_profiler_is_active(self):
+        import cProfile
+        other = cProfile.Profile()
+        other.enable()
+        try:
+            path = self.profiler.start("cprofile", 0.2)
+            served = []
+            with self.profiler.request():
+                served.append(True)
+        finally:
+            other.disable()
+        self.assertEqual(served, [True])
+        self.wait_for_file(path)
+
+
+class ProfileCommandTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def server(self, **kwargs):
+        server = RendezvousServer(port=0, db_file=os.path.join(self.tmp.name, "peers.json"),
+                                  profile_dir=os.path.join(self.tmp.name, "profiles"), **kwargs)
+        self.addCleanup(server.peer_db.close)
+        return server
+
+    def test_disabled_by_default(self):
+        server = self.server()
+        self.assertIsNone(server.profiler)
+        self.assertEqual(server.handler.dispatch("PROFILE", {"mode": "sample", "duration": 1}, "127.0.0.1"),
+                         {"status": "ERROR", "message": "profiling_disabled"})
+
+    def test_enabled(self):
+        server = self.server(profiling=True, admin_token="t0k")
+        resp = server.handler.dispatch("PROFILE", {"mode": "sample", "duration": 0.1}, "127.0.0.1")
+        self.assertEqual(resp["status"], "OK")
+        self.assertEqual(server.handler.dispatch("PROFILE", {"duration": 1}, "203.0.113.7")["message"],
+                         "unauthorized")
+        time.sleep(0.3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+import message_router  # noqa: E402
+from common import codec  # noqa: E402
+from message_router import MessageRouter  # noqa: E402
+from models import Message, MessageType  # noqa: E402
+
+PEERS = [f"p{i}@UnB" for i in range(50)] + ["q@CIC"]
+
+
+class PublishTest(unittest.TestCase):
+    def setUp(self):
+        self.frames = []
+        self.messages = []
+        self.refuse = set()
+
+    def router(self, frames=True):
+        def send_frame(peer_id, frame):
+            self.frames.append((peer_id, frame))
+            return peer_id not in self.refuse
+
+        def send_message(peer_id, message):
+            self.messages.append((peer_id, message))
+            return peer_id not in self.refuse
+
+        return MessageRouter("me@UnB", send_message, lambda: list(PEERS),
+                             lambda ns: [p for p in PEERS if p.endswith("@" + ns)],
+                             send_frame=send_frame if frames else None)
+
+    def test_message_is_encoded_once_for_every_peer(self):
+        router = self.router()
+        with mock.patch.object(message_router.codec, "dumpb", wraps=codec.dumpb) as dumpb:
+            self.assertEqual(router.publish("#UnB", "olá"), 50)
+        self.assertEqual(dumpb.call_count, 1)
+        self.assertEqual([p for p, _ in self.frames], PEERS[:50])
+        frame = self.frames[0][1]
+        self.assertTrue(all(f is frame for _, f in self.frames))  # o mesmo objeto bytes
+        self.assertTrue(frame.endswith(b"\n"))
+        msg = Message.from_dict(codec.loads(frame))
+        self.assertEqual((msg.msg_type, msg.src, msg.dst, msg.payload), (MessageType.PUB, "me@UnB", "#UnB", "olá"))
+
+    def test_broadcast_and_refused_sends(self):
+        self.refuse = {"p1@UnB", "q@CIC"}
+        self.assertEqual(self.router().publish("*", "x"), len(PEERS) - 2)
+        self.assertEqual(len(self.frames), len(PEERS))
+
+    def test_without_send_frame_falls_back_to_send_message(self):
+        self.assertEqual(self.router(frames=False).publish("#CIC", "x"), 1)
+        self.assertEqual([(p, m.payload) for p, m in self.messages], [("q@CIC", "x")])
+
+    def test_invalid_scope(self):
+        self.assertEqual(self.router().publish("UnB", "x"), 0)
+        self.assertEqual(self.frames, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from models import PeerRecord  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from request_handler import RequestHandler  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+IP = "10.0.0.1"
+
+
+class RefreshTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.db = PeerDatabase(os.path.join(tmp.name, "peers.json"))
+        self.addCleanup(self.db.close)
+        self.handler = RequestHandler(self.db)
+        self.add("a", age=3000)
+        self.add("b", age=3000)
+
+    def add(self, name, ttl=3600, age=0, ip=IP):
+        self.db.add_peer(PeerRecord(ip, 4000, name, "UnB", ttl,
+                                    datetime.now(timezone.utc) - timedelta(seconds=age)))
+
+    def refresh(self, ip=IP, **args):
+        return self.handler.dispatch("REFRESH", args, ip)
+
+    def remaining(self, name):
+        (peer,) = self.db.lookup("UnB", name)
+        return peer.expires_at - datetime.now(timezone.utc).timestamp()
+
+    def test_refresh_restarts_the_ttl(self):
+        self.assertLess(self.remaining("a"), 700)
+        self.assertEqual(self.refresh(namespace="UnB", name="a"), {"status": "OK", "ttl": 3600})
+        self.assertGreater(self.remaining("a"), 3590)
+        self.assertLess(self.remaining("b"), 700)  # só o registro pedido
+
+    def test_refresh_with_a_new_ttl_is_clamped(self):
+        self.assertEqual(self.refresh(namespace="UnB", name="a", ttl=10**6)["ttl"], 86400)
+        self.assertEqual(self.refresh(namespace="UnB", name="a", ttl="x"),
+                         {"status": "ERROR", "message": "bad_ttl"})
+
+    def test_only_the_owner_ip_can_refresh(self):
+        self.assertEqual(self.refresh(ip="10.0.0.2", namespace="UnB", name="a")["message"],
+                         "peer_not_registered")
+        self.assertEqual(self.refresh(namespace="UnB", name="ghost")["message"], "peer_not_registered")
+        self.assertEqual(self.refresh(namespace="UnB")["message"], "bad_request")
+
+    def test_expired_records_are_not_revived(self):
+        self.add("old", ttl=10, age=60)
+        self.assertEqual(self.refresh(namespace="UnB", name="old")["message"], "peer_not_registered")
+
+    def test_batch_refresh_reports_missing_records(self):
+        reply = self.refresh(peers=[{"namespace": "UnB", "name": "a"}, {"namespace": "UnB", "name": "b"},
+                                    {"namespace": "UnB", "name": "ghost"}, "junk"])
+        self.assertEqual(reply["refreshed"], 2)
+        self.assertEqual(reply["missing"], [{"namespace": "UnB", "name": "ghost"},
+                                            {"namespace": None, "name": None}])
+        self.assertGreater(self.remaining("b"), 3590)
+
+    def test_batch_refresh_is_bounded(self):
+        self.assertEqual(self.refresh(peers=[])["message"], "bad_peers")
+        too_many = [{"namespace": "UnB", "name": "a"}] * 257
+        self.assertEqual(self.refresh(peers=too_many)["message"], "bad_peers")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from models import PeerRecord  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from rendezvous import RendezvousServer  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+
+def record(name, namespace="UnB", ttl=7200, age=0, ip="10.0.0.1"):
+    return PeerRecord(ip, 4000, name, namespace, ttl,
+                      datetime.now(timezone.utc) - timedelta(seconds=age))
+
+
+class RegistryLimitsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def db(self, **kwargs):
+        db = PeerDatabase(os.path.join(self.tmp.name, "peers.json"), **kwargs)
+        self.addCleanup(db.close)
+        return db
+
+    def names(self, db, namespace=None):
+        return sorted(p.name for p in db.get_peers(namespace))
+
+    def test_no_caps_by_default(self):
+        server = RendezvousServer(port=0, db_file=os.path.join(self.tmp.name, "server.json"))
+        self.addCleanup(server.peer_db.close)
+        self.assertIsNone(server.peer_db.max_records)
+        self.assertIsNone(server.peer_db.max_per_namespace)
+        self.assertEqual(server.peer_db.eviction, "reject")
+
+        db = self.db()
+        for i in range(500):
+            self.assertTrue(db.add_peer(record(f"p{i}")))
+        self.assertEqual(len(db.get_all_db()), 500)
+
+    def test_reject_keeps_existing_records_and_allows_updates(self):
+        db = self.db(max_records=2)
+        self.assertTrue(db.add_peer(record("a")))
+        self.assertTrue(db.add_peer(record("b")))
+        self.assertFalse(db.add_peer(record("c")))
+        self.assertTrue(db.add_peer(record("a", ttl=60)))  # upsert de um existente
+        self.assertEqual(self.names(db), ["a", "b"])
+        self.assertEqual(db.stats()["rejected"], 1)
+
+    def test_soonest_expiry_evicts_the_record_expiring_first(self):
+        db = self.db(max_records=3, eviction="soonest_expiry")
+        db.add_peer(record("long", ttl=7200))
+        db.add_peer(record("short", ttl=60))
+        db.add_peer(record("mid", ttl=600))
+        self.assertTrue(db.add_peer(record("new", ttl=7200)))
+        self.assertEqual(self.names(db), ["long", "mid", "new"])
+        self.assertTrue(db.add_peer(record("newer", ttl=7200)))
+        self.assertEqual(self.names(db), ["long", "new", "newer"])
+        self.assertEqual(db.stats()["evicted_global"], 2)
+
+    def test_oldest_refresh_evicts_the_least_recently_refreshed(self):
+        db = self.db(max_records=3, eviction="oldest_refresh")
+        db.add_peer(record("a", age=30))
+        db.add_peer(record("b", age=20))
+        db.add_peer(record("c", age=10))
+        db.refresh_peer("10.0.0.1", "UnB", "a")  # "a" passa a ser o mais recente
+        self.assertTrue(db.add_peer(record("d")))
+        self.assertEqual(self.names(db), ["a", "c", "d"])
+
+    def test_namespace_cap_evicts_within_the_namespace(self):
+        db = self.db(max_per_namespace=2, eviction="soonest_expiry")
+        db.add_peer(record("x1", namespace="X", ttl=60))
+        db.add_peer(record("x2", namespace="X", ttl=7200))
+        db.add_peer(record("y1", namespace="Y", ttl=10))
+        self.assertTrue(db.add_peer(record("x3", namespace="X", ttl=7200)))
+        self.assertEqual(self.names(db, "X"), ["x2", "x3"])
+        self.assertEqual(self.names(db, "Y"), ["y1"])  # o de outro namespace fica
+        self.assertEqual(db.stats()["evicted_namespace"], 1)
+
+    def test_namespace_cap_with_reject(self):
+        db = self.db(max_records=10, max_per_namespace=1)
+        self.assertTrue(db.add_peer(record("x1", namespace="X")))
+        self.assertFalse(db.add_peer(record("x2", namespace="X")))
+        self.assertTrue(db.add_peer(record("y1", namespace="Y")))
+        self.assertEqual(db.stats()["records"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
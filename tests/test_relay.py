@@ -0,0 +1,92 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+import message_router  # noqa: E402
+from common import codec  # noqa: E402
+from message_router import MessageRouter, parse_relay_header  # noqa: E402
+from models import Message, MessageType  # noqa: E402
+
+
+def relay_line(payload="olá", ttl=3, dst="d@N", src="s@N", msg_id="m1", msg_type=MessageType.RELAY):
+    return codec.dumpb(Message(msg_type, msg_id, src=src, dst=dst, payload=payload, ttl=ttl).to_dict())
+
+
+class RelayHeaderTest(unittest.TestCase):
+    def test_canonical_frames(self):
+        header = parse_relay_header(relay_line(ttl=12))
+        self.assertEqual((header.msg_type, header.ttl, header.msg_id, header.src, header.dst),
+                         (MessageType.RELAY, 12, "m1", "s@N", "d@N"))
+        ack = parse_relay_header(relay_line(payload=None, msg_type=MessageType.RELAY_ACK))
+        self.assertEqual(ack.msg_type, MessageType.RELAY_ACK)
+
+    def test_payload_cannot_spoof_the_header(self):
+        line = relay_line(payload='","dst":"evil@N","x":"')
+        self.assertEqual(parse_relay_header(line).dst, "d@N")
+
+    def test_non_canonical_frames_take_the_slow_path(self):
+        self.assertIsNone(parse_relay_header(b'{"ttl":3,"type":"RELAY","dst":"d@N"}'))
+        self.assertIsNone(parse_relay_header(b'{"type":"RELAY","ttl":"3","dst":"d@N"}'))
+        self.assertIsNone(parse_relay_header(relay_line(dst='d"q@N')))  # escape no destino
+        self.assertIsNone(parse_relay_header(relay_line(dst=None)))
+        self.assertIsNone(parse_relay_header(codec.dumpb(Message(MessageType.PUB, "m", payload="x").to_dict())))
+
+
+class FastForwardTest(unittest.TestCase):
+    def setUp(self):
+        self.frames = []
+        self.messages = []
+        self.connected = ["a@N", "b@N", "d@N"]
+        self.router = MessageRouter(
+            "me@N", lambda p, m: self.messages.append((p, m)) or True, lambda: list(self.connected),
+            lambda _ns: [], send_frame=lambda p, f: self.frames.append((p, f)) or True)
+
+    def test_forwards_the_original_bytes_with_a_new_ttl(self):
+        payload = "x" * 20000 + "🛰️"
+        line = relay_line(payload=payload, ttl=5)
+        with mock.patch.object(message_router.codec, "loads", side_effect=AssertionError("decoded")):
+            self.assertTrue(self.router.forward_relay_frame("a@N", line))
+        (hop, frame), = self.frames
+        self.assertEqual(hop, "d@N")
+        self.assertEqual(frame, line.replace(b'"ttl":5', b'"ttl":4', 1) + b"\n")
+
+    def test_same_result_as_the_slow_path(self):
+        line = relay_line(ttl=5)
+        self.router.forward_relay_frame("a@N", line)
+        self.router.handle_relay("a@N", Message.from_dict(codec.loads(line)))
+        (fast_hop, frame), = self.frames
+        (slow_hop, message), = self.messages
+        self.assertEqual(fast_hop, slow_hop)
+        self.assertEqual(codec.loads(frame), message.to_dict())
+
+    def test_line_with_newline_is_not_doubled(self):
+        self.router.forward_relay_frame("a@N", relay_line() + b"\n")
+        self.assertTrue(self.frames[0][1].endswith(b"}\n"))
+
+    def test_frames_for_us_and_unknown_frames_are_not_consumed(self):
+        self.assertFalse(self.router.forward_relay_frame("a@N", relay_line(dst="me@N")))
+        self.assertFalse(self.router.forward_relay_frame("a@N", b'{"type":"PUB","ttl":1}'))
+        self.assertEqual(self.frames, [])
+
+    def test_expired_ttl_is_dropped(self):
+        self.connected = ["a@N", "b@N"]  # destino não é vizinho
+        self.assertTrue(self.router.forward_relay_frame("a@N", relay_line(ttl=0)))
+        self.assertTrue(self.router.forward_relay_frame("a@N", relay_line(ttl=1)))
+        self.assertEqual(self.frames, [])
+
+    def test_never_sent_back(self):
+        self.connected = ["a@N", "s@N", "b@N"]
+        self.router.forward_relay_frame("a@N", relay_line())
+        self.assertEqual([p for p, _ in self.frames], ["b@N"])
+
+    def test_disabled_without_send_frame(self):
+        router = MessageRouter("me@N", lambda p, m: True, list, list)
+        self.assertFalse(router.forward_relay_frame("a@N", relay_line()))
+
+
+if __name__ == "__main__":
+    unittest.main()
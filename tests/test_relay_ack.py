@@ -0,0 +1,121 @@
+import os
+import sys
+import unittest
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from common import codec  # noqa: E402
+from message_router import MessageRouter  # noqa: E402
+from models import Message, MessageType  # noqa: E402
+
+
+class Network:
+    """Roteadores ligados por uma fila em memória; `down` são enlaces que perdem tudo"""
+
+    def __init__(self, links, fast=False):
+        self.links = {}
+        for a, b in links:
+            self.links.setdefault(a, []).append(b)
+            self.links.setdefault(b, []).append(a)
+        self.queue = deque()
+        self.down = set()
+        self.delivered = []
+        self.routers = {}
+        for me in self.links:
+            kwargs = {"send_frame": self.frame_sender(me)} if fast else {}
+            self.routers[me] = MessageRouter(
+                me, self.sender(me), lambda me=me: list(self.links[me]), lambda _ns: [],
+                relay_ack=True, relay_retries=2, ack_timeout=5, **kwargs)
+
+    def sender(self, me):
+        return lambda peer, message: self.frame_sender(me)(peer, codec.dumpb(message.to_dict()))
+
+    def frame_sender(self, me):
+        def send(peer, frame):
+            if (me, peer) not in self.down:
+                self.queue.append((me, peer, bytes(frame)))
+            return True
+        return send
+
+    def run(self):
+        while self.queue:
+            src, dst, line = self.queue.popleft()
+            router = self.routers[dst]
+            if router.forward_relay_frame(src, line):
+                continue
+            message = Message.from_dict(codec.loads(line))
+            if message.msg_type == MessageType.RELAY:
+                if router.handle_relay(src, message):
+                    self.delivered.append((dst, message.payload))
+            else:
+                router.handle_relay_ack(src, message)
+
+    def expire(self, name):
+        """Simula o fim do ack_timeout das mensagens pendentes de `name`"""
+        router = self.routers[name]
+        for pending in router.pending_relays.values():
+            pending.sent_at -= router.ack_timeout + 1
+        router.expire_relays()
+
+
+class RelayAckTest(unittest.TestCase):
+    def test_ack_returns_along_the_reverse_path(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast):
+                net = Network([("s", "r1"), ("r1", "r2"), ("r2", "d")], fast=fast)
+                me = net.routers["s"]
+                self.assertTrue(me.send_via_relay("d", "olá"))
+                self.assertEqual(len(me.pending_relays), 1)
+                net.run()
+                self.assertEqual(net.delivered, [("d", "olá")])
+                self.assertEqual(me.pending_relays, {})
+                self.assertEqual(list(me.relay_rtt()), ["d"])
+                # os relays esqueceram o caminho reverso já usado
+                self.assertEqual(len(net.routers["r1"].reverse_hops), 0)
+
+    def test_lost_message_is_retried_on_another_first_hop(self):
+        net = Network([("s", "r1"), ("s", "r2"), ("r1", "d"), ("r2", "d")])
+        me = net.routers["s"]
+        me.send_via_relay("d", "x")
+        first = next(iter(me.pending_relays.values())).first_hop
+        net.down.add((first, "d"))
+        net.run()
+        self.assertEqual(net.delivered, [])
+
+        net.expire("s")
+        net.run()
+        self.assertEqual(net.delivered, [("d", "x")])
+        self.assertEqual(me.pending_relays, {})
+        self.assertEqual(me.relay_rtt(), {})  # amostra de uma retransmissão não conta
+
+    def test_lost_ack_gives_a_duplicate_that_is_acked_but_not_delivered_twice(self):
+        net = Network([("s", "r1"), ("s", "r2"), ("r1", "d"), ("r2", "d")])
+        me = net.routers["s"]
+        me.send_via_relay("d", "x")
+        net.down |= {("r1", "s"), ("r2", "s")}  # ACKs perdidos na volta
+        net.run()
+        net.down.clear()
+        net.expire("s")
+        net.run()
+        self.assertEqual(net.delivered, [("d", "x")])
+        self.assertEqual(me.pending_relays, {})
+
+    def test_gives_up_after_the_retries(self):
+        net = Network([("s", "r1"), ("s", "r2"), ("s", "r3"), ("r1", "d"), ("r2", "d"), ("r3", "d")])
+        net.down |= {("r1", "d"), ("r2", "d"), ("r3", "d")}
+        me = net.routers["s"]
+        me.send_via_relay("d", "x")
+        hops = set()
+        for _ in range(4):
+            hops |= {p.first_hop for p in me.pending_relays.values()} | \
+                    set().union(*(p.tried for p in me.pending_relays.values()))
+            net.run()
+            net.expire("s")
+        self.assertEqual(me.pending_relays, {})
+        self.assertEqual(hops, {"r1", "r2", "r3"})  # cada tentativa por um primeiro salto novo
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from common import codec  # noqa: E402
+from models import Message, MessageType  # noqa: E402
+import reliable  # noqa: E402
+from reliable import ReliableDelivery  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class Link:
+    """Two endpoints "a" and "b" whose frames wait on a wire until pumped"""
+
+    def __init__(self, **kwargs):
+        self.wire = []  # (destino, quadro)
+        self.delivered = {"a": [], "b": []}
+        self.failed = []
+        self.ends = {}
+        for me, other in (("a", "b"), ("b", "a")):
+            end = ReliableDelivery(
+                me,
+                send_frame=lambda peer, frame: self.wire.append((peer, frame)) or True,
+                deliver=lambda peer, msg, me=me: self.delivered[me].append(msg.payload),
+                on_failure=self.failed.append,
+                **kwargs)
+            end.add_peer(other)
+            self.ends[me] = end
+
+    def take(self):
+        frames, self.wire = self.wire, []
+        return [(dst, Message.from_dict(codec.loads(frame))) for dst, frame in frames]
+
+    def pump(self, drop=lambda dst, msg: False):
+        """Entrega o que está no fio (inclusive o que a entrega gerar) até esvaziar"""
+        while self.wire:
+            for dst, msg in self.take():
+                if drop(dst, msg):
+                    continue
+                src = "a" if dst == "b" else "b"
+                if msg.msg_type == MessageType.ACK:
+                    self.ends[dst].handle_ack(src, msg)
+                else:
+                    self.ends[dst].handle_send(src, msg)
+
+
+class ReliableDeliveryTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(reliable, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def channel(self, link, me="a"):
+        return link.ends[me].channels["b" if me == "a" else "a"]
+
+    def test_delayed_ack_is_sent_by_tick_after_ack_delay(self):
+        link = Link(ack_delay=0.05, ack_every=16)
+        link.ends["a"].send("b", "m0")
+        sends = link.take()
+        link.ends["b"].handle_send("a", sends[0][1])
+        self.assertEqual(link.delivered["b"], ["m0"])
+        self.assertEqual(link.wire, [])  # nenhum ACK imediato
+
+        self.clock.now += 0.01
+        link.ends["b"].tick()
+        self.assertEqual(link.wire, [])
+
+        self.clock.now += 0.05
+        link.ends["b"].tick()
+        acks = link.take()
+        self.assertEqual([(dst, msg.msg_type, msg.ack) for dst, msg in acks], [("a", MessageType.ACK, 1)])
+
+    def test_ack_every_forces_an_ack(self):
+        link = Link(ack_every=4)
+        for i in range(4):
+            link.ends["a"].send("b", f"m{i}")
+        for _dst, msg in link.take():
+            link.ends["b"].handle_send("a", msg)
+        acks = link.take()
+        self.assertEqual([msg.ack for _dst, msg in acks], [4])
+
+    def test_cumulative_ack_clears_everything_below(self):
+        link = Link()
+        for i in range(5):
+            link.ends["a"].send("b", f"m{i}")
+        link.pump()
+        self.clock.now += 1
+        link.ends["b"].tick()
+        link.pump()
+        self.assertEqual(link.delivered["b"], [f"m{i}" for i in range(5)])
+        self.assertEqual(self.channel(link).in_flight, {})
+
+    def test_loss_is_retransmitted_after_rto_and_delivered_in_order(self):
+        link = Link()
+        for i in range(3):
+            link.ends["a"].send("b", f"m{i}")
+        # o primeiro SEND se perde; 1 e 2 chegam fora de ordem
+        lose_first = lambda dst, msg: msg.msg_type == MessageType.SEND and msg.seq == 0  # noqa: E731
+        link.pump(lose_first)
+        self.assertEqual(link.delivered["b"], [])
+        self.assertEqual(sorted(self.channel(link, "b").out_of_order), [1, 2])
+        self.clock.now += 0.3
+        link.ends["b"].tick()  # ACK atrasado do seq 2 (a retransmissão rápida também se perde)
+        link.pump(lose_first)
+        self.assertEqual(sorted(self.channel(link).in_flight), [0])
+
+        self.clock.now += self.channel(link).rto + 0.1
+        link.ends["a"].tick()
+        resent = [msg.seq for _dst, msg in link.take()]
+        self.assertEqual(resent, [0])
+        link.ends["b"].handle_send("a", Message(MessageType.SEND, "x", src="a", dst="b", payload="m0", seq=0))
+        self.assertEqual(link.delivered["b"], ["m0", "m1", "m2"])
+
+    def test_sack_above_a_hole_triggers_fast_retransmit(self):
+        link = Link(min_rto=0.2)
+        link.ends["a"].send("b", "m0")
+        self.clock.now += 0.3
+        link.ends["a"].send("b", "m1")
+        sends = link.take()
+        self.clock.now += 0.05  # amostra de RTT do m1: srtt = 0.05
+        link.ends["b"].handle_send("a", sends[1][1])  # abre o buraco: ACK imediato
+        acks = link.take()
+        self.assertEqual(len(acks), 1)
+        self.assertEqual((acks[0][1].ack, acks[0][1].sack), (0, [[1, 1]]))
+
+        link.ends["a"].handle_ack("b", acks[0][1])
+        self.assertNotIn(1, self.channel(link).in_flight)  # confirmado pelo SACK
+        resent = [msg.seq for _dst, msg in link.take()]
+        self.assertEqual(resent, [0])  # mais velho que o srtt: sem esperar o RTO
+
+    def test_window_is_a_sequence_span_from_the_lowest_unacked(self):
+        link = Link(window=4, ack_every=1)
+        for i in range(12):
+            link.ends["a"].send("b", f"m{i}")
+        self.assertEqual([msg.seq for _dst, msg in link.take()], [0, 1, 2, 3])
+
+        # seq 0 se perde; 1..3 são confirmados por SACK, mas a janela não anda
+        link.ends["b"].handle_send("a", Message(MessageType.SEND, "x", src="a", dst="b", payload="m1", seq=1))
+        link.ends["b"].handle_send("a", Message(MessageType.SEND, "x", src="a", dst="b", payload="m2", seq=2))
+        link.ends["b"].handle_send("a", Message(MessageType.SEND, "x", src="a", dst="b", payload="m3", seq=3))
+        for _dst, ack in link.take():
+            link.ends["a"].handle_ack("b", ack)
+        sent = [msg.seq for _dst, msg in link.take() if msg.msg_type == MessageType.SEND]
+        self.assertTrue(all(seq < 4 for seq in sent), sent)
+        self.assertEqual(sorted(self.channel(link).in_flight), [0])
+
+        # recuperado o buraco, tudo chega em ordem sem nada ser descartado
+        self.clock.now += reliable.INITIAL_RTO + 0.1
+        link.ends["a"].tick()
+        for _ in range(10):
+            link.pump()
+            self.clock.now += 1
+            link.ends["a"].tick()
+            link.ends["b"].tick()
+        self.assertEqual(link.delivered["b"], [f"m{i}" for i in range(12)])
+        self.assertEqual(link.failed, [])
+
+    def test_lossy_link_delivers_everything_in_order(self):
+        link = Link(window=8)
+        for i in range(100):
+            link.ends["a"].send("b", f"m{i}")
+        n = 0
+
+        def drop(_dst, _msg):
+            nonlocal n
+            n += 1
+            return n % 4 == 0
+
+        for _ in range(200):
+            link.pump(drop)
+            self.clock.now += 0.5
+            link.ends["a"].tick()
+            link.ends["b"].tick()
+            if len(link.delivered["b"]) == 100:
+                break
+        self.assertEqual(link.delivered["b"], [f"m{i}" for i in range(100)])
+        self.assertEqual(link.failed, [])
+
+    def test_karn_ignores_rtt_of_retransmitted_messages(self):
+        link = Link()
+        link.ends["a"].send("b", "m0")
+        link.take()
+        self.clock.now += reliable.INITIAL_RTO + 0.1
+        link.ends["a"].tick()  # retransmite
+        link.take()
+        self.clock.now += 0.01
+        link.ends["a"].handle_ack("b", Message(MessageType.ACK, "", ack=1))
+        self.assertIsNone(self.channel(link).srtt)
+
+        link.ends["a"].send("b", "m1")
+        link.take()
+        self.clock.now += 0.1
+        link.ends["a"].handle_ack("b", Message(MessageType.ACK, "", ack=2))
+        self.assertAlmostEqual(self.channel(link).srtt, 0.1)
+
+    def test_rto_backs_off_and_gives_up_after_max_retries(self):
+        link = Link(max_retries=3, max_rto=100.0)
+        link.ends["a"].send("b", "m0")
+        channel = self.channel(link)
+        rtos = []
+        for _ in range(3):
+            self.clock.now += channel.rto + 0.01
+            link.ends["a"].tick()
+            rtos.append(channel.rto)
+        self.assertEqual(rtos, [2.0, 4.0, 8.0])
+        self.assertEqual(link.failed, [])
+
+        self.clock.now += channel.rto + 0.01
+        link.ends["a"].tick()
+        self.assertEqual(link.failed, ["b"])
+        self.assertFalse(link.ends["a"].has_peer("b"))
+
+
+if __name__ == "__main__":
+    unittest.main()
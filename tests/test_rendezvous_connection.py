@@ -0,0 +1,165 @@
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from common import codec  # noqa: E402
+from endpoint_pool import EndpointPool  # noqa: E402
+from rendezvous_connection import RendezvousConnection  # noqa: E402
+
+
+class FakeServer:
+    """Servidor TCP de teste: handler(sock, request) responde cada conexão"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            request = codec.loads(conn.makefile("rb").readline())
+            self.requests.append(request)
+            self.handler(conn, request)
+
+    def close(self):
+        self.sock.close()
+
+
+def reply(obj, delay=0.0):
+    def handler(conn, _request):
+        time.sleep(delay)
+        conn.sendall(codec.dumpb(obj) + b"\n")
+    return handler
+
+
+def free_port():
+    with socket.create_server(("127.0.0.1", 0)) as s:
+        return s.getsockname()[1]
+
+
+class EndpointPoolTest(unittest.TestCase):
+    def test_orders_by_latency_then_configuration(self):
+        pool = EndpointPool([("a", 1), ("b", 2), ("c", 3)])
+        a, b, c = pool.endpoints
+        pool.record_success(c, 0.05)
+        pool.record_success(b, 0.01)
+        self.assertEqual([e.host for e in pool.ordered()], ["b", "c", "a"])
+
+    def test_failures_back_off_exponentially_until_a_success(self):
+        pool = EndpointPool([("a", 1), ("b", 2)], backoff_base=1.0, backoff_max=4.0)
+        a = pool.endpoints[0]
+        before = time.monotonic()
+        for expected in (1.0, 2.0, 4.0, 4.0):
+            pool.record_failure(a)
+            self.assertAlmostEqual(a.down_until - before, expected, delta=0.1)
+        self.assertEqual([e.host for e in pool.ordered()], ["b", "a"])
+        pool.record_success(a, 0.001)
+        self.assertEqual([e.host for e in pool.ordered()], ["a", "b"])
+        self.assertEqual(a.failures, 0)
+
+    def test_hedge_delay_is_the_p95(self):
+        pool = EndpointPool([("a", 1)], default_hedge_delay=0.5, min_hedge_delay=0.01)
+        a = pool.endpoints[0]
+        self.assertEqual(pool.hedge_delay(a), 0.5)
+        for i in range(1, 21):
+            pool.record_success(a, i / 100)
+        self.assertEqual(pool.hedge_delay(a), 0.20)
+
+    def test_parse(self):
+        self.assertEqual(EndpointPool.parse("example.org:8080"), ("example.org", 8080))
+        self.assertEqual(EndpointPool.parse(["::1", "9"]), ("::1", 9))
+
+
+class FailoverTest(unittest.TestCase):
+    def server(self, handler):
+        server = FakeServer(handler)
+        self.addCleanup(server.close)
+        return server
+
+    def connection(self, *servers, **kwargs):
+        ports = [s if isinstance(s, int) else s.port for s in servers]
+        return RendezvousConnection("127.0.0.1", ports[0],
+                                    endpoints=[f"127.0.0.1:{p}" for p in ports[1:]], timeout=2.0, **kwargs)
+
+    def test_request_fails_over_to_the_next_server(self):
+        up = self.server(reply({"status": "OK", "peers": []}))
+        conn = self.connection(free_port(), up)
+        self.assertEqual(conn._send_command({"type": "LOOKUP"}), {"status": "OK", "peers": []})
+        down = conn.pool.endpoints[0]
+        self.assertEqual(down.failures, 1)
+        self.assertEqual(conn.pool.ordered()[0].port, up.port)
+
+    def test_all_servers_down(self):
+        conn = self.connection(free_port(), free_port())
+        self.assertIsNone(conn._send_command({"type": "LOOKUP"}))
+
+    def test_discover_is_hedged_on_a_slow_server(self):
+        slow = self.server(reply({"status": "OK", "peers": [{"name": "slow"}]}, delay=1.5))
+        fast = self.server(reply({"status": "OK", "peers": [{"name": "fast"}]}))
+        conn = self.connection(slow, fast)
+        conn.pool.default_hedge_delay = 0.1
+        started = time.monotonic()
+        peers = conn.discover("UnB")
+        self.assertEqual(peers, [{"name": "fast"}])
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(len(fast.requests), 1)
+
+    def test_no_hedge_when_the_first_server_is_fast(self):
+        first = self.server(reply({"status": "OK", "peers": [{"name": "first"}]}))
+        second = self.server(reply({"status": "OK", "peers": []}))
+        conn = self.connection(first, second)
+        conn.pool.default_hedge_delay = 1.0
+        self.assertEqual(conn.discover("UnB"), [{"name": "first"}])
+        self.assertEqual(second.requests, [])
+
+
+class DiscoverStreamTest(FailoverTest):
+    def test_stream(self):
+        def handler(conn, _request):
+            conn.sendall(b'{"name":"a"}\n{"name":"b"}\n{"status":"OK","count":2}\n')
+        conn = self.connection(self.server(handler))
+        self.assertEqual(list(conn.discover_stream("UnB")), [{"name": "a"}, {"name": "b"}])
+
+    def test_connection_reset_mid_stream_ends_the_stream(self):
+        def handler(conn, _request):
+            conn.sendall(b'{"name":"a"}\n')
+            time.sleep(0.1)
+            # RST em vez de FIN
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        other = self.server(reply({"status": "OK"}))
+        conn = self.connection(self.server(handler), other)
+        self.assertEqual(list(conn.discover_stream("UnB")), [{"name": "a"}])
+        self.assertEqual(other.requests, [])  # já entregou peers: não recomeça em outro servidor
+
+    def test_malformed_line_does_not_escape(self):
+        def handler(conn, _request):
+            conn.sendall(b'{"name":"a"}\nnot json\n')
+        conn = self.connection(self.server(handler))
+        self.assertEqual(list(conn.discover_stream("UnB")), [{"name": "a"}])
+
+    def test_stream_fails_over_before_the_first_peer(self):
+        def handler(conn, _request):
+            conn.sendall(b'{"name":"b"}\n{"status":"OK","count":1}\n')
+        conn = self.connection(free_port(), self.server(handler))
+        self.assertEqual(list(conn.discover_stream("UnB")), [{"name": "b"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
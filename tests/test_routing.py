@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import unittest
+import uuid
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from common import codec  # noqa: E402
+from models import Message, MessageType  # noqa: E402
+import routing  # noqa: E402
+from routing import MAX_HOPS, MAX_ROUTES_BYTES, RoutingTable  # noqa: E402
+
+MAX_LINE_SIZE = 32768  # LineFramer / RendezvousConnection
+
+
+def peer_id(i, length=64):
+    name = f"peer{i}".ljust(length, "n")
+    namespace = f"ns{i}".ljust(length, "s")
+    return f"{name}@{namespace}"
+
+
+class AdvertisementsTest(unittest.TestCase):
+    def setUp(self):
+        self.me = peer_id("me")
+        self.table = RoutingTable(self.me)
+        self.neighbor = peer_id("nb")
+        self.other = peer_id("other")
+        for neighbor in (self.neighbor, self.other):
+            self.table.add_neighbor(neighbor)
+            self.table.update_link(neighbor, 12345.678)
+
+    def frames(self, chunks):
+        return [codec.dumpb(Message(
+            msg_type=MessageType.ROUTE,
+            msg_id=str(uuid.uuid4()),
+            src=self.me,
+            routes=routes
+        ).to_dict()) + b"\n" for routes in chunks]
+
+    def test_chunks_fit_max_line_with_max_length_ids(self):
+        dsts = [peer_id(i) for i in range(1200)]
+        self.table.handle_route(self.other, {dst: [98765.43, 6] for dst in dsts})
+
+        chunks = self.table.advertisements(self.neighbor)
+
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(codec.dumpb(chunk)), MAX_ROUTES_BYTES)
+        for frame in self.frames(chunks):
+            self.assertLessEqual(len(frame), MAX_LINE_SIZE)
+
+        merged = {}
+        for chunk in chunks:
+            merged.update(chunk)
+        self.assertEqual(set(merged), set(dsts) | {self.other})
+
+    def test_poisoned_reverse(self):
+        dst = peer_id(1)
+        self.table.handle_route(self.neighbor, {dst: [10.0, 1]})
+        self.assertEqual(self.table.advertisements(self.neighbor)[0][dst], [-1, 0])
+        self.assertEqual(self.table.advertisements(self.other)[0][dst], [12355.68, 2])
+
+    def test_empty_table_sends_one_empty_advertisement(self):
+        table = RoutingTable(self.me)
+        self.assertEqual(table.advertisements(self.neighbor), [{}])
+
+
+class RouteSelectionTest(unittest.TestCase):
+    def setUp(self):
+        self.table = RoutingTable("me", expiry=15.0)
+        for neighbor, rtt in (("a", 10.0), ("b", 40.0)):
+            self.table.add_neighbor(neighbor)
+            self.table.update_link(neighbor, rtt)
+
+    def test_lowest_total_latency_wins_over_fewest_hops(self):
+        self.table.handle_route("a", {"dst": [50.0, 3]})   # 10 + 50
+        self.table.handle_route("b", {"dst": [30.0, 1]})   # 40 + 30
+        self.assertEqual(self.table.route("dst"), (60.0, 4, "a"))
+        self.table.update_link("a", 200.0)  # EWMA: 0.3 * 200 + 0.7 * 10 = 67
+        self.assertEqual(self.table.next_hop("dst"), "b")
+        self.assertEqual(self.table.next_hop("dst", exclude=["b"]), "a")
+
+    def test_direct_neighbor_and_unknown_destination(self):
+        self.assertEqual(self.table.route("a"), (10.0, 1, "a"))
+        self.assertIsNone(self.table.next_hop("nowhere"))
+
+    def test_withdrawn_and_too_long_routes_are_ignored(self):
+        self.table.handle_route("a", {"dst": [5.0, 1], "far": [5.0, MAX_HOPS], "bad": "x", "me": [1.0, 1]})
+        self.assertEqual(self.table.next_hop("dst"), "a")
+        self.assertIsNone(self.table.next_hop("far"))
+        self.assertNotIn("me", self.table.destinations())
+        self.table.handle_route("a", {"dst": [-1, 0]})
+        self.assertIsNone(self.table.next_hop("dst"))
+
+    def test_routes_expire_unless_readvertised(self):
+        self.table.handle_route("a", {"dst": [5.0, 1]})
+        later = time.monotonic() + 16
+        with mock.patch.object(routing.time, "monotonic", return_value=later):
+            self.assertIsNone(self.table.next_hop("dst"))
+
+    def test_removed_neighbor_takes_its_routes(self):
+        self.table.handle_route("a", {"dst": [5.0, 1]})
+        self.table.remove_neighbor("a")
+        self.assertIsNone(self.table.next_hop("dst"))
+        self.table.handle_route("a", {"dst": [5.0, 1]})  # anúncio de quem não é vizinho
+        self.assertIsNone(self.table.next_hop("dst"))
+
+    def test_chain_converges(self):
+        # n0 - n1 - n2 - n3, com um atalho lento n0 - n3
+        names = ["n0", "n1", "n2", "n3"]
+        tables = {n: RoutingTable(n) for n in names}
+        links = {("n0", "n1"): 5.0, ("n1", "n2"): 5.0, ("n2", "n3"): 5.0, ("n0", "n3"): 100.0}
+        for (x, y), rtt in links.items():
+            for a, b in ((x, y), (y, x)):
+                tables[a].add_neighbor(b)
+                tables[a].update_link(b, rtt)
+        for _ in range(4):
+            for (x, y) in links:
+                for a, b in ((x, y), (y, x)):
+                    for chunk in tables[a].advertisements(b):
+                        tables[b].handle_route(a, chunk)
+        self.assertEqual(tables["n0"].route("n3"), (15.0, 3, "n1"))
+        self.assertEqual(tables["n3"].route("n0"), (15.0, 3, "n2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "rendezvous"))
+client_models = sys.modules.pop("models", None)  # the P2P client has its own models module
+
+from common import codec  # noqa: E402
+from models import PeerRecord  # noqa: E402
+from peer_db import PeerDatabase  # noqa: E402
+from rendezvous import RendezvousServer  # noqa: E402
+
+sys.modules.pop("models", None)
+if client_models is not None:
+    sys.modules["models"] = client_models  # the client's modules already import this one
+
+
+def free_port():
+    with socket.create_server(("127.0.0.1", 0)) as s:
+        return s.getsockname()[1]
+
+
+def record(name, ip="10.0.0.1"):
+    return PeerRecord(ip, 4000, name, "UnB", 7200, datetime.now(timezone.utc))
+
+
+class LazyFlushTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "peers.json")
+
+    def saved(self):
+        with open(self.path, encoding="utf-8") as f:
+            return sorted(p["name"] for p in json.load(f))
+
+    def test_mutations_are_written_once_by_flush(self):
+        db = PeerDatabase(self.path, flush_interval=60)
+        for i in range(100):
+            db.add_peer(record(f"p{i}"))
+        self.assertFalse(os.path.exists(self.path))  # nada escrito por mutação
+        self.assertTrue(db.flush())
+        self.assertEqual(len(self.saved()), 100)
+        self.assertFalse(db.flush())  # nada mudou desde a última escrita
+
+    def test_close_writes_pending_changes(self):
+        db = PeerDatabase(self.path, flush_interval=60)
+        db.start()
+        db.add_peer(record("a"))
+        db.close()
+        self.assertEqual(self.saved(), ["a"])
+        self.assertEqual([p.name for p in PeerDatabase(self.path).get_peers()], ["a"])
+
+    def test_background_flusher(self):
+        db = PeerDatabase(self.path, flush_interval=0.05)
+        db.start()
+        self.addCleanup(db.close)
+        db.add_peer(record("a"))
+        deadline = time.monotonic() + 2
+        while not os.path.exists(self.path) and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(self.saved(), ["a"])
+
+
+class GracefulShutdownTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "peers.json")
+        self.port = free_port()
+        self.server = RendezvousServer("127.0.0.1", self.port, db_file=self.path)
+        self.thread = threading.Thread(target=self.server.start,
+                                       kwargs={"drain_timeout": 5, "accept_poll": 0.05}, daemon=True)
+        self.thread.start()
+        self.addCleanup(self.server.stop)
+
+    def connect(self):
+        deadline = time.monotonic() + 2
+        while True:
+            try:
+                return socket.create_connection(("127.0.0.1", self.port), timeout=5)
+            except ConnectionRefusedError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.02)
+
+    def request(self, sock, obj):
+        sock.sendall(codec.dumpb(obj) + b"\n")
+        return codec.loads(sock.makefile("rb").readline())
+
+    def test_in_flight_request_is_served_and_flushed_on_stop(self):
+        with self.connect() as sock:
+            time.sleep(0.1)  # conexão aceita, requisição ainda não enviada
+            self.server.stop()
+            reply = self.request(sock, {"type": "REGISTER", "namespace": "UnB", "name": "late", "port": 4000})
+        self.assertEqual(reply["status"], "OK")
+
+        self.thread.join(timeout=5)
+        self.assertFalse(self.thread.is_alive())
+        with open(self.path, encoding="utf-8") as f:
+            self.assertEqual([p["name"] for p in json.load(f)], ["late"])
+
+    def test_new_connections_are_refused_after_stop(self):
+        with self.connect() as sock:
+            self.request(sock, {"type": "REGISTER", "namespace": "UnB", "name": "a", "port": 4000})
+        self.server.stop()
+        self.thread.join(timeout=5)
+        with self.assertRaises(OSError):
+            socket.create_connection(("127.0.0.1", self.port), timeout=1).close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import sys
+import unittest
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src", "client"))
+
+from models import ConnectionInfo, PeerStatus  # noqa: E402
+from peer_table import PeerTable  # noqa: E402
+from topology import TopologyManager  # noqa: E402
+
+
+class TopologyTest(unittest.TestCase):
+    def setUp(self):
+        self.connections = {}
+        self.attempts = []
+        self.unreachable = set()
+        self.disconnected = []
+        self.table = PeerTable(3, 2, 60, lambda _peer: False)
+
+    def add(self, name, ip, rtt=None):
+        peer = self.table.upsert_peer({"name": name, "namespace": "N", "ip": ip, "port": 4000})
+        if rtt is not None:
+            peer.add_rtt_sample(rtt)
+        return peer
+
+    def connect(self, peer):
+        self.attempts.append(peer.peer_id)
+        if peer.peer_id in self.unreachable:
+            return False
+        self.connections[peer.peer_id] = ConnectionInfo(peer.peer_id, "outbound", datetime.now())
+        self.table.mark_connected(peer.peer_id)
+        return True
+
+    def disconnect(self, peer_id, _reason):
+        self.disconnected.append(peer_id)
+        self.connections.pop(peer_id)
+        self.table.mark_disconnected(peer_id)
+
+    def manager(self, **kwargs):
+        topology = TopologyManager("me@N", self.table, lambda: dict(self.connections), self.connect,
+                                   self.disconnect, **kwargs)
+        topology.running = True
+        return topology
+
+    def test_fills_up_to_the_target_degree_only(self):
+        for i in range(30):
+            self.add(f"p{i}", f"10.0.{i}.1")
+        topology = self.manager(target_degree=5)
+        topology.maintain()
+        self.assertEqual(len(self.connections), 5)
+        topology.maintain()
+        self.assertEqual(len(self.attempts), 5)  # já no alvo: nada a fazer
+        self.assertTrue(topology.has_room())
+        self.assertEqual(topology.max_degree, 10)
+
+    def test_prefers_other_networks_then_low_rtt(self):
+        self.add("same1", "10.0.0.1", rtt=1)
+        self.add("same2", "10.0.0.2", rtt=2)
+        self.add("same3", "10.0.0.3", rtt=3)
+        self.add("far-slow", "10.9.9.9", rtt=80)
+        self.add("fast", "10.1.0.1", rtt=5)
+        self.add("unmeasured", "10.2.0.1")
+        self.manager(target_degree=4).maintain()
+        # same2/same3 ficam de fora: a rede 10.0.0 já tem um vizinho
+        self.assertEqual(self.attempts, ["unmeasured@N", "same1@N", "fast@N", "far-slow@N"])
+
+    def test_failed_candidates_back_off_then_give_up(self):
+        self.add("down", "10.0.0.1")
+        self.unreachable.add("down@N")
+        topology = self.manager(target_degree=2)
+        topology.maintain()
+        topology.maintain()  # em backoff: não tenta de novo
+        self.assertEqual(self.attempts, ["down@N"])
+        for _ in range(2):
+            topology.retry_at.clear()
+            topology.maintain()
+        peer = self.table.get_peer("down@N")
+        self.assertEqual((peer.status, peer.reconnect_attempts), (PeerStatus.STALE, 3))
+
+    def test_rotation_replaces_the_slowest_outbound_neighbor(self):
+        for i, rtt in enumerate((10, 200, 30)):
+            self.add(f"n{i}", f"10.0.{i}.1", rtt=rtt)
+        topology = self.manager(target_degree=3, rotate_interval=0)
+        topology.maintain()
+        self.assertEqual(len(self.connections), 3)
+        self.add("new", "10.5.0.1")
+        topology.maintain()
+        self.assertEqual(self.disconnected, ["n1@N"])
+        self.assertEqual(set(self.connections), {"n0@N", "n2@N", "new@N"})
+        self.assertIn("n1@N", topology.retry_at)  # não volta na mesma rodada
+
+    def test_no_rotation_without_candidates(self):
+        for i in range(3):
+            self.add(f"n{i}", f"10.0.{i}.1", rtt=10 * (i + 1))
+        topology = self.manager(target_degree=3, rotate_interval=0)
+        topology.maintain()
+        topology.maintain()
+        self.assertEqual(self.disconnected, [])
+
+    def test_max_degree_limits_inbound(self):
+        topology = self.manager(target_degree=1, max_degree=2)
+        self.connections = {p: ConnectionInfo(p, "inbound", datetime.now()) for p in ("a@N", "b@N")}
+        self.assertFalse(topology.has_room())
+
+
+if __name__ == "__main__":
+    unittest.main()